@@ -0,0 +1,88 @@
+"""Measure how often aborting battles below the selection cutoff discards armies that would have done well.
+
+Random armies are generated for each battle and fully simulated. The cutoff of
+each battle is the fitness at --cutoff_quantile of its armies, like the worst
+parent that children have to beat in EvolutionStrategy. Every army is then
+simulated again with AbortBelowCutoff, once with the default rule, which only
+stops battles whose loss is decided, and once per --stall_durations with the
+stall heuristic. For each rule this reports how many battles were aborted, how
+many of those would have beaten the cutoff or won, and the time it took.
+
+    python src/abort_audit.py --battles Soldiers --armies 64 --stall_durations 10 20
+"""
+
+import startup_profiler
+startup_profiler.enable_if_requested()
+
+import argparse
+import random
+from typing import List
+
+from auto_battle import BattleOutcome
+from battle_solver import Fitness, Individual, _evaluate_timed, cleanup_process_pool, get_process_pool, random_population
+from battles import get_battles_view
+
+
+def _is_same(a: Fitness, b: Fitness) -> bool:
+    return a.outcome == b.outcome and abs(a.team1_health - b.team1_health) < 1e-6 and abs(a.team2_health - b.team2_health) < 1e-6
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure how often aborted battles would have beaten the cutoff")
+    parser.add_argument("--battles", nargs="*", default=None, help="Battles to audit, all non-test battles by default")
+    parser.add_argument("--armies", type=int, default=32, help="Random armies to simulate per battle")
+    parser.add_argument("--cutoff_quantile", type=float, default=0.5, help="Quantile of each battle's fitnesses used as its cutoff")
+    parser.add_argument("--stall_durations", type=float, nargs="*", default=[10.0], help="Stall durations of the heuristic to audit")
+    parser.add_argument("--use_powers", action="store_true", default=False)
+    parser.add_argument("--max_duration", type=float, default=120.0)
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument(startup_profiler.PROFILE_STARTUP_FLAG, action="store_true", default=False)
+    args = parser.parse_args()
+    if args.seed is not None:
+        random.seed(args.seed)
+
+    battle_ids = args.battles or [battle.id for battle in get_battles_view() if not battle.is_test]
+    individuals: List[Individual] = [
+        ind
+        for battle_id in battle_ids
+        for ind in random_population(battle_id=battle_id, size=args.armies).individuals
+    ]
+    startup_profiler.finish("abort_audit")
+
+    rules = [("decided only", None)] + [(f"stall {stall_duration:g}s", stall_duration) for stall_duration in args.stall_durations]
+    try:
+        pool = get_process_pool()
+        full_results = pool.starmap(_evaluate_timed, [(ind, args.max_duration, args.use_powers, None, None) for ind in individuals])
+        cutoffs = {}
+        for battle_id in battle_ids:
+            fitnesses = sorted(fitness for ind, (fitness, _) in zip(individuals, full_results) if ind.battle_id == battle_id)
+            cutoffs[battle_id] = fitnesses[min(int(len(fitnesses) * args.cutoff_quantile), len(fitnesses) - 1)]
+        rule_results = {
+            name: pool.starmap(_evaluate_timed, [
+                (ind, args.max_duration, args.use_powers, cutoffs[ind.battle_id], stall_duration)
+                for ind in individuals
+            ])
+            for name, stall_duration in rules
+        }
+    finally:
+        cleanup_process_pool()
+
+    full_seconds = sum(seconds for _, seconds in full_results)
+    print(f"\n{'Rule':<15} {'Aborted':>8} {'Would beat cutoff':>18} {'Would win':>10} {'Seconds':>9}")
+    print(f"{'no abort':<15} {'':>8} {'':>18} {'':>10} {full_seconds:>9.1f}")
+    for name, _ in rules:
+        aborted = would_beat_cutoff = would_win = 0
+        for ind, (full_fitness, _), (fitness, _) in zip(individuals, full_results, rule_results[name]):
+            if _is_same(fitness, full_fitness):
+                continue
+            aborted += 1
+            if full_fitness >= cutoffs[ind.battle_id]:
+                would_beat_cutoff += 1
+            if full_fitness.outcome == BattleOutcome.TEAM1_VICTORY:
+                would_win += 1
+        seconds = sum(seconds for _, seconds in rule_results[name])
+        print(f"{name:<15} {aborted:>8} {would_beat_cutoff:>18} {would_win:>10} {seconds:>9.1f}")
+
+
+if __name__ == "__main__":
+    main()
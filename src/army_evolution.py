@@ -1,4 +1,8 @@
-from typing import List, Dict, Tuple
+import startup_profiler
+startup_profiler.enable_if_requested()
+
+import argparse
+from typing import List, Dict, Optional, Tuple
 import random
 from collections import Counter, defaultdict
 import numpy as np
@@ -6,17 +10,28 @@ import multiprocessing
 from battle_solver import (
     ALLOWED_UNIT_TYPES, Individual, Population, Mutation, RandomizeUnitPosition,
     PerturbPosition, MoveNextToAlly, RandomizeUnitType, ReplaceSubarmy, generate_random_army, Plotter, PlotGroup,
-    UnitCountsPlotter, UnitValuesPlotter, get_process_pool, cleanup_process_pool
+    UnitCountsPlotter, UnitValuesPlotter, cleanup_process_pool, use_evaluation_farm
 )
-from auto_battle import BattleOutcome, simulate_battle_with_dependencies
+from auto_battle import BattleOutcome
+from battles import get_battle_id
+from checkpoint import add_checkpoint_arguments, load_checkpoint, save_checkpoint
+from evaluation_farm import add_farm_arguments, start_farm_from_args
 from components.team import TeamType
 from components.unit_type import UnitType
 from point_values import unit_values
 from number_format import format_number
+from plot_output import MetricsLog, PlotRenderer
+from tournament import ARENA_BATTLE_ID, SwissTournament
 
 class EloIndividual(Individual):
-    def __init__(self, unit_placements: List[Tuple[UnitType, Tuple[float, float]]], elo: float = 1000.0):
-        super().__init__("army_evolution", unit_placements)
+    def __init__(
+        self,
+        battle_id: str,
+        unit_placements: List[Tuple[UnitType, Tuple[float, float], List]],
+        spell_placements: Optional[List[Tuple]] = None,
+        elo: float = 1000.0,
+    ):
+        super().__init__(battle_id, unit_placements, spell_placements)
         self.elo = elo
         self.wins = 0
         self.losses = 0
@@ -39,17 +54,6 @@ class EloPopulation:
     def get_worst_individuals(self, n: int = 1) -> List[EloIndividual]:
         return sorted(self.individuals, key=lambda x: x.elo)[:n]
 
-def _simulate_match(args: Tuple[Tuple[int, EloIndividual], Tuple[int, EloIndividual]]) -> Tuple[int, int, BattleOutcome]:
-    (idx1, player1), (idx2, player2) = args
-    outcome = simulate_battle_with_dependencies(
-        ally_placements=player1.unit_placements,
-        enemy_placements=player2.unit_placements,
-        max_duration=120.0,
-        hex_coords=(0, 0),  # Default hex coordinates for army evolution
-        spell_placements=player1.spell_placements,
-    )
-    return idx1, idx2, outcome
-
 class EloEvolution:
     def __init__(
         self,
@@ -57,6 +61,7 @@ class EloEvolution:
         children_per_generation: int,
         matches_per_generation: int,
         mutations: List[Mutation],
+        tournament: SwissTournament,
         k_factor: float = 32.0,
         tournament_size: int = 1,
     ):
@@ -64,6 +69,7 @@ class EloEvolution:
         self.children_per_generation = children_per_generation
         self.matches_per_generation = matches_per_generation
         self.mutations = mutations
+        self.tournament = tournament
         self.k_factor = k_factor
         self.tournament_size = tournament_size
         self.plotter = PlotGroup(
@@ -107,11 +113,10 @@ class EloEvolution:
         # Apply random mutations to create variety
         mutation = random.choice(self.mutations)
         # Create a temporary individual to apply the mutation
-        temp_ind = EloIndividual(unit_placements)
+        temp_ind = EloIndividual(parent.battle_id, unit_placements, parent.spell_placements)
         mutated_ind = mutation(temp_ind)
-        unit_placements = mutated_ind.unit_placements
             
-        return EloIndividual(unit_placements, elo=1000.0)
+        return EloIndividual(parent.battle_id, mutated_ind.unit_placements, mutated_ind.spell_placements, elo=1000.0)
 
     def _select_parents(self, population: EloPopulation) -> List[EloIndividual]:
         parents = []
@@ -124,38 +129,23 @@ class EloEvolution:
         # 1. Generate new individuals
         parents = self._select_parents(population)
         median_elo = population.get_median_elo()
-        new_individuals = [self._create_new_individual(parent, median_elo) for parent in parents]
+        new_individuals = []
+        for parent in parents:
+            child = self._create_new_individual(parent, median_elo)
+            if child not in population.individuals and child not in new_individuals:
+                new_individuals.append(child)
+        all_individuals = population.individuals + new_individuals
         
-        # 2. Do battles between new and existing individuals
-        # Generate random pairs of new and existing individuals
-        new_indices = random.choices(range(len(new_individuals)), k=self.matches_per_generation)
-        existing_indices = random.choices(range(len(population.individuals)), k=self.matches_per_generation)
-        match_pairs = [
-            ((new_idx, new_individuals[new_idx]), (existing_idx, population.individuals[existing_idx]))
-            for new_idx, existing_idx in zip(new_indices, existing_indices)
-        ]
-
-        # Simulate matches in parallel
-        if len(match_pairs) > 1:
-            pool = get_process_pool()
-            results = pool.map(_simulate_match, match_pairs)
-        else:
-            results = [_simulate_match(match_pair) for match_pair in match_pairs]
-
-        # Update ELO ratings based on match results
-        for new_idx, existing_idx, outcome in results:
-            self._update_elo(new_individuals[new_idx], population.individuals[existing_idx], outcome)
+        # 2. Play Swiss rounds, updating ratings as each match finishes.
+        # New individuals have played the fewest matches, so they are paired first.
+        self.tournament.play(all_individuals, self.matches_per_generation, self._update_elo)
+        print(self.tournament)
 
         # 3. Keep the best self.parents_per_generation individuals
-        # Combine existing and new individuals
-        all_individuals = population.individuals + new_individuals
         # Sort by ELO and keep the best
         population.individuals = sorted(all_individuals, key=lambda x: x.elo, reverse=True)[:self.parents_per_generation]
 
-        # Update plots
         self.plotter.update(population)
-        self.plotter.save_plot("plots/army_evolution.html")
-
         return population
 
 def run_army_evolution(
@@ -164,6 +154,9 @@ def run_army_evolution(
     matches_per_generation: int = 30,
     target_cost: int = 200,
     tournament_size: int = 3,
+    arena_battle_id: str = ARENA_BATTLE_ID,
+    resume: bool = False,
+    checkpoint_path: str = "checkpoints/army_evolution.pkl.gz",
 ):
     """
     Run the army evolution algorithm.
@@ -171,40 +164,56 @@ def run_army_evolution(
     Args:
         parents_per_generation: Number of individuals to keep each generation
         children_per_generation: Number of new individuals to create each generation
-        matches_per_generation: Number of random matches to simulate each generation
+        matches_per_generation: Number of matches to play each generation. Each match
+            is two games, with each army on each side.
         target_cost: Target cost for each army
         tournament_size: Number of competitors to compete in each tournament
+        arena_battle_id: The battle whose hex the armies are placed and fight on
+        resume: Continue from the checkpoint at checkpoint_path
+        checkpoint_path: Where checkpoints are written after every generation
     """
     print(f"Running army evolution with {multiprocessing.cpu_count()} cores")
     
-    # Initialize population
-    population = EloPopulation([
-        EloIndividual(generate_random_army(target_cost, max_decrease=0))
-        for _ in range(parents_per_generation)
-    ])
-
-    # Create evolution strategy
-    evolution = EloEvolution(
-        parents_per_generation=parents_per_generation,
-        children_per_generation=children_per_generation,
-        matches_per_generation=matches_per_generation,
-        tournament_size=tournament_size,
-        mutations=[
-            RandomizeUnitPosition(),
-            PerturbPosition(noise_scale=10),
-            PerturbPosition(noise_scale=100),
-            RandomizeUnitType(max_decrease=0),
-            MoveNextToAlly(noise_scale=20),
-            ReplaceSubarmy(max_decrease=0),
-            ReplaceSubarmy(max_decrease=0),
-            ReplaceSubarmy(max_decrease=0),
-            ReplaceSubarmy(max_decrease=0),
-        ],
-    )
+    if resume:
+        state = load_checkpoint(checkpoint_path)
+        population = state["population"]
+        evolution = state["evolution"]
+        generation = state["generation"]
+        print(f"Resumed from {checkpoint_path} at generation {generation + 1}")
+    else:
+        # Initialize population
+        hex_coords = get_battle_id(arena_battle_id).hex_coords or (0, 0)
+        population = EloPopulation([
+            EloIndividual(arena_battle_id, *generate_random_army(target_cost, arena_battle_id, hex_coords, max_decrease=0))
+            for _ in range(parents_per_generation)
+        ])
 
+        # Create evolution strategy
+        evolution = EloEvolution(
+            parents_per_generation=parents_per_generation,
+            children_per_generation=children_per_generation,
+            matches_per_generation=matches_per_generation,
+            tournament_size=tournament_size,
+            tournament=SwissTournament(hex_coords),
+            mutations=[
+                RandomizeUnitPosition(),
+                PerturbPosition(noise_scale=10),
+                PerturbPosition(noise_scale=100),
+                RandomizeUnitType(max_decrease=0),
+                MoveNextToAlly(noise_scale=20),
+                ReplaceSubarmy(max_decrease=0),
+                ReplaceSubarmy(max_decrease=0),
+                ReplaceSubarmy(max_decrease=0),
+                ReplaceSubarmy(max_decrease=0),
+            ],
+        )
+        generation = 0
+
+    metrics_log = MetricsLog("plots/army_evolution.csv", resume=resume)
+    plot_renderer = PlotRenderer("plots/army_evolution.csv", "plots/army_evolution.html")
+    startup_profiler.finish("army_evolution")
     try:
         # Run generations
-        generation = 0
         while True:
             print(f"\nGeneration {generation + 1}")
             print(f"Best ELO: {format_number(population.get_best_individuals(1)[0].elo)}")
@@ -220,8 +229,28 @@ def run_army_evolution(
 
             population = evolution(population)
             generation += 1
+            metrics_log.append(generation, evolution.plotter.metrics())
+            plot_renderer.maybe_render()
+            save_checkpoint(checkpoint_path, {
+                "population": population,
+                "evolution": evolution,
+                "generation": generation,
+            })
     finally:
         cleanup_process_pool()
+        plot_renderer.close()
+
+def main():
+    parser = argparse.ArgumentParser()
+    add_checkpoint_arguments(parser, default_path="checkpoints/army_evolution.pkl.gz")
+    add_farm_arguments(parser)
+    parser.add_argument(startup_profiler.PROFILE_STARTUP_FLAG, action="store_true", default=False)
+    args = parser.parse_args()
+    use_evaluation_farm(start_farm_from_args(args))
+    run_army_evolution(resume=args.resume, checkpoint_path=args.checkpoint_path)
+
 
 if __name__ == "__main__":
-    run_army_evolution() 
\ No newline at end of file
+    # Pickled jobs have to name this module rather than __main__ for farm workers to load them
+    from army_evolution import main
+    main()
@@ -0,0 +1,200 @@
+"""Lazy, on-demand asset loading with background prefetch.
+
+Asset dictionaries (sprite sheets, icons, visual sheets, sounds) resolve an
+entry the first time it is looked up instead of loading everything at startup.
+A background thread can read asset files ahead of time so the first use of an
+asset in a scene doesn't stall a frame on disk. Pygame surfaces aren't thread
+safe, so the thread only reads file bytes; decoding and converting still
+happen on the thread that looks the asset up.
+"""
+
+import io
+import os
+import threading
+from collections import deque
+from typing import BinaryIO, Callable, Deque, Dict, Hashable, Iterable, Optional, Set, Tuple, TypeVar, Union
+
+import pygame
+
+import startup_profiler
+
+K = TypeVar("K", bound=Hashable)
+V = TypeVar("V")
+
+
+def load_image(source: Union[str, BinaryIO]) -> pygame.Surface:
+    """Load an image with per-pixel alpha from a path or an open file."""
+    return pygame.image.load(source).convert_alpha()
+
+
+class LazyAssetDict(Dict[K, V]):
+    """A dict that loads missing entries from a path table on first access.
+
+    Lookups with ``[]`` load the asset if it hasn't been loaded yet. ``in``,
+    ``get`` and iteration only see assets that are already loaded. The loader
+    is given the asset's path, or its bytes as a file if they were prefetched.
+    """
+
+    def __init__(self, loader: Callable[[Union[str, BinaryIO]], V], paths: Optional[Dict[K, str]] = None):
+        super().__init__()
+        self._loader = loader
+        self._paths: Dict[K, str] = dict(paths) if paths else {}
+        self._lock = threading.Lock()
+        # File contents read by the prefetch thread, or the error reading them
+        self._prefetched: Dict[K, Union[bytes, Exception]] = {}
+
+    @property
+    def paths(self) -> Dict[K, str]:
+        """The known asset paths, keyed like the dict itself."""
+        return self._paths
+
+    def register(self, paths: Dict[K, str]) -> None:
+        """Register additional asset paths without loading them."""
+        self._paths.update(paths)
+
+    def __missing__(self, key: K) -> V:
+        if key not in self._paths:
+            raise KeyError(key)
+        with self._lock:
+            prefetched = self._prefetched.pop(key, None)
+        if isinstance(prefetched, Exception):
+            raise prefetched
+        with startup_profiler.section(self._paths[key], "asset"):
+            value = self._loader(self._paths[key] if prefetched is None else io.BytesIO(prefetched))
+        with self._lock:
+            return self.setdefault(key, value)
+
+    def prefetch_file(self, key: K) -> None:
+        """Read an asset's file so that loading it doesn't wait on disk.
+
+        Only the file is read, so this is safe to call from any thread. Errors
+        are raised when the asset is looked up.
+        """
+        with self._lock:
+            if dict.__contains__(self, key) or key in self._prefetched:
+                return
+        try:
+            with open(self._paths[key], "rb") as f:
+                prefetched: Union[bytes, Exception] = f.read()
+        except OSError as e:
+            prefetched = e
+        with self._lock:
+            if not dict.__contains__(self, key):
+                self._prefetched.setdefault(key, prefetched)
+
+    def load(self, key: K) -> V:
+        """Load a single asset if needed and return it."""
+        return self[key]
+
+    def load_all(self) -> None:
+        """Eagerly load every registered asset."""
+        for key in list(self._paths):
+            self[key]
+
+    def is_loaded(self, key: K) -> bool:
+        """Check whether an asset has already been loaded."""
+        return dict.__contains__(self, key)
+
+
+def sound_size_bytes(sound: pygame.mixer.Sound) -> int:
+    """Estimate the decoded size of a sound in the mixer's sample format."""
+    frequency, sample_format, channels = pygame.mixer.get_init()
+    return int(sound.get_length() * frequency * channels * abs(sample_format) // 8)
+
+
+class SoundBank(LazyAssetDict[str, pygame.mixer.Sound]):
+    """A lazily loaded set of sounds that stays under a memory budget.
+
+    Sounds whose files are at most ``resident_max_file_size`` bytes are kept
+    loaded once decoded. Larger sounds are kept in least-recently-played order
+    and evicted when the decoded size of the bank exceeds ``budget_bytes``.
+    Sounds that are still playing are never evicted.
+    """
+
+    def __init__(self, budget_bytes: int, resident_max_file_size: int = 0):
+        super().__init__(pygame.mixer.Sound)
+        self.budget_bytes = budget_bytes
+        self.resident_max_file_size = resident_max_file_size
+        self._resident: Set[str] = set()
+        self._sizes: Dict[str, int] = {}
+
+    def register(self, paths: Dict[str, str]) -> None:
+        """Register sound paths, marking small files as resident."""
+        super().register(paths)
+        for key, path in paths.items():
+            if os.path.getsize(path) <= self.resident_max_file_size:
+                self._resident.add(key)
+
+    def is_resident(self, key: str) -> bool:
+        """Check whether a sound stays loaded once decoded."""
+        return key in self._resident
+
+    @property
+    def memory_usage(self) -> int:
+        """The estimated decoded size of all loaded sounds, in bytes."""
+        return sum(self._sizes.values())
+
+    def __getitem__(self, key: str) -> pygame.mixer.Sound:
+        sound = super().__getitem__(key)
+        if key not in self._resident:
+            # Move to the end so the dict's order is least-recently-played first
+            with self._lock:
+                if dict.__contains__(self, key):
+                    dict.__delitem__(self, key)
+                    dict.__setitem__(self, key, sound)
+        return sound
+
+    def __missing__(self, key: str) -> pygame.mixer.Sound:
+        sound = super().__missing__(key)
+        with self._lock:
+            self._sizes[key] = sound_size_bytes(sound)
+            self._evict(keep=key)
+        return sound
+
+    def _evict(self, keep: str) -> None:
+        usage = self.memory_usage
+        for key in list(dict.keys(self)):
+            if usage <= self.budget_bytes:
+                break
+            sound = dict.__getitem__(self, key)
+            if key == keep or key in self._resident or sound.get_num_channels() > 0:
+                continue
+            dict.__delitem__(self, key)
+            usage -= self._sizes.pop(key)
+
+
+_prefetch_queue: Deque[Tuple[LazyAssetDict, Hashable]] = deque()
+_prefetch_condition = threading.Condition()
+_prefetch_thread: Optional[threading.Thread] = None
+
+
+def _prefetch_worker() -> None:
+    while True:
+        with _prefetch_condition:
+            while not _prefetch_queue:
+                _prefetch_condition.wait()
+            assets, key = _prefetch_queue.popleft()
+        assets.prefetch_file(key)
+
+
+def prefetch(assets: LazyAssetDict, keys: Iterable[Hashable]) -> None:
+    """Queue assets' files to be read on the background prefetch thread."""
+    global _prefetch_thread
+    with _prefetch_condition:
+        for key in keys:
+            if key in assets.paths and not assets.is_loaded(key):
+                _prefetch_queue.append((assets, key))
+        if _prefetch_thread is None:
+            _prefetch_thread = threading.Thread(
+                target=_prefetch_worker,
+                name="asset-prefetch",
+                daemon=True,
+            )
+            _prefetch_thread.start()
+        _prefetch_condition.notify()
+
+
+def pending_prefetch_count() -> int:
+    """Get the number of assets still waiting to be prefetched."""
+    with _prefetch_condition:
+        return len(_prefetch_queue)
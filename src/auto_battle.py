@@ -140,6 +140,10 @@ def simulate_battle(
     corruption_powers: Optional[List[CorruptionPower]] = None,
     spell_placements: Optional[List[Tuple]] = None,
     post_battle_callback: Optional[Callable[[BattleOutcome], Any]] = None,
+    abort_predicate: Optional[Callable[[float], bool]] = None,
+    abort_check_interval: int = 30,
+    ally_tier: UnitTier = UnitTier.ELITE,
+    enemy_tier: UnitTier = UnitTier.ELITE,
 ) -> Union[BattleOutcome, Tuple[BattleOutcome, Any]]:
     """Simulate a battle between two teams.
     
@@ -151,6 +155,13 @@ def simulate_battle(
         corruption_powers: Optional list of corruption powers to apply to units.
         spell_placements: Optional list of (spell_type, position, team) tuples for spells.
         post_battle_callback: Optional callback to be called after the battle.
+        abort_predicate: Optional function of the elapsed time in seconds, called
+            in the simulation world. If it returns True the battle stops early
+            and is treated as a timeout.
+        abort_check_interval: How many ticks to simulate between calls to
+            abort_predicate.
+        ally_tier: The tier of all of team 1's units.
+        enemy_tier: The tier of all of team 2's units.
     
     Returns:
         The outcome of the battle, or a tuple of (outcome, post_battle_callback_result)
@@ -158,13 +169,13 @@ def simulate_battle(
     """
     previous_world = esper.current_world
     esper.switch_world("simulation")
-    # TODO: THIS IS A HACK - I HAVE HARDCODED THE ALLY AND ENEMY TIERS.
+    # TODO: THIS IS A HACK - EVERY UNIT ON A TEAM HAS THE SAME TIER, ELITE UNLESS SPECIFIED.
 
     # Create units for both teams
     for unit_type, position, items in ally_placements:
-        create_unit(x=position[0], y=position[1], unit_type=unit_type, team=TeamType.TEAM1, corruption_powers=corruption_powers, tier=UnitTier.ELITE, items=items)
+        create_unit(x=position[0], y=position[1], unit_type=unit_type, team=TeamType.TEAM1, corruption_powers=corruption_powers, tier=ally_tier, items=items)
     for unit_type, position, items in enemy_placements:
-        create_unit(x=position[0], y=position[1], unit_type=unit_type, team=TeamType.TEAM2, corruption_powers=corruption_powers, tier=UnitTier.ELITE, items=items)
+        create_unit(x=position[0], y=position[1], unit_type=unit_type, team=TeamType.TEAM2, corruption_powers=corruption_powers, tier=enemy_tier, items=items)
     
     # Create spells if provided
     if spell_placements:
@@ -176,9 +187,18 @@ def simulate_battle(
     # Run the battle simulation
     outcome = None
     auto_battle = AutoBattle(max_duration, hex_coords=hex_coords)
+    ticks = 0
     while outcome is None:
         esper.process(1/30)
         outcome = auto_battle.update(1/30)
+        ticks += 1
+        if (
+            outcome is None
+            and abort_predicate is not None
+            and ticks % abort_check_interval == 0
+            and abort_predicate(ticks / 30)
+        ):
+            outcome = BattleOutcome.TIMEOUT
     
     if post_battle_callback is not None:
         post_battle_callback_result = post_battle_callback(outcome)
@@ -202,23 +222,20 @@ def simulate_battle_with_dependencies(
     corruption_powers: Optional[List[CorruptionPower]] = None,
     spell_placements: Optional[List[Tuple]] = None,
     post_battle_callback: Optional[Callable[[BattleOutcome], Any]] = None,
+    abort_predicate: Optional[Callable[[float], bool]] = None,
+    abort_check_interval: int = 30,
+    ally_tier: UnitTier = UnitTier.ELITE,
+    enemy_tier: UnitTier = UnitTier.ELITE,
 ) -> Union[BattleOutcome, Tuple[BattleOutcome, Any]]:
     import os
     import pygame
     from handlers.combat_handler import CombatHandler
     from handlers.state_machine import StateMachine
-    from visuals import load_visual_sheets
-    from entities.units import load_sprite_sheets
-    from entities.spells import load_spell_icons
-    from entities.items import load_item_icons
 
     os.environ['SDL_VIDEODRIVER'] = 'dummy'
     pygame.display.init()
     pygame.display.set_mode((800, 600))
-    load_sprite_sheets()
-    load_spell_icons()
-    load_item_icons()
-    load_visual_sheets()
+    # Sprite sheets are loaded lazily, so only the unit types in this battle are loaded
     combat_handler = CombatHandler()
     state_machine = StateMachine()
-    return simulate_battle(ally_placements, enemy_placements, max_duration, hex_coords, corruption_powers, spell_placements, post_battle_callback)
\ No newline at end of file
+    return simulate_battle(ally_placements, enemy_placements, max_duration, hex_coords, corruption_powers, spell_placements, post_battle_callback, abort_predicate, abort_check_interval, ally_tier, enemy_tier)
\ No newline at end of file
@@ -1,15 +1,24 @@
+import startup_profiler
+startup_profiler.enable_if_requested()
+
+import argparse
 from collections import Counter
 import multiprocessing
 import os
+import time
 from typing import Dict, List, Tuple
 
-from battles import get_battle_id, get_battles
+from battles import get_battle_id, get_battles_view
 from battle_solver import (
     ALLOWED_UNIT_TYPES, EvolutionStrategy, AddRandomUnit, MoveNextToAlly, PlotGroup, Plotter, Population, RemoveRandomUnit, 
     PerturbPosition, RandomizeUnitPosition, RandomizeUnitType, ReplaceSubarmy, TournamentSelection, UniformSelection,
     AllCountsPlotter, AllValuesPlotter,
-    RandomizeSpellPosition, PerturbSpellPosition, AddRandomSpell, RemoveRandomSpell, RemoveRandomItem, random_population, Individual
+    RandomizeSpellPosition, PerturbSpellPosition, AddRandomSpell, RemoveRandomSpell, RemoveRandomItem, random_population, Individual, use_evaluation_farm,
+    load_transposition_table, save_transposition_table, MultiPopulationScheduler, make_prefilter, prefilter_metrics, cleanup_process_pool,
 )
+from checkpoint import add_checkpoint_arguments, load_checkpoint, save_checkpoint
+from evaluation_farm import add_farm_arguments, start_farm_from_args
+from plot_output import MetricsLog, PlotRenderer
 from point_values import unit_values
 from components.unit_type import UnitType
 from components.item import ItemType
@@ -97,16 +106,26 @@ class AllBattlesPlotter:
             html += f"<a href='#overview'>Back to top</a>"
         return html
 
+    def metrics(self) -> Dict[str, float]:
+        """The latest metrics of the overview and every battle, for a MetricsLog."""
+        metrics = {f"All Battles/{name}": value for name, value in self.overview_plotter.metrics().items()}
+        for battle_id, plotter in self.battle_plotters.items():
+            metrics.update({f"{battle_id}/{name}": value for name, value in plotter.metrics().items()})
+        return metrics
+
     def save_html(self, filename: str):
         os.makedirs(os.path.dirname(filename), exist_ok=True)
         with open(filename, "w", encoding="utf-8") as f:
             f.write(self.create_plot())
 
 
-def run_balance_overview():
+def run_balance_overview(resume: bool = False, checkpoint_path: str = "checkpoints/balance_overview.pkl.gz"):
     """
     Runs evolutionary generations for every battle in the game and analyzes unit usage patterns.
     Each loop evolves the same populations further, showing how solutions improve over time.
+
+    A checkpoint is written after every generation. With resume, the run
+    continues from the checkpoint at checkpoint_path.
     """
     print(f"Running balance overview with {multiprocessing.cpu_count()} cores")
     print("Starting balance overview analysis...")
@@ -118,161 +137,212 @@ def run_balance_overview():
     TOURNAMENT_SIZE = None
     MINIMUM_POINTS = 600
     USE_POWERS = True
+    # Abort children whose damage to team 2 stalls for this many seconds below the worst parent, None to disable.
+    # Check how often it discards winners with abort_audit.py before relying on it
+    ABORT_STALL_DURATION = None
+    # Only simulate this fraction of children, ranked by the lite battle engine, None to disable
+    LITE_KEEP_FRACTION = None
+    TRANSPOSITION_TABLE_CHECKPOINT_EVERY_N_GENERATIONS = 10
+    # Only simulate this fraction of children, ranked by an online surrogate model, None to disable
+    SURROGATE_KEEP_FRACTION = None
+    # Plots are rendered from the metrics log in the background, at most this often
+    PLOT_INTERVAL_SECONDS = 60.0
 
-    # Setup evolution strategy with the same parameters as the main script
-    evolution = EvolutionStrategy(
-        mutations=[
-            RemoveRandomUnit(),
-            PerturbPosition(noise_scale=10),
-            PerturbPosition(noise_scale=100),
-            RandomizeUnitPosition(),
-            ReplaceSubarmy(),
-            RandomizeUnitType(),
-            MoveNextToAlly(noise_scale=20),
-            RandomizeSpellPosition(),
-            PerturbSpellPosition(noise_scale=10),
-            PerturbSpellPosition(noise_scale=100),
-            RemoveRandomSpell(),
-            RemoveRandomItem(),
-        ],
-        selector=TournamentSelection(tournament_size=TOURNAMENT_SIZE) if TOURNAMENT_SIZE is not None else UniformSelection(),
-        parents_per_generation=PARENTS_PER_GENERATION,
-        children_per_generation=CHILDREN_PER_GENERATION,
-        mutation_adaptation_rate=MUTATION_ADAPTATION_RATE,
-        category_cap=CATEGORY_CAP if CATEGORY_CAP is not None else PARENTS_PER_GENERATION,
-        n_mutations=1,
-        use_powers=USE_POWERS,
-    )
-    # Get all non-test battles
-    battles = [b for b in get_battles() if not b.is_test and sum(unit_values[unit_type] for unit_type, _, _ in b.enemies) >= MINIMUM_POINTS]
-    # battles = [get_battle_id("Behold the Wizard's Power!")]
-    print(f"Initializing populations for {len(battles)} non-test battles")
+    metrics_log = MetricsLog("plots/balance_overview.csv", resume=resume)
+    plot_renderer = PlotRenderer("plots/balance_overview.csv", "plots/balance_overview.html", min_interval=PLOT_INTERVAL_SECONDS)
+    if resume:
+        state = load_checkpoint(checkpoint_path)
+        # Checkpoints from before the scheduler only have the evolution strategy
+        scheduler = state["scheduler"] if "scheduler" in state else MultiPopulationScheduler(state["evolution"])
+        battle_populations = state["battle_populations"]
+        all_battles_plotter = state["all_battles_plotter"]
+        generation = state["generation"]
+        load_transposition_table(checkpoint_path, state)
+        print(f"Resumed from {checkpoint_path} at generation {generation}")
+    else:
+        # Setup evolution strategy with the same parameters as the main script
+        scheduler = MultiPopulationScheduler(EvolutionStrategy(
+            mutations=[
+                RemoveRandomUnit(),
+                PerturbPosition(noise_scale=10),
+                PerturbPosition(noise_scale=100),
+                RandomizeUnitPosition(),
+                ReplaceSubarmy(),
+                RandomizeUnitType(),
+                MoveNextToAlly(noise_scale=20),
+                RandomizeSpellPosition(),
+                PerturbSpellPosition(noise_scale=10),
+                PerturbSpellPosition(noise_scale=100),
+                RemoveRandomSpell(),
+                RemoveRandomItem(),
+            ],
+            selector=TournamentSelection(tournament_size=TOURNAMENT_SIZE) if TOURNAMENT_SIZE is not None else UniformSelection(),
+            parents_per_generation=PARENTS_PER_GENERATION,
+            children_per_generation=CHILDREN_PER_GENERATION,
+            mutation_adaptation_rate=MUTATION_ADAPTATION_RATE,
+            category_cap=CATEGORY_CAP if CATEGORY_CAP is not None else PARENTS_PER_GENERATION,
+            n_mutations=1,
+            use_powers=USE_POWERS,
+            prefilter=make_prefilter(LITE_KEEP_FRACTION, SURROGATE_KEEP_FRACTION),
+            stall_duration=ABORT_STALL_DURATION,
+        ))
+        # Get all non-test battles
+        battles = [b for b in get_battles_view() if not b.is_test and sum(unit_values[unit_type] for unit_type, _, _ in b.enemies) >= MINIMUM_POINTS]
+        # battles = [get_battle_id("Behold the Wizard's Power!")]
+        print(f"Initializing populations for {len(battles)} non-test battles")
     
-    # Initialize populations for all battles
-    battle_populations: Dict[str, Population] = {}
-    for battle in battles:
-        # Create initial population
-        population = random_population(battle_id=battle.id, size=PARENTS_PER_GENERATION)
-        
-        # Evaluate the initial population
-        population.evaluate()
-        
-        # Store the population for this battle
-        battle_populations[battle.id] = population
-        print(f"Initialized population for {battle.id}")
+        # Initialize populations for all battles
+        battle_populations: Dict[str, Population] = {}
+        for battle in battles:
+            with startup_profiler.section(f"random_population {battle.id}"):
+                battle_populations[battle.id] = random_population(battle_id=battle.id, size=PARENTS_PER_GENERATION)
+
+        # Evaluate the initial populations of all battles together
+        with startup_profiler.section("initial evaluation"):
+            scheduler.evaluate(battle_populations)
+        print(f"Initialized populations for {len(battle_populations)} battles")
     
 
-    all_battles_plotter = AllBattlesPlotter(
-        overview_plotter=PlotGroup(
-            plotters=[
-                AllCountsPlotter(),
-                AllValuesPlotter(),
-            ],
-        ),
-        battle_plotters={
-            battle.id: AllCountsPlotter()
-            for battle in battles
-        }
-    )
-    all_battles_plotter.update(battle_populations)
+        all_battles_plotter = AllBattlesPlotter(
+            overview_plotter=PlotGroup(
+                plotters=[
+                    AllCountsPlotter(),
+                    AllValuesPlotter(),
+                ],
+            ),
+            battle_plotters={
+                battle.id: AllCountsPlotter()
+                for battle in battles
+            }
+        )
+        all_battles_plotter.update(battle_populations)
+        metrics_log.append(0, dict(all_battles_plotter.metrics(), **prefilter_metrics(scheduler.evolution)))
     
-    generation = 0
+        generation = 0
+    startup_profiler.finish("balance_overview")
     
-    while True:
-        print(f"\n----- GENERATION {generation} -----\n")
+    try:
+        while True:
+            print(f"\n----- GENERATION {generation} -----\n")
         
-        # Track unit, item, and spell usage across all battles
-        best_solution_unit_counts = Counter()
-        best_solution_item_counts = Counter()
-        best_solution_spell_counts = Counter()
-        all_battles_unit_counts = Counter()
-        all_battles_item_counts = Counter()
-        all_battles_spell_counts = Counter()
+            # Track unit, item, and spell usage across all battles
+            best_solution_unit_counts = Counter()
+            best_solution_item_counts = Counter()
+            best_solution_spell_counts = Counter()
+            all_battles_unit_counts = Counter()
+            all_battles_item_counts = Counter()
+            all_battles_spell_counts = Counter()
         
 
         
-        # Process each battle
-        for battle_id, population in battle_populations.items():
-            battle = get_battle_id(battle_id)
+            # Process each battle
+            for battle_id, population in battle_populations.items():
+                battle = get_battle_id(battle_id)
             
-            print(f"Processing battle: {battle_id}")
+                print(f"Processing battle: {battle_id}")
             
-            # Get the best individual for this battle
-            if population.best_individuals:
-                best_individual = population.best_individuals[0]
+                # Get the best individual for this battle
+                if population.best_individuals:
+                    best_individual = population.best_individuals[0]
                 
-                # Count units, items, and spells in best solution
-                for unit_type, _, items in best_individual.unit_placements:
-                    best_solution_unit_counts[unit_type] += 1
-                    for item_type in items:
-                        best_solution_item_counts[item_type] += 1
+                    # Count units, items, and spells in best solution
+                    for unit_type, _, items in best_individual.unit_placements:
+                        best_solution_unit_counts[unit_type] += 1
+                        for item_type in items:
+                            best_solution_item_counts[item_type] += 1
                 
-                for spell_type, _, _ in best_individual.spell_placements:
-                    best_solution_spell_counts[spell_type] += 1
+                    for spell_type, _, _ in best_individual.spell_placements:
+                        best_solution_spell_counts[spell_type] += 1
                 
-                # Get solution points
-                points_used = best_individual.points
+                    # Get solution points
+                    points_used = best_individual.points
                 
-                # Create detailed solution description
-                solution_description = create_detailed_solution_description(best_individual)
-                print(f"  Best solution: {solution_description}")
-                print(f"  Points: {points_used}")
-            else:
-                print("  No solution found")
+                    # Create detailed solution description
+                    solution_description = create_detailed_solution_description(best_individual)
+                    print(f"  Best solution: {solution_description}")
+                    print(f"  Points: {points_used}")
+                else:
+                    print("  No solution found")
 
-            # Count all units, items, and spells used in this battle's enemy placements
-            for unit_type, _, items in battle.enemies:
-                all_battles_unit_counts[unit_type] += 1
-                for item_type in items:
-                    all_battles_item_counts[item_type] += 1
+                # Count all units, items, and spells used in this battle's enemy placements
+                for unit_type, _, items in battle.enemies:
+                    all_battles_unit_counts[unit_type] += 1
+                    for item_type in items:
+                        all_battles_item_counts[item_type] += 1
             
-            # Count spells if they exist in the battle
-            if battle.spells:
-                for spell_type, _, _ in battle.spells:
-                    all_battles_spell_counts[spell_type] += 1
+                # Count spells if they exist in the battle
+                if battle.spells:
+                    for spell_type, _, _ in battle.spells:
+                        all_battles_spell_counts[spell_type] += 1
         
-        # Report findings
-        print("\n----- UNIT USAGE ANALYSIS -----")
-        print(f"{'Unit Type':<20} {'Best Solutions':<15} {'All Battles':<15}")
-        print("-" * 50)
+            # Report findings
+            print("\n----- UNIT USAGE ANALYSIS -----")
+            print(f"{'Unit Type':<20} {'Best Solutions':<15} {'All Battles':<15}")
+            print("-" * 50)
         
-        # Sort by most used to least used in best solutions
-        for unit_type in sorted(ALLOWED_UNIT_TYPES, key=lambda x: best_solution_unit_counts.get(x, 0), reverse=True):
-            all_count = all_battles_unit_counts.get(unit_type, 0)
-            print(f"{unit_type.name:<20} {best_solution_unit_counts.get(unit_type, 0):<15} {all_count:<15}")
+            # Sort by most used to least used in best solutions
+            for unit_type in sorted(ALLOWED_UNIT_TYPES, key=lambda x: best_solution_unit_counts.get(x, 0), reverse=True):
+                all_count = all_battles_unit_counts.get(unit_type, 0)
+                print(f"{unit_type.name:<20} {best_solution_unit_counts.get(unit_type, 0):<15} {all_count:<15}")
         
-        # Report item usage
-        from battle_solver import ALLOWED_ITEM_TYPES
-        print("\n----- ITEM USAGE ANALYSIS -----")
-        print(f"{'Item Type':<20} {'Best Solutions':<15} {'All Battles':<15}")
-        print("-" * 50)
+            # Report item usage
+            from battle_solver import ALLOWED_ITEM_TYPES
+            print("\n----- ITEM USAGE ANALYSIS -----")
+            print(f"{'Item Type':<20} {'Best Solutions':<15} {'All Battles':<15}")
+            print("-" * 50)
         
-        for item_type in sorted(ALLOWED_ITEM_TYPES, key=lambda x: best_solution_item_counts.get(x, 0), reverse=True):
-            all_count = all_battles_item_counts.get(item_type, 0)
-            print(f"{item_type.name:<20} {best_solution_item_counts.get(item_type, 0):<15} {all_count:<15}")
+            for item_type in sorted(ALLOWED_ITEM_TYPES, key=lambda x: best_solution_item_counts.get(x, 0), reverse=True):
+                all_count = all_battles_item_counts.get(item_type, 0)
+                print(f"{item_type.name:<20} {best_solution_item_counts.get(item_type, 0):<15} {all_count:<15}")
         
-        # Report spell usage
-        from battle_solver import ALLOWED_SPELL_TYPES
-        print("\n----- SPELL USAGE ANALYSIS -----")
-        print(f"{'Spell Type':<20} {'Best Solutions':<15} {'All Battles':<15}")
-        print("-" * 50)
+            # Report spell usage
+            from battle_solver import ALLOWED_SPELL_TYPES
+            print("\n----- SPELL USAGE ANALYSIS -----")
+            print(f"{'Spell Type':<20} {'Best Solutions':<15} {'All Battles':<15}")
+            print("-" * 50)
         
-        for spell_type in sorted(ALLOWED_SPELL_TYPES, key=lambda x: best_solution_spell_counts.get(x, 0), reverse=True):
-            all_count = all_battles_spell_counts.get(spell_type, 0)
-            print(f"{spell_type.name:<20} {best_solution_spell_counts.get(spell_type, 0):<15} {all_count:<15}")
+            for spell_type in sorted(ALLOWED_SPELL_TYPES, key=lambda x: best_solution_spell_counts.get(x, 0), reverse=True):
+                all_count = all_battles_spell_counts.get(spell_type, 0)
+                print(f"{spell_type.name:<20} {best_solution_spell_counts.get(spell_type, 0):<15} {all_count:<15}")
         
 
 
-        # Evolve each population for the next generation
-        print(f"\nEvolving populations for generation {generation + 1}...")
-        for battle_id, population in battle_populations.items():
-            print(f"Evolving population for {battle_id}")
-            battle_populations[battle_id] = evolution(population)
+            # Evolve each population for the next generation
+            print(f"\nEvolving populations for generation {generation + 1}...")
+            start_time = time.perf_counter()
+            battle_populations = scheduler(battle_populations)
+            print(f"Evolved {len(battle_populations)} populations in {time.perf_counter() - start_time:.1f}s")
+            if getattr(scheduler.evolution, "prefilter", None) is not None:
+                print(scheduler.evolution.prefilter)
         
-        generation += 1
+            generation += 1
+
+            all_battles_plotter.update(battle_populations)
+            metrics_log.append(generation, dict(all_battles_plotter.metrics(), **prefilter_metrics(scheduler.evolution)))
+            plot_renderer.maybe_render()
+            save_checkpoint(checkpoint_path, {
+                "scheduler": scheduler,
+                "battle_populations": battle_populations,
+                "all_battles_plotter": all_battles_plotter,
+                "generation": generation,
+            })
+            if generation % TRANSPOSITION_TABLE_CHECKPOINT_EVERY_N_GENERATIONS == 0:
+                save_transposition_table(checkpoint_path)
+    finally:
+        cleanup_process_pool()
+        plot_renderer.close()
+
+def main():
+    parser = argparse.ArgumentParser()
+    add_checkpoint_arguments(parser, default_path="checkpoints/balance_overview.pkl.gz")
+    add_farm_arguments(parser)
+    parser.add_argument(startup_profiler.PROFILE_STARTUP_FLAG, action="store_true", default=False)
+    args = parser.parse_args()
+    use_evaluation_farm(start_farm_from_args(args))
+    run_balance_overview(resume=args.resume, checkpoint_path=args.checkpoint_path)
 
-        all_battles_plotter.update(battle_populations)
-        all_battles_plotter.save_html("plots/balance_overview.html")
 
 if __name__ == "__main__":
-    run_balance_overview()
+    # Pickled jobs have to name this module rather than __main__ for farm workers to load them
+    from balance_overview import main
+    main()
@@ -1,8 +1,14 @@
+import startup_profiler
+startup_profiler.enable_if_requested()
+
 from abc import ABC, abstractmethod
+import argparse
 import math
 import random
-from typing import Dict, List, Tuple, Optional
-from collections import Counter, defaultdict
+import time
+import warnings
+from typing import Callable, Dict, FrozenSet, Hashable, List, Tuple, Optional, Union
+from collections import Counter, OrderedDict, defaultdict
 from functools import total_ordering
 import esper
 import shapely
@@ -13,16 +19,24 @@ from components.team import Team, TeamType
 from components.unit_state import State, UnitState
 from components.unit_type import UnitType
 from components.item import ItemType
+from components.status_effect import DamageOverTime, ExplodeOnDeath, StatusEffects, ZombieInfection
 from components.spell_type import SpellType
-from scene_utils import get_legal_placement_area, get_legal_spell_placement_area, axial_to_world, clip_to_polygon
+from hex_grid import axial_to_world
+from placement_geometry import get_legal_placement_area, get_legal_spell_placement_area, clip_to_polygon, sample_legal_point
 from point_values import unit_values, item_values, spell_values
-from game_constants import get_game_constants_hash
-import plotly.graph_objects as go
+from constant_dependencies import ConstantsSnapshot, Dependency, placement_dependencies
+from checkpoint import add_checkpoint_arguments, load_checkpoint, save_checkpoint
+from evaluation_farm import add_farm_arguments, start_farm_from_args
+from plot_output import MetricsLog, PlotRenderer
+from genome_encoding import canonical_genome, decode_placements, encode_placements
+from lite_battle import simulate_lite_battles
+from surrogate import POINTS_SCALE, SurrogateModel, placement_features, rank_correlation
 from pathlib import Path
 import os
 
 import numpy as np
 import multiprocessing
+import queue
 
 # ALLOWED_UNIT_TYPES = [
 #     UnitType.CORE_ARCHER,
@@ -87,6 +101,9 @@ ALLOWED_ITEM_TYPES = list(ItemType)
 
 ALLOWED_SPELL_TYPES = list(SpellType)
 
+# Positions closer than this are treated as the same when comparing armies, in world units
+POSITION_QUANTUM = 1.0
+
 
 
 @total_ordering
@@ -116,6 +133,10 @@ class Fitness:
     def __eq__(self, other: 'Fitness') -> bool:
         return self._as_tuple() == other._as_tuple()
 
+    def __reduce__(self):
+        # Pickle as a plain tuple to keep results sent back from workers small
+        return (Fitness, (self.outcome, self.points, self.team1_health, self.team2_health))
+
 
 class Individual:
     def __init__(self, battle_id: str, unit_placements: List[Tuple[UnitType, Tuple[float, float], List[ItemType]]], spell_placements: Optional[List[Tuple[SpellType, Tuple[float, float], int]]] = None):
@@ -123,6 +144,67 @@ class Individual:
         self.unit_placements = sorted(unit_placements)
         self.spell_placements = spell_placements or []
         self._fitness = None
+        self._genome: Optional[bytes] = None
+        self._canonical_genome: Optional[bytes] = None
+        self._dependencies: Optional[FrozenSet[Dependency]] = None
+        # Set by RobustEvaluator for individuals that win
+        self._robustness: Optional["Robustness"] = None
+
+    @property
+    def genome(self) -> bytes:
+        """The placements in the compact encoding, used for pickling."""
+        if self._genome is None:
+            self._genome = encode_placements(self.unit_placements, self.spell_placements)
+        return self._genome
+
+    @property
+    def canonical_genome(self) -> bytes:
+        """The placements with positions rounded to POSITION_QUANTUM and sorted, used for hashing and equality."""
+        if self._canonical_genome is None:
+            self._canonical_genome = canonical_genome(
+                self.unit_placements,
+                self.spell_placements,
+                origin=_get_grid_origin(self.battle_id),
+                quantum=POSITION_QUANTUM,
+            )
+        return self._canonical_genome
+
+    @property
+    def dependencies(self) -> FrozenSet[Dependency]:
+        """The unit, item and spell types on both teams of this individual's battle."""
+        if self._dependencies is None:
+            dependencies = placement_dependencies(self.unit_placements, self.spell_placements)
+            try:
+                battle = get_battle_id(self.battle_id)
+            except ValueError:
+                battle = None
+            if battle is not None:
+                dependencies |= placement_dependencies(battle.enemies, battle.spells)
+            self._dependencies = dependencies
+        return self._dependencies
+
+    def constants_hash(self, constants: ConstantsSnapshot) -> str:
+        """Hash the game constants that this individual's battle depends on."""
+        return constants.hash_for(self.dependencies)
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state["_genome"] = self.genome
+        state["_canonical_genome"] = None
+        state["_dependencies"] = None
+        del state["unit_placements"]
+        del state["spell_placements"]
+        return state
+
+    def __setstate__(self, state):
+        # Individuals pickled before the compact encoding have their placements in the state
+        if "unit_placements" not in state:
+            state["unit_placements"], state["spell_placements"] = decode_placements(state["_genome"])
+        state.setdefault("_genome", None)
+        state.setdefault("_robustness", None)
+        state["_canonical_genome"] = None
+        state["_dependencies"] = None
+        self.__dict__.update(state)
     
     @property
     def points(self) -> float:
@@ -155,29 +237,13 @@ class Individual:
         self,
         max_duration: float,
         use_powers: bool,
+        cutoff: Optional[Fitness] = None,
+        stall_duration: Optional[float] = None,
     ) -> Fitness:
         battle = get_battle_id(self.battle_id)
-        enemy_placements = battle.enemies
-        
-        # Convert hex coordinates to world coordinates if hex_coords is available
-        if battle.hex_coords is not None:
-            from hex_grid import axial_to_world
-            world_x, world_y = axial_to_world(*battle.hex_coords)
-            # Convert enemy placements from relative to world coordinates
-            enemy_placements = [
-                (unit_type, (position[0] + world_x, position[1] + world_y), items)
-                for unit_type, position, items in enemy_placements
-            ]
-        def _get_team_health(team_type: TeamType) -> float:
-            total_health = 0
-            for ent, (health, team, unit_state) in esper.get_components(Health, Team, UnitState):
-                if team.type == team_type and unit_state.state != State.DEAD:
-                    total_health += health.current
-            return total_health
-
         _, fitness_result = simulate_battle_with_dependencies(
             ally_placements=self.unit_placements,
-            enemy_placements=enemy_placements,
+            enemy_placements=_get_enemy_placements(battle),
             max_duration=max_duration,
             hex_coords=battle.hex_coords if battle.hex_coords is not None else (0, 0),
             corruption_powers=battle.corruption_powers if use_powers else [],
@@ -187,7 +253,8 @@ class Individual:
                 points=self.points,
                 team1_health=_get_team_health(TeamType.TEAM1),
                 team2_health=_get_team_health(TeamType.TEAM2),
-            )
+            ),
+            abort_predicate=AbortBelowCutoff(cutoff, self.points, stall_duration) if cutoff is not None else None,
         )
         self._fitness = fitness_result
         return fitness_result
@@ -195,24 +262,149 @@ class Individual:
     def __str__(self) -> str:
         return self.short_str()
 
-    def __eq__(self, other: 'Individual') -> bool:
-        return self.unit_placements == other.unit_placements and self.spell_placements == other.spell_placements
+    def __eq__(self, other: object) -> bool:
+        if not isinstance(other, Individual):
+            return NotImplemented
+        # Canonical genomes are relative to the battle's hex, so the same army in another battle differs
+        return self.battle_id == other.battle_id and self.canonical_genome == other.canonical_genome
     
     def __hash__(self) -> int:
-        # Convert all lists to tuples for hashing
-        unit_placements_tuple = tuple((unit_type, position, tuple(items)) for unit_type, position, items in self.unit_placements)
-        spell_placements_tuple = tuple(tuple(spell) for spell in self.spell_placements)
-        return hash((unit_placements_tuple, spell_placements_tuple))
+        return hash((self.battle_id, self.canonical_genome))
+
+def _get_enemy_placements(battle) -> List[Tuple[UnitType, Tuple[float, float], List[ItemType]]]:
+    """Get a battle's enemies in world coordinates."""
+    if battle.hex_coords is None:
+        return battle.enemies
+    # Convert enemy placements from relative to world coordinates
+    world_x, world_y = axial_to_world(*battle.hex_coords)
+    return [
+        (unit_type, (position[0] + world_x, position[1] + world_y), items)
+        for unit_type, position, items in battle.enemies
+    ]
+
+def _get_grid_origin(battle_id: str) -> Tuple[float, float]:
+    """Get the hex center that placement grids are aligned to."""
+    try:
+        hex_coords = get_battle_id(battle_id).hex_coords
+    except ValueError:
+        # Some callers use individuals for armies outside of any battle
+        hex_coords = None
+    return axial_to_world(*(hex_coords or (0, 0)))
+
+def _get_team_health(team_type: TeamType) -> float:
+    total_health = 0
+    for ent, (health, team, unit_state) in esper.get_components(Health, Team, UnitState):
+        if team.type == team_type and unit_state.state != State.DEAD:
+            total_health += health.current
+    return total_health
+
+def _team1_can_act() -> bool:
+    """Check whether anything of team 1's can still lower team 2's health or revive for team 1.
+
+    That is living units, spells, projectiles and areas of effect, and team 2
+    units that are burning, will explode or will revive for team 1.
+    """
+    for ent, team in esper.get_component(Team):
+        if team.type != TeamType.TEAM1:
+            continue
+        unit_state = esper.try_component(ent, UnitState)
+        if unit_state is None or unit_state.state != State.DEAD:
+            return True
+    for _, (status_effects, team) in esper.get_components(StatusEffects, Team):
+        if team.type != TeamType.TEAM2:
+            continue
+        for status_effect in status_effects.active_effects():
+            if isinstance(status_effect, (DamageOverTime, ExplodeOnDeath)):
+                return True
+            if isinstance(status_effect, ZombieInfection) and status_effect.team == TeamType.TEAM1:
+                return True
+    return False
+
+class AbortBelowCutoff:
+    """Stops a simulation once it can't beat the cutoff fitness.
+
+    By default a battle is only stopped once its loss is decided: nothing of
+    team 1's can lower team 2's health any more (see _team1_can_act), and the
+    loss at team 2's current health is below the cutoff. Aborted battles are
+    treated as timeouts, so their fitness is that loss. This is exact, but
+    saves little, since the battle would end a moment later anyway.
+
+    With a stall_duration, battles are also stopped once team 2's health
+    hasn't dropped for that many seconds while below the cutoff, which is what
+    cuts stalemates short. That is only a heuristic: slow approaches, kiting,
+    healers and summons can pause damage for longer in battles that team 1
+    still wins. Measure how often it discards winners with abort_audit.py
+    before setting it with EvolutionStrategy's or SteadyStateEvolution's
+    stall_duration.
+    """
 
-def _evaluate(individual: Individual, max_duration: float, use_powers: bool):
-    return individual.evaluate(max_duration, use_powers)
+    def __init__(self, cutoff: Fitness, points: float, stall_duration: Optional[float] = None):
+        self.cutoff = cutoff
+        self.points = points
+        self.stall_duration = stall_duration
+        self._lowest_team2_health = float("inf")
+        self._last_improvement_time = 0.0
+
+    def _is_decided(self, elapsed_time: float, team2_health: float) -> bool:
+        if team2_health < self._lowest_team2_health - 1e-6:
+            self._lowest_team2_health = team2_health
+            self._last_improvement_time = elapsed_time
+        if self.stall_duration is not None and elapsed_time - self._last_improvement_time >= self.stall_duration:
+            return True
+        return not _team1_can_act()
+
+    def __call__(self, elapsed_time: float) -> bool:
+        team2_health = _get_team_health(TeamType.TEAM2)
+        if not self._is_decided(elapsed_time, team2_health):
+            return False
+        current_fitness = Fitness(
+            outcome=BattleOutcome.TIMEOUT,
+            points=self.points,
+            team1_health=_get_team_health(TeamType.TEAM1),
+            team2_health=team2_health,
+        )
+        return current_fitness < self.cutoff
+
+def _evaluate(
+    individual: Individual,
+    max_duration: float,
+    use_powers: bool,
+    cutoff: Optional[Fitness] = None,
+    stall_duration: Optional[float] = None,
+):
+    return individual.evaluate(max_duration, use_powers, cutoff, stall_duration)
+
+def _evaluate_timed(
+    individual: Individual,
+    max_duration: float,
+    use_powers: bool,
+    cutoff: Optional[Fitness] = None,
+    stall_duration: Optional[float] = None,
+) -> Tuple[Fitness, float]:
+    """Evaluate an individual, also returning how many seconds the simulation took."""
+    start = time.perf_counter()
+    fitness = individual.evaluate(max_duration, use_powers, cutoff, stall_duration)
+    return fitness, time.perf_counter() - start
 
 # Add this at the module level
 _global_process_pool = None
+_global_evaluation_farm = None
+_pool_constants_hash: Optional[str] = None
+
+def use_evaluation_farm(farm) -> None:
+    """Evaluate on a farm of remote workers instead of the local process pool.
+
+    The farm's workers reload the game constants for every job, so the farm
+    isn't restarted by cleanup_process_pool.
+    """
+    global _global_evaluation_farm
+    _global_evaluation_farm = farm
 
 def get_process_pool(num_processes=None):
     """Get or create the global process pool."""
     global _global_process_pool
+    if _global_evaluation_farm is not None:
+        return _global_evaluation_farm
     if _global_process_pool is None:
         if num_processes is None:
             num_processes = multiprocessing.cpu_count()
@@ -227,41 +419,305 @@ def cleanup_process_pool():
         _global_process_pool.join()
         _global_process_pool = None
 
+def _terminate_process_pool() -> None:
+    """Stop the local process pool without waiting for its jobs, some of which may never finish."""
+    global _global_process_pool
+    if _global_process_pool is not None:
+        _global_process_pool.terminate()
+        _global_process_pool.join()
+        _global_process_pool = None
+
+# Seconds without any job finishing before PoolJobs assumes a worker died
+JOB_TIMEOUT_SECONDS = 600.0
+
+class PoolJobs:
+    """Runs jobs on the process pool and returns their results as they finish.
+
+    If a pool worker dies, e.g. it is killed for using too much memory or
+    crashes in pygame or shapely, neither of its job's callbacks is ever
+    called. So if no job finishes for timeout seconds, the local pool is
+    terminated and the jobs in flight are submitted again, up to max_retries
+    times each before a TimeoutError is raised.
+    """
+
+    def __init__(self, timeout: float = JOB_TIMEOUT_SECONDS, max_retries: int = 1):
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self._completed: "queue.Queue[Tuple[int, Hashable, object]]" = queue.Queue()
+        # The function, arguments, attempts and submission number of each job in flight
+        self._in_flight: Dict[Hashable, Tuple[Callable, Tuple, int, int]] = {}
+        self._submissions = 0
+
+    def __len__(self) -> int:
+        return len(self._in_flight)
+
+    def submit(self, key: Hashable, func: Callable, args: Tuple, attempts: int = 0) -> None:
+        """Run func(*args) on the pool. Its result is returned by get under key."""
+        self._submissions += 1
+        submission = self._submissions
+        self._in_flight[key] = (func, args, attempts, submission)
+        get_process_pool().apply_async(
+            func,
+            args,
+            callback=lambda result: self._completed.put((submission, key, result)),
+            error_callback=lambda error: self._completed.put((submission, key, error)),
+        )
+
+    def put(self, key: Hashable, result: object) -> None:
+        """Return a result that is already known from get, like a job's."""
+        self._submissions += 1
+        self._in_flight[key] = (None, (), 0, self._submissions)
+        self._completed.put((self._submissions, key, result))
+
+    def get(self) -> Tuple[Hashable, object]:
+        """Wait for the next job to finish and get its key and result, raising the job's error if it failed."""
+        while True:
+            try:
+                submission, key, result = self._completed.get(timeout=self.timeout)
+            except queue.Empty:
+                self._resubmit_in_flight()
+                continue
+            # Results of jobs that were resubmitted may still come in
+            if key not in self._in_flight or self._in_flight[key][3] != submission:
+                continue
+            del self._in_flight[key]
+            if isinstance(result, Exception):
+                raise result
+            return key, result
+
+    def _resubmit_in_flight(self) -> None:
+        if not self._in_flight:
+            raise RuntimeError("Waiting for a job when none are in flight")
+        print(f"No job finished in {self.timeout:.0f}s, restarting the process pool and resubmitting {len(self._in_flight)} jobs")
+        _terminate_process_pool()
+        for key, (func, args, attempts, _) in list(self._in_flight.items()):
+            if func is None:
+                continue
+            if attempts >= self.max_retries:
+                raise TimeoutError(f"Job {key} didn't finish after {attempts + 1} attempts")
+            self.submit(key, func, args, attempts + 1)
+
+def get_constants() -> ConstantsSnapshot:
+    """Reload the game constants, restarting the process pool if they changed.
+
+    Workers read the constants, and values derived from them like the point
+    values, when they start, so they can't be updated in place.
+    """
+    global _pool_constants_hash
+    constants = ConstantsSnapshot()
+    if constants.hash != _pool_constants_hash:
+        if _pool_constants_hash is not None:
+            print(f"Game constants hash changed to {constants.hash}")
+        cleanup_process_pool()
+        _pool_constants_hash = constants.hash
+    return constants
+
+class TranspositionTable:
+    """Remembers evaluated fitnesses so that duplicate armies aren't simulated again.
+
+    Armies are keyed by battle, canonical genome and simulation settings, so
+    armies that only differ by sub-quantum position changes or placement order
+    share an entry. The key also has the hash of the game constants that the
+    battle depends on, so editing a constant only invalidates the entries of
+    battles with the types it affects. The least recently used entries,
+    including invalidated ones, are dropped past max_entries.
+
+    A fitness evaluated with a cutoff may come from a battle that was aborted
+    below the cutoff. It is only reused for a cutoff that it is also below
+    and that isn't above the one it was evaluated with. Checks before the
+    abort were above both cutoffs, so the (deterministic) battle would have
+    been aborted at the same point.
+    """
+
+    def __init__(self, max_entries: int = 200_000):
+        self.max_entries = max_entries
+        # Each entry is the fitness and, if the battle may have been aborted, its cutoff
+        self._entries: OrderedDict[Tuple, Tuple[Fitness, Optional[Fitness]]] = OrderedDict()
+        self.num_hits = 0
+        self.num_misses = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _key(
+        self,
+        individual: Individual,
+        max_duration: float,
+        use_powers: bool,
+        constants: ConstantsSnapshot,
+        stall_duration: Optional[float],
+    ) -> Tuple:
+        return (
+            individual.battle_id,
+            individual.canonical_genome,
+            max_duration,
+            use_powers,
+            individual.constants_hash(constants),
+            stall_duration,
+        )
+
+    def lookup(
+        self,
+        individual: Individual,
+        max_duration: float,
+        use_powers: bool,
+        cutoff: Optional[Fitness],
+        constants: ConstantsSnapshot,
+        stall_duration: Optional[float] = None,
+    ) -> Optional[Fitness]:
+        """Get the fitness of an equivalent army, or None if it has to be simulated."""
+        key = self._key(individual, max_duration, use_powers, constants, stall_duration)
+        entry = self._entries.get(key)
+        if entry is not None:
+            fitness, abort_cutoff = entry
+            if abort_cutoff is None or (cutoff is not None and fitness < cutoff <= abort_cutoff):
+                self._entries.move_to_end(key)
+                self.num_hits += 1
+                return fitness
+        self.num_misses += 1
+        return None
+
+    def store(
+        self,
+        individual: Individual,
+        max_duration: float,
+        use_powers: bool,
+        cutoff: Optional[Fitness],
+        fitness: Fitness,
+        constants: ConstantsSnapshot,
+        stall_duration: Optional[float] = None,
+    ) -> None:
+        """Remember the fitness of a simulated army."""
+        key = self._key(individual, max_duration, use_powers, constants, stall_duration)
+        # Battles are only aborted below the cutoff
+        abort_cutoff = None if cutoff is None or fitness >= cutoff else cutoff
+        existing = self._entries.get(key)
+        if existing is not None and existing[1] is None and abort_cutoff is not None:
+            return
+        self._entries[key] = (fitness, abort_cutoff)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def __str__(self) -> str:
+        lookups = self.num_hits + self.num_misses
+        hit_rate = self.num_hits / lookups if lookups else 0.0
+        return f"Transposition table: {len(self)} entries, {self.num_hits}/{lookups} lookups hit ({hit_rate:.0%})"
+
+_transposition_table = TranspositionTable()
+
+def get_transposition_table() -> TranspositionTable:
+    """Get the table of fitnesses shared by all evaluations in this process."""
+    return _transposition_table
+
+def use_transposition_table(table: TranspositionTable) -> None:
+    """Replace the shared table, e.g. with one restored from a checkpoint."""
+    global _transposition_table
+    _transposition_table = table
+
+def _transposition_table_path(checkpoint_path: str) -> str:
+    directory, name = os.path.split(checkpoint_path)
+    stem, _, extension = name.partition(".")
+    return os.path.join(directory, f"{stem}.transposition_table.{extension}")
+
+def save_transposition_table(checkpoint_path: str) -> None:
+    """Checkpoint the shared table next to a run's checkpoint.
+
+    The table can hold hundreds of thousands of entries, so it is saved in its
+    own file, less often than the rest of the run. Its entries are keyed by
+    the constants they were evaluated with, so an older table is still valid.
+    """
+    save_checkpoint(_transposition_table_path(checkpoint_path), {"transposition_table": _transposition_table})
+
+def load_transposition_table(checkpoint_path: str, state: Dict) -> None:
+    """Restore the shared table saved next to a run's checkpoint, whose state is given."""
+    path = _transposition_table_path(checkpoint_path)
+    if os.path.exists(path):
+        table = load_checkpoint(path, restore_random_state=False)["transposition_table"]
+    else:
+        # Checkpoints from before the table was saved separately
+        table = state.get("transposition_table", TranspositionTable())
+    use_transposition_table(table)
+
+def _evaluate_all(
+    individuals: List[Individual],
+    max_duration: float,
+    use_powers: bool,
+    cutoff: Optional[Fitness] = None,
+    constants: Optional[ConstantsSnapshot] = None,
+    stall_duration: Optional[float] = None,
+) -> List[Fitness]:
+    """Simulate individuals, in parallel when there is more than one.
+
+    If a cutoff is given, battles that can't beat it are stopped early, and
+    with a stall_duration also battles stalled below it (see
+    AbortBelowCutoff). If the game constants are given, fitnesses are reused
+    from the transposition table and equivalent individuals are only
+    simulated once.
+    """
+    if constants is None:
+        to_simulate = individuals
+    else:
+        fitnesses: Dict[Individual, Fitness] = {}
+        to_simulate = []
+        for ind in set(individuals):
+            fitness = _transposition_table.lookup(ind, max_duration, use_powers, cutoff, constants, stall_duration)
+            if fitness is not None:
+                fitnesses[ind] = fitness
+            else:
+                to_simulate.append(ind)
+
+    if len(to_simulate) > 1:
+        pool = get_process_pool()
+        results = pool.starmap(_evaluate, [(ind, max_duration, use_powers, cutoff, stall_duration) for ind in to_simulate])
+    else:
+        # For a single individual, avoid the overhead of using the pool
+        results = [ind.evaluate(max_duration, use_powers, cutoff, stall_duration) for ind in to_simulate]
+
+    if constants is None:
+        return results
+    for ind, fitness in zip(to_simulate, results):
+        _transposition_table.store(ind, max_duration, use_powers, cutoff, fitness, constants, stall_duration)
+        fitnesses[ind] = fitness
+    return [fitnesses[ind] for ind in individuals]
+
 class Population:
     def __init__(self, individuals: List[Individual]):
         self.individuals = individuals
 
-    def evaluate(self, max_duration: float = 120.0, use_powers: bool = False):
-        game_constants_hash = get_game_constants_hash()
-        game_constants_hash_changed = False
+    def _individuals_to_evaluate(self, constants: ConstantsSnapshot) -> List[Individual]:
+        """Get the individuals without a fitness for the game constants their battle depends on."""
+        num_invalidated = 0
         individuals_to_evaluate = []
         for ind in self.individuals:
             if ind.needs_evaluation():
                 individuals_to_evaluate.append(ind)
-            elif getattr(ind, "_constants_hash", game_constants_hash) != game_constants_hash:
+            elif getattr(ind, "_constants_hash", ind.constants_hash(constants)) != ind.constants_hash(constants):
                 individuals_to_evaluate.append(ind)
-                game_constants_hash_changed = True
+                num_invalidated += 1
 
-        if game_constants_hash_changed:
-            print(f"Game constants hash changed to {game_constants_hash}")
-            cleanup_process_pool()
+        if num_invalidated:
+            print(f"Game constants changed for {num_invalidated} individuals")
+        return individuals_to_evaluate
 
+    def evaluate(
+        self,
+        max_duration: float = 120.0,
+        use_powers: bool = False,
+        cutoff: Optional[Fitness] = None,
+        stall_duration: Optional[float] = None,
+    ):
+        constants = get_constants()
+        individuals_to_evaluate = self._individuals_to_evaluate(constants)
         if not individuals_to_evaluate:
             return
         
-        if len(individuals_to_evaluate) > 1:
-            pool = get_process_pool()
-            results = pool.starmap(_evaluate, [(ind, max_duration, use_powers) for ind in individuals_to_evaluate])
-            
-            # Update the fitness for each individual in the main process
-            for ind, fitness in zip(individuals_to_evaluate, results):
-                ind._fitness = fitness
-                ind._constants_hash = game_constants_hash
-        else:
-            # For a single individual, avoid the overhead of using the pool
-            for ind in individuals_to_evaluate:
-                ind._fitness = ind.evaluate(max_duration, use_powers)
-                ind._constants_hash = game_constants_hash
+        results = _evaluate_all(individuals_to_evaluate, max_duration, use_powers, cutoff, constants, stall_duration)
+        # Update the fitness for each individual in the main process
+        for ind, fitness in zip(individuals_to_evaluate, results):
+            ind._fitness = fitness
+            ind._constants_hash = ind.constants_hash(constants)
+
     @property
     def best_individuals(self) -> List[Individual]:
         best_score = max(ind.fitness for ind in self.individuals).points
@@ -284,6 +740,8 @@ class Population:
         for ind in self.best_individuals:
             str += f"\t{ind.short_str()}\n"
             str += f"\t\t{ind.fitness}\n"
+            if ind._robustness is not None:
+                str += f"\t\t{ind._robustness}\n"
             str += f"\t\t{repr(ind.unit_placements)}\n"
         str += f"Number winning: {len(winning_individuals)}\n"
         quantiles = [0.0, 0.1, 0.25, 0.5, 0.75, 1.0]
@@ -308,6 +766,472 @@ class Population:
             str += f"\t{unit_type:<20}: {count:<5}\n"
         return str
 
+class MultiFidelityEvaluator:
+    """Evaluates individuals in stages, only fully simulating promising ones.
+
+    1. Individuals that can't beat the cutoff even by winning (more points
+       than a winning cutoff) aren't simulated at all.
+    2. The rest are screened with a short simulation. Battles decided within
+       the screening horizon get their exact fitness from the screen.
+    3. Of the screened battles that timed out, the best promotion_fraction by
+       screened fitness are simulated at full length, as is any that the
+       cutoff would select on its screened fitness. The others keep their
+       screened fitness.
+
+    A random audit_fraction of the unpromoted individuals are also fully
+    simulated so the rank correlation between the screen and the full
+    simulation can be reported without only looking at promoted individuals.
+    """
+
+    def __init__(
+        self,
+        screen_duration: float = 30.0,
+        full_duration: float = 120.0,
+        promotion_fraction: float = 0.5,
+        audit_fraction: float = 0.1,
+    ):
+        self.screen_duration = screen_duration
+        self.full_duration = full_duration
+        self.promotion_fraction = promotion_fraction
+        self.audit_fraction = audit_fraction
+        self.num_skipped = 0
+        self.num_decided_by_screen = 0
+        self.num_promoted = 0
+        self.num_rejected = 0
+        self.last_rank_correlation = float("nan")
+
+    def evaluate(
+        self,
+        population: Population,
+        cutoff: Optional[Fitness],
+        use_powers: bool,
+        stall_duration: Optional[float] = None,
+    ) -> None:
+        """Evaluate a population, comparing against the worst fitness that is still selected."""
+        if cutoff is None:
+            population.evaluate(max_duration=self.full_duration, use_powers=use_powers)
+            return
+        constants = get_constants()
+        individuals_to_evaluate = population._individuals_to_evaluate(constants)
+        final_fitnesses: Dict[Individual, Fitness] = {}
+
+        # Stage 1: a win is the best possible outcome, so compare its fitness to the cutoff
+        to_screen = []
+        for ind in individuals_to_evaluate:
+            best_case = Fitness(BattleOutcome.TEAM1_VICTORY, ind.points, float("inf"), 0)
+            if best_case < cutoff:
+                final_fitnesses[ind] = Fitness(BattleOutcome.TIMEOUT, ind.points, 0, float("inf"))
+                self.num_skipped += 1
+            else:
+                to_screen.append(ind)
+
+        # Stage 2: screen with a short simulation
+        timed_out = []
+        for ind, fitness in zip(to_screen, _evaluate_all(to_screen, self.screen_duration, use_powers, cutoff, constants, stall_duration)):
+            if fitness.outcome == BattleOutcome.TIMEOUT:
+                timed_out.append((ind, fitness))
+            else:
+                final_fitnesses[ind] = fitness
+                self.num_decided_by_screen += 1
+
+        # Stage 3: fully simulate the most promising of the undecided battles
+        timed_out.sort(key=lambda pair: pair[1], reverse=True)
+        # Anything that would be selected on its screened fitness must be fully simulated
+        num_above_cutoff = sum(1 for _, fitness in timed_out if fitness >= cutoff)
+        num_promoted = max(math.ceil(len(timed_out) * self.promotion_fraction), num_above_cutoff)
+        promoted = [ind for ind, _ in timed_out[:num_promoted]]
+        audited = [ind for ind, _ in timed_out[num_promoted:] if random.random() < self.audit_fraction]
+        self.num_promoted += len(promoted)
+        self.num_rejected += len(timed_out) - num_promoted - len(audited)
+        screened_fitnesses = dict(timed_out)
+        full_results = _evaluate_all(promoted + audited, self.full_duration, use_powers, cutoff, constants, stall_duration)
+        for ind, fitness in zip(promoted + audited, full_results):
+            final_fitnesses[ind] = fitness
+        for ind, fitness in timed_out[num_promoted:]:
+            final_fitnesses.setdefault(ind, fitness)
+        self.last_rank_correlation = rank_correlation(
+            [screened_fitnesses[ind] for ind in promoted + audited],
+            full_results,
+            key=Fitness._as_tuple,
+        )
+
+        for ind in individuals_to_evaluate:
+            ind._fitness = final_fitnesses[ind]
+            ind._constants_hash = ind.constants_hash(constants)
+
+    def __str__(self) -> str:
+        return (
+            f"Skipped: {self.num_skipped}, decided by screen: {self.num_decided_by_screen}, "
+            f"promoted: {self.num_promoted}, rejected: {self.num_rejected}, "
+            f"screen/full rank correlation: {self.last_rank_correlation:.2f}"
+        )
+
+def wilson_interval(successes: int, trials: int, z: float = 1.96) -> Tuple[float, float]:
+    """Confidence interval of a success rate, which stays inside [0, 1] even for few trials."""
+    if trials == 0:
+        return 0.0, 1.0
+    rate = successes / trials
+    denominator = 1 + z**2 / trials
+    center = (rate + z**2 / (2 * trials)) / denominator
+    margin = z * math.sqrt(rate * (1 - rate) / trials + z**2 / (4 * trials**2)) / denominator
+    return max(0.0, center - margin), min(1.0, center + margin)
+
+def jitter_individual(individual: Individual, noise_scale: float) -> Individual:
+    """Move every unit and spell by gaussian noise, clipped to their legal areas."""
+    battle = get_battle_id(individual.battle_id)
+    hex_coords = battle.hex_coords or (0, 0)
+    unit_area = get_legal_placement_area(
+        battle_id=individual.battle_id,
+        hex_coords=hex_coords,
+        required_team=TeamType.TEAM1,
+        include_units=False,
+    )
+    unit_placements = [
+        (unit_type, clip_to_polygon(unit_area, x + random.gauss(0, noise_scale), y + random.gauss(0, noise_scale)), items)
+        for unit_type, (x, y), items in individual.unit_placements
+    ]
+    spell_placements = individual.spell_placements
+    if spell_placements:
+        spell_area = get_legal_spell_placement_area(individual.battle_id, hex_coords)
+        spell_placements = [
+            (spell_type, clip_to_polygon(spell_area, x + random.gauss(0, noise_scale), y + random.gauss(0, noise_scale)), team)
+            for spell_type, (x, y), team in spell_placements
+        ]
+    return Individual(individual.battle_id, unit_placements, spell_placements)
+
+class Robustness:
+    """How an individual's jittered copies did."""
+
+    def __init__(self, fitnesses: List[Fitness]):
+        self.num_copies = len(fitnesses)
+        self.wins = sum(1 for fitness in fitnesses if fitness.outcome == BattleOutcome.TEAM1_VICTORY)
+        self.team1_health = float(np.mean([fitness.team1_health for fitness in fitnesses])) if fitnesses else 0.0
+        self.team2_health = float(np.mean([fitness.team2_health for fitness in fitnesses])) if fitnesses else 0.0
+
+    @property
+    def win_rate(self) -> float:
+        return self.wins / self.num_copies if self.num_copies else 0.0
+
+    def confidence_interval(self, z: float = 1.96) -> Tuple[float, float]:
+        return wilson_interval(self.wins, self.num_copies, z)
+
+    def __str__(self) -> str:
+        low, high = self.confidence_interval()
+        return f"Jittered win rate: {self.win_rate:.2f} ({self.wins}/{self.num_copies}, 95% CI {low:.2f}-{high:.2f})"
+
+def evaluate_robustness(
+    individuals: List[Individual],
+    num_copies: int,
+    noise_scale: float,
+    max_duration: float = 120.0,
+    use_powers: bool = False,
+) -> List[Robustness]:
+    """Simulate num_copies jittered copies of each individual.
+
+    The copies of all individuals are simulated in one batch, so the pool is
+    kept busy however few individuals there are.
+    """
+    copies = [jitter_individual(ind, noise_scale) for ind in individuals for _ in range(num_copies)]
+    fitnesses = _evaluate_all(copies, max_duration, use_powers)
+    return [
+        Robustness(fitnesses[i * num_copies:(i + 1) * num_copies])
+        for i in range(len(individuals))
+    ]
+
+class RobustEvaluator:
+    """Evaluates individuals by how reliably they win when their positions are jittered.
+
+    Evolution tends to find knife-edge solutions that only win at their exact
+    positions. Individuals that win are also simulated as num_copies copies
+    with every unit and spell moved by noise_scale, and only keep their win if
+    at least min_win_rate of the copies win. Otherwise they are ranked like a
+    timeout, by the copies' average health left on team 2. Individuals that
+    lose aren't jittered.
+    """
+
+    def __init__(
+        self,
+        num_copies: int = 8,
+        noise_scale: float = 10.0,
+        min_win_rate: float = 0.75,
+        max_duration: float = 120.0,
+    ):
+        self.num_copies = num_copies
+        self.noise_scale = noise_scale
+        self.min_win_rate = min_win_rate
+        self.max_duration = max_duration
+        self.num_checked = 0
+        self.num_fragile = 0
+
+    def evaluate(
+        self,
+        population: Population,
+        cutoff: Optional[Fitness],
+        use_powers: bool,
+        stall_duration: Optional[float] = None,
+    ) -> None:
+        constants = get_constants()
+        individuals_to_evaluate = population._individuals_to_evaluate(constants)
+        fitnesses = _evaluate_all(individuals_to_evaluate, self.max_duration, use_powers, cutoff, constants, stall_duration)
+        winners = [
+            (ind, fitness) for ind, fitness in zip(individuals_to_evaluate, fitnesses)
+            if fitness.outcome == BattleOutcome.TEAM1_VICTORY
+        ]
+        robustness = evaluate_robustness(
+            [ind for ind, _ in winners], self.num_copies, self.noise_scale, self.max_duration, use_powers,
+        )
+        robust_fitnesses = {}
+        for (ind, fitness), ind_robustness in zip(winners, robustness):
+            ind._robustness = ind_robustness
+            self.num_checked += 1
+            if ind_robustness.win_rate < self.min_win_rate:
+                self.num_fragile += 1
+                fitness = Fitness(BattleOutcome.TIMEOUT, fitness.points, ind_robustness.team1_health, ind_robustness.team2_health)
+            robust_fitnesses[ind] = fitness
+        for ind, fitness in zip(individuals_to_evaluate, fitnesses):
+            ind._fitness = robust_fitnesses.get(ind, fitness)
+            ind._constants_hash = ind.constants_hash(constants)
+
+    def __str__(self) -> str:
+        return f"Winners jittered: {self.num_checked}, fragile: {self.num_fragile}"
+
+def _lite_fitnesses(individuals: List[Individual], max_duration: float, dt: float = 0.1) -> List[Fitness]:
+    """Approximate fitnesses from the lite battle engine, with every battle stepped together in this process."""
+    enemy_placements = {}
+    battles = []
+    for ind in individuals:
+        if ind.battle_id not in enemy_placements:
+            enemy_placements[ind.battle_id] = _get_enemy_placements(get_battle_id(ind.battle_id))
+        battles.append((ind.unit_placements, enemy_placements[ind.battle_id]))
+    return [
+        Fitness(outcome, ind.points, team1_health, team2_health)
+        for ind, (outcome, team1_health, team2_health) in zip(individuals, simulate_lite_battles(battles, max_duration, dt))
+    ]
+
+class LitePrefilter:
+    """Rejects unpromising individuals with the lite battle engine before they are simulated.
+
+    The unevaluated individuals of all populations are simulated together with
+    the lite engine (see lite_battle). Only the best keep_fraction of each
+    population's, by lite fitness, are simulated normally. The rest get a
+    fitness that can't be selected. A random audit_fraction of the rejected
+    individuals are simulated anyway, so the rank correlation between lite and
+    real fitnesses doesn't only look at the individuals that were kept.
+
+    Only populations whose parents are evaluated should be filtered, so that
+    there are always enough unrejected individuals to select.
+    """
+
+    def __init__(self, keep_fraction: float = 0.5, audit_fraction: float = 0.1, max_duration: float = 120.0):
+        self.keep_fraction = keep_fraction
+        self.audit_fraction = audit_fraction
+        self.max_duration = max_duration
+        self.num_kept = 0
+        self.num_rejected = 0
+        self.last_rank_correlation = float("nan")
+        # The lite fitnesses of each population's individuals that are simulated normally
+        self._simulated: List[Dict[Individual, Fitness]] = []
+
+    def apply(self, populations: List[Population]) -> None:
+        """Reject the unevaluated individuals that the lite engine ranks lowest."""
+        constants = get_constants()
+        groups = [population._individuals_to_evaluate(constants) for population in populations]
+        individuals = [ind for group in groups for ind in group]
+        lite_fitnesses = _lite_fitnesses(individuals, self.max_duration)
+        self._simulated = []
+        start = 0
+        for group in groups:
+            ranked = sorted(
+                zip(group, lite_fitnesses[start:start + len(group)]),
+                key=lambda pair: pair[1],
+                reverse=True,
+            )
+            start += len(group)
+            num_kept = math.ceil(len(ranked) * self.keep_fraction)
+            simulated = dict(ranked[:num_kept])
+            for ind, lite_fitness in ranked[num_kept:]:
+                if random.random() < self.audit_fraction:
+                    simulated[ind] = lite_fitness
+                    continue
+                ind._fitness = Fitness(BattleOutcome.TIMEOUT, ind.points, 0, float("inf"))
+                ind._constants_hash = ind.constants_hash(constants)
+                self.num_rejected += 1
+            self.num_kept += num_kept
+            self._simulated.append(simulated)
+
+    def record(self) -> None:
+        """Compare the lite fitnesses of the last filtered individuals with their real fitnesses."""
+        correlations = [
+            rank_correlation(list(simulated.values()), [ind.fitness for ind in simulated], key=Fitness._as_tuple)
+            for simulated in self._simulated
+            if all(not ind.needs_evaluation() for ind in simulated)
+        ]
+        correlations = [correlation for correlation in correlations if not math.isnan(correlation)]
+        if correlations:
+            self.last_rank_correlation = float(np.mean(correlations))
+        self._simulated = []
+
+    def __str__(self) -> str:
+        return (
+            f"Lite prefilter kept: {self.num_kept}, rejected: {self.num_rejected}, "
+            f"lite/real rank correlation: {self.last_rank_correlation:.2f}"
+        )
+
+    def metrics(self) -> Dict[str, float]:
+        """The prefilter's latest statistics, for a MetricsLog."""
+        return {
+            "lite_prefilter/kept": self.num_kept,
+            "lite_prefilter/rejected": self.num_rejected,
+            "lite_prefilter/rank_correlation": self.last_rank_correlation,
+        }
+
+def _surrogate_target(fitness: Fitness) -> float:
+    """A score that orders fitnesses like Fitness does, ignoring tie breaks.
+
+    Losses score between 0 and 1 by the enemy health left, wins between 1 and 2
+    by the points used.
+    """
+    if fitness.outcome == BattleOutcome.TEAM1_VICTORY:
+        return 1 + POINTS_SCALE / (POINTS_SCALE + fitness.points)
+    return POINTS_SCALE / (POINTS_SCALE + fitness.team2_health)
+
+class SurrogatePrefilter:
+    """Rejects unpromising individuals with an online surrogate model before they are simulated.
+
+    The surrogate (see surrogate) is trained on the features and fitnesses of
+    every individual this prefilter lets through. Until it has min_samples
+    samples, every individual is simulated. After that only the best
+    keep_fraction of each population's unevaluated individuals, by predicted
+    fitness, are simulated, plus a random exploration_fraction of the rest so
+    the surrogate keeps learning about the armies it ranks low. The rest get a
+    fitness that can't be selected.
+
+    Only populations whose parents are evaluated should be filtered, so that
+    there are always enough unrejected individuals to select.
+    """
+
+    def __init__(
+        self,
+        keep_fraction: float = 0.5,
+        exploration_fraction: float = 0.1,
+        min_samples: int = 200,
+        model: Optional[SurrogateModel] = None,
+    ):
+        self.keep_fraction = keep_fraction
+        self.exploration_fraction = exploration_fraction
+        self.min_samples = min_samples
+        self.model = model if model is not None else SurrogateModel()
+        self.num_kept = 0
+        self.num_rejected = 0
+        self.last_rank_correlation = float("nan")
+        self.last_outcome_accuracy = float("nan")
+        self.last_mean_absolute_error = float("nan")
+        self._enemy_placements: Dict[str, List[Tuple[UnitType, Tuple[float, float], List[ItemType]]]] = {}
+        # The features and predicted score, if any, of each population's individuals that are simulated normally
+        self._simulated: List[Dict[Individual, Tuple[np.ndarray, Optional[float]]]] = []
+
+    def _features(self, individuals: List[Individual]) -> np.ndarray:
+        rows = []
+        for ind in individuals:
+            if ind.battle_id not in self._enemy_placements:
+                self._enemy_placements[ind.battle_id] = _get_enemy_placements(get_battle_id(ind.battle_id))
+            rows.append(placement_features(ind.unit_placements, ind.spell_placements, self._enemy_placements[ind.battle_id]))
+        return np.array(rows)
+
+    def apply(self, populations: List[Population]) -> None:
+        """Reject the unevaluated individuals that the surrogate ranks lowest."""
+        constants = get_constants()
+        groups = [population._individuals_to_evaluate(constants) for population in populations]
+        individuals = [ind for group in groups for ind in group]
+        self._simulated = []
+        if not individuals:
+            return
+        features = self._features(individuals)
+        is_filtering = self.model.is_trained and self.model.num_samples >= self.min_samples
+        predictions = self.model.predict(features) if is_filtering else [None] * len(individuals)
+        start = 0
+        for group in groups:
+            scored = list(zip(group, features[start:start + len(group)], predictions[start:start + len(group)]))
+            start += len(group)
+            if not is_filtering:
+                self._simulated.append({ind: (ind_features, None) for ind, ind_features, _ in scored})
+                continue
+            ranked = sorted(scored, key=lambda triple: triple[2], reverse=True)
+            num_kept = math.ceil(len(ranked) * self.keep_fraction)
+            simulated = {ind: (ind_features, prediction) for ind, ind_features, prediction in ranked[:num_kept]}
+            for ind, ind_features, prediction in ranked[num_kept:]:
+                if random.random() < self.exploration_fraction:
+                    simulated[ind] = (ind_features, prediction)
+                    continue
+                ind._fitness = Fitness(BattleOutcome.TIMEOUT, ind.points, 0, float("inf"))
+                ind._constants_hash = ind.constants_hash(constants)
+                self.num_rejected += 1
+            self.num_kept += num_kept
+            self._simulated.append(simulated)
+
+    def record(self) -> None:
+        """Log the surrogate's accuracy on the last simulated individuals, then train it on them."""
+        correlations = []
+        predicted, actual = [], []
+        samples, targets = [], []
+        for simulated in self._simulated:
+            evaluated = [(ind, pair) for ind, pair in simulated.items() if not ind.needs_evaluation()]
+            for ind, (ind_features, _) in evaluated:
+                samples.append(ind_features)
+                targets.append(_surrogate_target(ind.fitness))
+            scored = [(prediction, _surrogate_target(ind.fitness)) for ind, (_, prediction) in evaluated if prediction is not None]
+            if scored:
+                correlations.append(rank_correlation([p for p, _ in scored], [a for _, a in scored]))
+                predicted.extend(p for p, _ in scored)
+                actual.extend(a for _, a in scored)
+        correlations = [correlation for correlation in correlations if not math.isnan(correlation)]
+        if correlations:
+            self.last_rank_correlation = float(np.mean(correlations))
+        if predicted:
+            predicted, actual = np.array(predicted), np.array(actual)
+            # Scores above 1 are wins
+            self.last_outcome_accuracy = float(np.mean((predicted > 1) == (actual > 1)))
+            self.last_mean_absolute_error = float(np.mean(np.abs(predicted - actual)))
+        if samples:
+            self.model.add(np.array(samples), np.array(targets))
+            self.model.fit()
+        self._simulated = []
+
+    def __str__(self) -> str:
+        return (
+            f"Surrogate prefilter samples: {self.model.num_samples}, kept: {self.num_kept}, rejected: {self.num_rejected}, "
+            f"predicted/actual rank correlation: {self.last_rank_correlation:.2f}, "
+            f"outcome accuracy: {self.last_outcome_accuracy:.2f}, mean absolute error: {self.last_mean_absolute_error:.3f}"
+        )
+
+    def metrics(self) -> Dict[str, float]:
+        """The prefilter's latest statistics, for a MetricsLog."""
+        return {
+            "surrogate/samples": self.model.num_samples,
+            "surrogate/kept": self.num_kept,
+            "surrogate/rejected": self.num_rejected,
+            "surrogate/rank_correlation": self.last_rank_correlation,
+            "surrogate/outcome_accuracy": self.last_outcome_accuracy,
+            "surrogate/mean_absolute_error": self.last_mean_absolute_error,
+        }
+
+def make_prefilter(
+    lite_keep_fraction: Optional[float],
+    surrogate_keep_fraction: Optional[float],
+) -> Optional[Union[LitePrefilter, SurrogatePrefilter]]:
+    """The prefilter for the given config, preferring the surrogate if both are set."""
+    if surrogate_keep_fraction is not None:
+        return SurrogatePrefilter(keep_fraction=surrogate_keep_fraction)
+    if lite_keep_fraction is not None:
+        return LitePrefilter(keep_fraction=lite_keep_fraction)
+    return None
+
+def prefilter_metrics(evolution: "EvolutionStrategy") -> Dict[str, float]:
+    """The evolution strategy's prefilter metrics, if it has a prefilter."""
+    # Checkpoints from before the prefilter don't have one
+    prefilter = getattr(evolution, "prefilter", None)
+    return prefilter.metrics() if prefilter is not None else {}
+
 def _get_random_legal_position(team_type: TeamType, hex_coords: Tuple[int, int], battle_id: str) -> Tuple[float, float]:
     """Generate a random position within the legal placement area.
     
@@ -326,13 +1250,10 @@ def _get_random_legal_position(team_type: TeamType, hex_coords: Tuple[int, int],
         required_team=team_type,
         include_units=False,
     )
-    min_x, min_y, max_x, max_y = legal_area.bounds
-
-    while True:
-        x = random.uniform(min_x, max_x)
-        y = random.uniform(min_y, max_y)
-        if legal_area.contains(shapely.Point(x, y)):
-            return (x, y)
+    position = sample_legal_point(("unit", battle_id, hex_coords, team_type), legal_area)
+    if position is None:
+        raise ValueError(f"No legal placement area for {team_type} in battle {battle_id}")
+    return position
 
 def _get_random_legal_unit_type() -> UnitType:
     return random.choice(
@@ -341,20 +1262,11 @@ def _get_random_legal_unit_type() -> UnitType:
 
 def _get_random_spell_position(battle_id: str, hex_coords: Tuple[int, int]) -> Tuple[float, float]:
     """Get a random legal position for a spell within the battlefield."""
-    from scene_utils import get_legal_spell_placement_area
     
     legal_area = get_legal_spell_placement_area(battle_id, hex_coords)
-    
-    # Get bounding box of legal area
-    minx, miny, maxx, maxy = legal_area.bounds
-    
-    # Try to find a valid position within the legal area
-    for _ in range(100):  # Try up to 100 times
-        x = random.uniform(minx, maxx)
-        y = random.uniform(miny, maxy)
-        point = shapely.Point(x, y)
-        if legal_area.contains(point):
-            return (x, y)
+    position = sample_legal_point(("spell", battle_id, hex_coords), legal_area)
+    if position is not None:
+        return position
     
     # If we can't find a valid position, return center of battlefield
     hex_center_x, hex_center_y = axial_to_world(*hex_coords)
@@ -388,17 +1300,17 @@ def _validate_team1_positions(individual: 'Individual') -> bool:
     )
     
     # Check all unit positions
-    for unit_type, position, _ in individual.unit_placements:
-        point = shapely.Point(position[0], position[1])
-        if not unit_legal_area.covers(point):
-            return False
+    unit_positions = [position for _, position, _ in individual.unit_placements]
+    if unit_positions and not shapely.covers(unit_legal_area, shapely.points(unit_positions)).all():
+        return False
     
     # Check all spell positions for team 1 spells
-    for spell_type, position, team_value in individual.spell_placements:
-        if team_value == TeamType.TEAM1.value:
-            point = shapely.Point(position[0], position[1])
-            if not spell_legal_area.covers(point):
-                return False
+    spell_positions = [
+        position for _, position, team_value in individual.spell_placements
+        if team_value == TeamType.TEAM1.value
+    ]
+    if spell_positions and not shapely.covers(spell_legal_area, shapely.points(spell_positions)).all():
+        return False
     
     return True
 
@@ -857,6 +1769,22 @@ class UniformSelection(SelectIndividual):
         return random.choice(population.individuals)
 
 
+def _select_parents(individuals: List[Individual], parents_per_generation: int, category_cap: int) -> List[Individual]:
+    """Select the fittest individuals, with at most category_cap per army composition."""
+    selected = []
+    category_counts = defaultdict(int)
+    for individual in sorted(individuals, key=lambda x: x.fitness, reverse=True):
+        category = tuple(sorted(Counter(
+            unit_type for unit_type, _, _ in individual.unit_placements
+        ).items()))
+        if category_counts[category] < category_cap:
+            selected.append(individual)
+            category_counts[category] += 1
+        if len(selected) >= parents_per_generation:
+            break
+    return selected
+
+
 class Evolution(ABC):
 
     @abstractmethod
@@ -914,6 +1842,9 @@ class EvolutionStrategy(Evolution):
         category_cap: int = 3,
         n_mutations: int = 1,
         use_powers: bool = False,
+        evaluator: Optional[Union[MultiFidelityEvaluator, RobustEvaluator]] = None,
+        prefilter: Optional[Union[LitePrefilter, SurrogatePrefilter]] = None,
+        stall_duration: Optional[float] = None,
     ):
         self.mutations = mutations
         self.selector = selector
@@ -927,8 +1858,19 @@ class EvolutionStrategy(Evolution):
         self.category_cap = category_cap
         self.n_mutations = n_mutations
         self.use_powers = use_powers
-
-    def __call__(self, population: Population) -> Population:
+        self.evaluator = evaluator
+        self.prefilter = prefilter
+        # Children stalled below the cutoff for this many seconds are aborted, see AbortBelowCutoff
+        self.stall_duration = stall_duration
+
+    def _generate_children(self, population: Population) -> Tuple[Population, List[Tuple[Mutation, Individual, Individual]], Optional[Fitness]]:
+        """Create the children of a generation.
+
+        Returns:
+            The parents and children to evaluate, the (mutation, parent, child)
+            triples used to adapt the mutation rates, and the cutoff below which
+            children can't be selected, if the parents are evaluated.
+        """
         parents = population.individuals
 
         # Generate children
@@ -948,24 +1890,25 @@ class EvolutionStrategy(Evolution):
                 mutation_pairs.extend((mutation, parent, child) for mutation in mutations)
                 next_generation.add(child)
 
-        # Evaluate parents + children
         parents_and_children = Population(list(next_generation))
-        parents_and_children.evaluate(use_powers=self.use_powers)
+        # Children below the worst parent can't be selected, so their evaluation can be cut short
+        cutoff = None
+        if all(not parent.needs_evaluation() for parent in parents):
+            cutoff = min(parent.fitness for parent in parents)
+        return parents_and_children, mutation_pairs, cutoff
 
+    def _select_and_adapt(
+        self,
+        parents_and_children: Population,
+        mutation_pairs: List[Tuple[Mutation, Individual, Individual]],
+    ) -> Population:
+        """Select the next generation from evaluated parents and children and adapt the mutation rates."""
         # Select the next generation
-        individuals = []
-        category_counts = defaultdict(int)
-        for individual in sorted(parents_and_children.individuals, key=lambda x: x.fitness, reverse=True):
-            category = tuple(sorted(Counter(
-                unit_type for unit_type, _, _ in individual.unit_placements
-            ).items()))
-            if category_counts[category] < self.category_cap:
-                individuals.append(individual)
-                category_counts[category] += 1
-            if len(individuals) >= self.parents_per_generation:
-                break
-
-        next_population = Population(individuals)
+        next_population = Population(_select_parents(
+            parents_and_children.individuals,
+            self.parents_per_generation,
+            self.category_cap,
+        ))
 
         # Update mutation rates
         mutation_successes = defaultdict(int)
@@ -986,6 +1929,259 @@ class EvolutionStrategy(Evolution):
 
         return next_population
 
+    def __call__(self, population: Population) -> Population:
+        parents_and_children, mutation_pairs, cutoff = self._generate_children(population)
+        # Checkpoints from before the prefilter don't have one
+        prefilter = getattr(self, "prefilter", None)
+        if prefilter is not None and cutoff is not None:
+            prefilter.apply([parents_and_children])
+        # Checkpoints from before the stall duration don't have one
+        stall_duration = getattr(self, "stall_duration", None)
+        if self.evaluator is not None:
+            self.evaluator.evaluate(parents_and_children, cutoff, use_powers=self.use_powers, stall_duration=stall_duration)
+        else:
+            parents_and_children.evaluate(use_powers=self.use_powers, cutoff=cutoff, stall_duration=stall_duration)
+        if prefilter is not None:
+            prefilter.record()
+        return self._select_and_adapt(parents_and_children, mutation_pairs)
+
+
+class MultiPopulationScheduler:
+    """Evolves the populations of many battles with one stream of evaluation jobs.
+
+    Evolving battles one after another only gives the pool one generation's
+    children at a time, which leaves most workers idle. Instead, children are
+    generated for every battle first, then all of their evaluations are
+    submitted together and each population selects its next generation.
+
+    Jobs are submitted longest expected simulation first, using a moving
+    average of each battle's past simulation times, so that long battles don't
+    start last and keep the rest of the pool waiting at the end of a
+    generation. Battles without a history are submitted first. Results are
+    handled as they finish, and jobs of pool workers that die are
+    resubmitted (see PoolJobs).
+
+    An evolution strategy with an evaluator evaluates each population in turn
+    instead, since the evaluator's stages depend on each population's own
+    results.
+    """
+
+    def __init__(self, evolution: EvolutionStrategy, max_duration: float = 120.0, smoothing: float = 0.2):
+        self.evolution = evolution
+        self.max_duration = max_duration
+        self.smoothing = smoothing
+        self.expected_durations: Dict[str, float] = {}
+
+    def _record_duration(self, battle_id: str, seconds: float) -> None:
+        if battle_id not in self.expected_durations:
+            self.expected_durations[battle_id] = seconds
+        else:
+            self.expected_durations[battle_id] += self.smoothing * (seconds - self.expected_durations[battle_id])
+
+    def evaluate(
+        self,
+        populations: Dict[str, Population],
+        cutoffs: Optional[Dict[str, Optional[Fitness]]] = None,
+    ) -> None:
+        """Evaluate the individuals of every population that need it."""
+        use_powers = self.evolution.use_powers
+        stall_duration = getattr(self.evolution, "stall_duration", None)
+        constants = get_constants()
+        pending: Dict[Tuple[str, Individual], Tuple[Optional[Fitness], List[Individual]]] = {}
+        for battle_id, population in populations.items():
+            cutoff = cutoffs.get(battle_id) if cutoffs is not None else None
+            for ind in population._individuals_to_evaluate(constants):
+                fitness = _transposition_table.lookup(ind, self.max_duration, use_powers, cutoff, constants, stall_duration)
+                if fitness is not None:
+                    ind._fitness = fitness
+                    ind._constants_hash = ind.constants_hash(constants)
+                    continue
+                # Equivalent individuals are simulated once
+                pending.setdefault((battle_id, ind), (cutoff, []))[1].append(ind)
+        if not pending:
+            return
+
+        order = sorted(
+            pending,
+            key=lambda job: self.expected_durations.get(job[0], float("inf")),
+            reverse=True,
+        )
+        jobs = PoolJobs()
+        for battle_id, ind in order:
+            cutoff = pending[(battle_id, ind)][0]
+            jobs.submit((battle_id, ind), _evaluate_timed, (ind, self.max_duration, use_powers, cutoff, stall_duration))
+        while len(jobs):
+            (battle_id, ind), (fitness, seconds) = jobs.get()
+            cutoff, individuals = pending[(battle_id, ind)]
+            self._record_duration(battle_id, seconds)
+            _transposition_table.store(ind, self.max_duration, use_powers, cutoff, fitness, constants, stall_duration)
+            for individual in individuals:
+                individual._fitness = fitness
+                individual._constants_hash = individual.constants_hash(constants)
+
+    def __call__(self, populations: Dict[str, Population]) -> Dict[str, Population]:
+        generations = {
+            battle_id: self.evolution._generate_children(population)
+            for battle_id, population in populations.items()
+        }
+        prefilter = getattr(self.evolution, "prefilter", None)
+        if prefilter is not None:
+            # All populations' children are simulated together by the lite engine
+            prefilter.apply([
+                parents_and_children
+                for parents_and_children, _, cutoff in generations.values()
+                if cutoff is not None
+            ])
+        if self.evolution.evaluator is not None:
+            warnings.warn(
+                f"{type(self.evolution.evaluator).__name__} evaluates each battle's population in turn, "
+                "so evaluations aren't batched across battles",
+                RuntimeWarning,
+            )
+            for parents_and_children, _, cutoff in generations.values():
+                self.evolution.evaluator.evaluate(
+                    parents_and_children,
+                    cutoff,
+                    use_powers=self.evolution.use_powers,
+                    stall_duration=getattr(self.evolution, "stall_duration", None),
+                )
+        else:
+            self.evaluate(
+                {battle_id: parents_and_children for battle_id, (parents_and_children, _, _) in generations.items()},
+                cutoffs={battle_id: cutoff for battle_id, (_, _, cutoff) in generations.items()},
+            )
+        if prefilter is not None:
+            prefilter.record()
+        return {
+            battle_id: self.evolution._select_and_adapt(parents_and_children, mutation_pairs)
+            for battle_id, (parents_and_children, mutation_pairs, _) in generations.items()
+        }
+
+
+
+class SteadyStateEvolution(Evolution):
+    """Evolution that evaluates children asynchronously to keep every worker busy.
+
+    Instead of waiting for a whole generation, a new child is submitted to the
+    process pool whenever one finishes. Each finished child is immediately
+    considered for the parent set, and the mutation rates are adapted after
+    every child. Each call returns once children_per_call children have
+    finished. Children that are still being evaluated carry over to the next
+    call.
+    """
+
+    def __init__(
+        self,
+        mutations: List[Mutation],
+        selector: SelectIndividual,
+        parents_per_generation: int,
+        children_per_call: int,
+        mutation_adaptation_rate: float = 0.1,
+        category_cap: int = 3,
+        n_mutations: int = 1,
+        use_powers: bool = False,
+        max_duration: float = 120.0,
+        max_in_flight: Optional[int] = None,
+        stall_duration: Optional[float] = None,
+    ):
+        self.mutations = mutations
+        self.selector = selector
+        self.parents_per_generation = parents_per_generation
+        self.children_per_call = children_per_call
+        self.mutation_rates = {
+            mutation: 1/len(mutations)
+            for mutation in mutations
+        }
+        self.mutation_adaptation_rate = mutation_adaptation_rate
+        self.category_cap = category_cap
+        self.n_mutations = n_mutations
+        self.use_powers = use_powers
+        self.max_duration = max_duration
+        # Children stalled below the cutoff for this many seconds are aborted, see AbortBelowCutoff
+        self.stall_duration = stall_duration
+        # Keep a few more tasks than workers queued so a worker never waits for the main process
+        self.max_in_flight = max_in_flight if max_in_flight is not None else 2 * multiprocessing.cpu_count()
+        self._jobs = PoolJobs()
+        self._in_flight: Dict[Individual, Tuple[Individual, List[Mutation]]] = {}
+        self._cutoffs: Dict[Individual, Fitness] = {}
+        self._constants: Optional[ConstantsSnapshot] = None
+
+    def __getstate__(self):
+        # Children in flight are lost in a checkpoint; new ones are submitted on resume
+        state = self.__dict__.copy()
+        state["_jobs"] = None
+        state["_in_flight"] = {}
+        state["_cutoffs"] = {}
+        state["_constants"] = None
+        return state
+
+    def __setstate__(self, state):
+        # Checkpoints from before PoolJobs have a completed queue instead
+        state.pop("_completed", None)
+        state.setdefault("stall_duration", None)
+        self.__dict__.update(state)
+        self._jobs = PoolJobs()
+
+    def _submit_child(self, population: Population) -> None:
+        parent = self.selector(population)
+        mutations = random.choices(list(self.mutation_rates.keys()), weights=list(self.mutation_rates.values()), k=self.n_mutations)
+        child = parent
+        for mutation in mutations:
+            child = mutation(child)
+            # Validate that all team 1 units/spells are in legal positions after mutation
+            if not _validate_team1_positions(child):
+                print(f"Validation failed after mutation: {mutation.__class__.__name__}")
+                assert False, f"Mutation {mutation.__class__.__name__} resulted in illegal positions for team 1"
+        if child in population.individuals or child in self._in_flight:
+            return
+        self._in_flight[child] = (parent, mutations)
+        cutoff = min(individual.fitness for individual in population.individuals)
+        self._cutoffs[child] = cutoff
+        fitness = _transposition_table.lookup(child, self.max_duration, self.use_powers, cutoff, self._constants, self.stall_duration)
+        if fitness is not None:
+            self._jobs.put(child, fitness)
+            return
+        self._jobs.submit(child, _evaluate, (child, self.max_duration, self.use_powers, cutoff, self.stall_duration))
+
+    def _adapt_mutation_rates(self, mutations: List[Mutation], success: bool) -> None:
+        for mutation in mutations:
+            self.mutation_rates[mutation] = (
+                self.mutation_rates[mutation] * (1 + self.mutation_adaptation_rate * ((1 if success else -1) / 2))
+            )
+
+    def __call__(self, population: Population) -> Population:
+        population.evaluate(max_duration=self.max_duration, use_powers=self.use_powers)
+        constants = get_constants()
+        if self._constants is None or constants.hash != self._constants.hash:
+            # Children in flight were evaluated with the old constants, so drop them
+            self._jobs = PoolJobs()
+            self._in_flight = {}
+            self._cutoffs = {}
+        self._constants = constants
+        individuals = list(population.individuals)
+        completed = 0
+        while completed < self.children_per_call:
+            attempts = 0
+            while len(self._in_flight) < self.max_in_flight and attempts < 10 * self.max_in_flight:
+                self._submit_child(Population(individuals))
+                attempts += 1
+            if not self._in_flight:
+                # Every mutation produced a duplicate, so there is nothing to wait for
+                break
+
+            child, result = self._jobs.get()
+            parent, mutations = self._in_flight.pop(child)
+            cutoff = self._cutoffs.pop(child)
+            _transposition_table.store(child, self.max_duration, self.use_powers, cutoff, result, constants, self.stall_duration)
+            child._fitness = result
+            child._constants_hash = child.constants_hash(constants)
+            completed += 1
+
+            self._adapt_mutation_rates(mutations, child.fitness > parent.fitness)
+            if child not in individuals:
+                individuals = _select_parents(individuals + [child], self.parents_per_generation, self.category_cap)
+
+        return Population(individuals)
 
 class Plotter(ABC):
 
@@ -1002,6 +2198,18 @@ class Plotter(ABC):
         with open(path, "w", encoding="utf-8") as f:
             f.write(self.create_plot())
 
+    def metrics(self) -> Dict[str, float]:
+        """The latest value of every series, keyed by "<history>/<series>", for a MetricsLog."""
+        metrics = {}
+        for attribute, history in vars(self).items():
+            if not attribute.endswith("_history"):
+                continue
+            name = attribute[:-len("_history")]
+            for key, values in history.items():
+                if values:
+                    metrics[f"{name}/{key.name}"] = values[-1]
+        return metrics
+
 
 class UnitCountsPlotter(Plotter):
 
@@ -1019,6 +2227,7 @@ class UnitCountsPlotter(Plotter):
         
     def create_plot(self) -> str:
         """Create and save the unit counts plot."""
+        import plotly.graph_objects as go
         fig = go.Figure()
         
         for unit_type in ALLOWED_UNIT_TYPES:
@@ -1061,6 +2270,7 @@ class UnitValuesPlotter(Plotter):
             self.unit_values_history[unit_type].append(total_unit_values[unit_type])
 
     def create_plot(self) -> str:
+        import plotly.graph_objects as go
         fig = go.Figure()
         for unit_type in ALLOWED_UNIT_TYPES:
             counts = self.unit_values_history[unit_type]
@@ -1091,6 +2301,7 @@ class ItemCountsPlotter(Plotter):
         
     def create_plot(self) -> str:
         """Create and save the item counts plot."""
+        import plotly.graph_objects as go
         fig = go.Figure()
         
         for item_type in ALLOWED_ITEM_TYPES:
@@ -1134,6 +2345,7 @@ class ItemValuesPlotter(Plotter):
             self.item_values_history[item_type].append(total_item_values[item_type])
 
     def create_plot(self) -> str:
+        import plotly.graph_objects as go
         fig = go.Figure()
         for item_type in ALLOWED_ITEM_TYPES:
             counts = self.item_values_history[item_type]
@@ -1176,6 +2388,7 @@ class SpellCountsPlotter(Plotter):
         
     def create_plot(self) -> str:
         """Create and save the spell counts plot."""
+        import plotly.graph_objects as go
         fig = go.Figure()
         
         for spell_type in ALLOWED_SPELL_TYPES:
@@ -1218,6 +2431,7 @@ class SpellValuesPlotter(Plotter):
             self.spell_values_history[spell_type].append(total_spell_values[spell_type])
 
     def create_plot(self) -> str:
+        import plotly.graph_objects as go
         fig = go.Figure()
         for spell_type in ALLOWED_SPELL_TYPES:
             counts = self.spell_values_history[spell_type]
@@ -1281,6 +2495,7 @@ class AllCountsPlotter(Plotter):
     
     def create_plot(self) -> str:
         """Create combined counts plot for units, items, and spells."""
+        import plotly.graph_objects as go
         fig = go.Figure()
         
         # Add units
@@ -1368,6 +2583,7 @@ class AllValuesPlotter(Plotter):
 
     def create_plot(self) -> str:
         """Create combined values plot for units, items, and spells."""
+        import plotly.graph_objects as go
         fig = go.Figure()
         
         # Add units
@@ -1437,6 +2653,12 @@ class PlotGroup(Plotter):
             html += plotter.create_plot()
         return html
 
+    def metrics(self) -> Dict[str, float]:
+        metrics = {}
+        for plotter in self.plotters:
+            metrics.update(plotter.metrics())
+        return metrics
+
 def random_population(
     battle_id: str,
     size: int,
@@ -1450,7 +2672,7 @@ def random_population(
         for _ in range(size)
     ])
 
-def main():
+def run_battle_solver(resume: bool = False, checkpoint_path: str = "checkpoints/battle_solver.pkl.gz"):
 
     BATTLE_ID = "Soldiers"
     PARENTS_PER_GENERATION = 50
@@ -1458,11 +2680,44 @@ def main():
     CATEGORY_CAP = 1
     TOURNAMENT_SIZE = None
     USE_POWERS = False
-
-    population = random_population(battle_id=BATTLE_ID, size=PARENTS_PER_GENERATION)
-    population.evaluate()
-    evolution = EvolutionStrategy(
-        mutations=[
+    # Screen children with a short simulation before fully simulating them, None to disable.
+    # Check the screened/full rank correlation it prints before relying on it, e.g. 30.0
+    SCREEN_DURATION = None
+    # Abort children whose damage to team 2 stalls for this many seconds below the worst parent, None to disable.
+    # Check how often it discards winners with abort_audit.py before relying on it, e.g. 10.0
+    ABORT_STALL_DURATION = None
+    # Evaluate children asynchronously instead of in generations (doesn't use screening)
+    STEADY_STATE = False
+    # Only count wins that hold up when winners' positions are jittered this many times, None to disable.
+    # Replaces screening
+    ROBUSTNESS_COPIES = None
+    ROBUSTNESS_NOISE_SCALE = 10.0
+    # Only simulate this fraction of children, ranked by the lite battle engine, None to disable
+    LITE_KEEP_FRACTION = None
+    # Only simulate this fraction of children, ranked by an online surrogate model, None to disable
+    SURROGATE_KEEP_FRACTION = None
+    CHECKPOINT_EVERY_N_GENERATIONS = 1
+    TRANSPOSITION_TABLE_CHECKPOINT_EVERY_N_GENERATIONS = 10
+    # Plots are rendered from the metrics log in the background, at most this often
+    PLOT_INTERVAL_SECONDS = 30.0
+
+    metrics_log = MetricsLog("plots/battle.csv", resume=resume)
+    plot_renderer = PlotRenderer("plots/battle.csv", "plots/battle.html", min_interval=PLOT_INTERVAL_SECONDS)
+    if resume:
+        state = load_checkpoint(checkpoint_path)
+        population = state["population"]
+        evolution = state["evolution"]
+        evaluator = getattr(evolution, "evaluator", None)
+        plotter = state["plotter"]
+        generation = state["generation"]
+        load_transposition_table(checkpoint_path, state)
+        print(f"Resumed from {checkpoint_path} at generation {generation}")
+    else:
+        with startup_profiler.section("random_population"):
+            population = random_population(battle_id=BATTLE_ID, size=PARENTS_PER_GENERATION)
+        with startup_profiler.section("initial evaluation"):
+            population.evaluate()
+        mutations = [
             RemoveRandomUnit(),
             PerturbPosition(noise_scale=10),
             PerturbPosition(noise_scale=100),
@@ -1471,28 +2726,54 @@ def main():
             RandomizeUnitType(),
             MoveNextToAlly(noise_scale=20),
             RemoveRandomItem(),
-        ],
-        selector=TournamentSelection(tournament_size=TOURNAMENT_SIZE) if TOURNAMENT_SIZE is not None else UniformSelection(),
-        parents_per_generation=PARENTS_PER_GENERATION,
-        children_per_generation=CHILDREN_PER_GENERATION,
-        mutation_adaptation_rate=0.1,
-        n_mutations=1,
-        use_powers=USE_POWERS,
-        category_cap=CATEGORY_CAP if CATEGORY_CAP is not None else PARENTS_PER_GENERATION,
-    )
+        ]
+        selector = TournamentSelection(tournament_size=TOURNAMENT_SIZE) if TOURNAMENT_SIZE is not None else UniformSelection()
+        evaluator = None
+        if STEADY_STATE:
+            evolution = SteadyStateEvolution(
+                mutations=mutations,
+                selector=selector,
+                parents_per_generation=PARENTS_PER_GENERATION,
+                children_per_call=CHILDREN_PER_GENERATION,
+                mutation_adaptation_rate=0.1,
+                n_mutations=1,
+                use_powers=USE_POWERS,
+                category_cap=CATEGORY_CAP if CATEGORY_CAP is not None else PARENTS_PER_GENERATION,
+                stall_duration=ABORT_STALL_DURATION,
+            )
+        else:
+            if ROBUSTNESS_COPIES is not None:
+                evaluator = RobustEvaluator(num_copies=ROBUSTNESS_COPIES, noise_scale=ROBUSTNESS_NOISE_SCALE)
+            elif SCREEN_DURATION is not None:
+                evaluator = MultiFidelityEvaluator(screen_duration=SCREEN_DURATION)
+            evolution = EvolutionStrategy(
+                mutations=mutations,
+                selector=selector,
+                parents_per_generation=PARENTS_PER_GENERATION,
+                children_per_generation=CHILDREN_PER_GENERATION,
+                mutation_adaptation_rate=0.1,
+                n_mutations=1,
+                use_powers=USE_POWERS,
+                category_cap=CATEGORY_CAP if CATEGORY_CAP is not None else PARENTS_PER_GENERATION,
+                evaluator=evaluator,
+                prefilter=make_prefilter(LITE_KEEP_FRACTION, SURROGATE_KEEP_FRACTION),
+                stall_duration=ABORT_STALL_DURATION,
+            )
     
-    # Initialize the population plotter
-    plotter = PlotGroup(
-        plotters=[
-            AllCountsPlotter(),
-            AllValuesPlotter(),
-        ],
-    )
+        # Initialize the population plotter
+        plotter = PlotGroup(
+            plotters=[
+                AllCountsPlotter(),
+                AllValuesPlotter(),
+            ],
+        )
     
-    # Plot initial population
-    plotter.update(population)
+        # Plot initial population
+        plotter.update(population)
+        metrics_log.append(0, dict(plotter.metrics(), **prefilter_metrics(evolution)))
     
-    generation = 1  # Start at 1 since we've plotted generation 0
+        generation = 1  # Start at 1 since we've plotted generation 0
+    startup_profiler.finish("battle_solver")
     try:
         while True:
             print(f"Generation {generation}")
@@ -1502,18 +2783,46 @@ def main():
             
             # Print status
             print(population)
+            if evaluator is not None:
+                print(evaluator)
+            if getattr(evolution, "prefilter", None) is not None:
+                print(evolution.prefilter)
+            print(get_transposition_table())
             # print(evolution.mutation_rates)
             
             # Update the plot with the evolved population
             plotter.update(population)
-            plotter.save_plot(f"plots/battle.html")
+            metrics_log.append(generation, dict(plotter.metrics(), **prefilter_metrics(evolution)))
+            plot_renderer.maybe_render()
             
             generation += 1
+            if generation % CHECKPOINT_EVERY_N_GENERATIONS == 0:
+                save_checkpoint(checkpoint_path, {
+                    "population": population,
+                    "evolution": evolution,
+                    "plotter": plotter,
+                    "generation": generation,
+                })
+            if generation % TRANSPOSITION_TABLE_CHECKPOINT_EVERY_N_GENERATIONS == 0:
+                save_transposition_table(checkpoint_path)
     finally:
         # Make sure to clean up the process pool when done
         cleanup_process_pool()
+        plot_renderer.close()
+
+def main():
+    parser = argparse.ArgumentParser()
+    add_checkpoint_arguments(parser, default_path="checkpoints/battle_solver.pkl.gz")
+    add_farm_arguments(parser)
+    parser.add_argument(startup_profiler.PROFILE_STARTUP_FLAG, action="store_true", default=False)
+    args = parser.parse_args()
+    use_evaluation_farm(start_farm_from_args(args))
+    run_battle_solver(resume=args.resume, checkpoint_path=args.checkpoint_path)
+
 
 if __name__ == "__main__":
+    # Pickled jobs have to name this module rather than __main__ for farm workers to load them
+    from battle_solver import main
     main()
     # import cProfile
     # import pstats
@@ -7,13 +7,14 @@ import json
 import os
 import sys
 from pathlib import Path
-from typing import Dict, List, Optional, Tuple
+from typing import Dict, List, Optional, Sequence, Tuple
 
-from pydantic import BaseModel
+from pydantic import BaseModel, TypeAdapter
 from components.unit_type import UnitType
 from components.item import ItemType
 from components.spell_type import SpellType
 from corruption_powers import CorruptionPowerUnion
+import startup_profiler
 
 def get_resource_path(relative_path: str) -> Path:
     """Get absolute path to resource, works for dev and for PyInstaller."""
@@ -53,31 +54,55 @@ class Battle(BaseModel):
 
 def get_battle_id(battle_id: str) -> Battle:
     """Retrieve a battle by its ID."""
-    for battle in _battles:
-        if battle.id == battle_id:
-            return battle
-    raise ValueError(f"Battle with id {battle_id} not found")
+    battle = _battles_by_id.get(battle_id)
+    if battle is None:
+        raise ValueError(f"Battle with id {battle_id} not found")
+    return battle
 
 def get_battle_coords(battle_coords: Tuple[int, int]) -> Battle:
     """Retrieve a battle by its coordinates."""
-    for battle in _battles:
-        if battle.hex_coords == battle_coords:
-            return battle
-    raise ValueError(f"Battle with coords {battle_coords} not found")
+    battle = _battles_by_coords.get(battle_coords)
+    if battle is None:
+        raise ValueError(f"Battle with coords {battle_coords} not found")
+    return battle
 
 def get_battles() -> List[Battle]:
     """Get all battles."""
     return [battle.model_copy(deep=True) for battle in _battles]
 
+def get_battles_view() -> Sequence[Battle]:
+    """Get all battles without copying them.
+
+    The returned battles are shared with this module and must not be modified.
+    Use get_battles() to get copies that can be changed.
+    """
+    return _battles_view
+
 _battles: List[Battle] = []
+_battles_view: Tuple[Battle, ...] = ()
+_battles_by_id: Dict[str, Battle] = {}
+_battles_by_coords: Dict[Tuple[int, int], Battle] = {}
+_battle_list_adapter = TypeAdapter(List[Battle])
+
+def _index_battles() -> None:
+    """Rebuild the lookup indexes after _battles changes."""
+    global _battles_view, _battles_by_id, _battles_by_coords
+    _battles_view = tuple(_battles)
+    # Like the linear scans these replace, the first battle with a given id or coords wins
+    _battles_by_id = {}
+    _battles_by_coords = {}
+    for battle in _battles:
+        _battles_by_id.setdefault(battle.id, battle)
+        if battle.hex_coords is not None:
+            _battles_by_coords.setdefault(battle.hex_coords, battle)
 
 def reload_battles() -> None:
     """Load battles from a JSON file."""
     file_path = get_resource_path('data/battles.json')
-    with open(file_path, 'r') as file:
-        battles_data = json.load(file)
+    with startup_profiler.section("validate battles.json", "validation"):
         global _battles
-        _battles = [Battle.model_validate(battle) for battle in battles_data]
+        _battles = _battle_list_adapter.validate_json(file_path.read_bytes())
+    _index_battles()
 
 reload_battles()
 
@@ -113,6 +138,8 @@ def move_battle_to_bottom(battle_id: str) -> None:
 
 def _save_battles(battles: List[Battle]) -> None:
     """Save the current battles list to the JSON file."""
+    # Keep the indexes consistent with the in-memory list even if saving fails
+    _index_battles()
     file_path = get_resource_path('data/battles.json')
     battles_data = [battle.model_dump() for battle in battles]
     
@@ -153,17 +180,8 @@ def add_battle(battle: Battle) -> None:
 def update_battle(previous_battle: Battle, updated_battle: Battle) -> None:
     """Update a battle in the list and save changes."""
     # Find the battle to update
-    target_battle = None
-    target_index = -1
-    
-    for i, battle in enumerate(_battles):
-        if battle.id == previous_battle.id:
-            target_battle = battle
-            target_index = i
-            break
-    
-    if target_battle is None:
-        raise ValueError(f"Battle with id {previous_battle.id} not found")
+    target_battle = get_battle_id(previous_battle.id)
+    target_index = _battles.index(target_battle)
     
     # Preserve existing best solutions if not provided in the updated battle
     if updated_battle.best_solution is None:
@@ -0,0 +1,71 @@
+"""Checkpoints for long running solver and balance runs.
+
+A checkpoint is a gzip compressed pickle of whatever state a run needs to
+continue (populations, evolution strategies with their mutation rates, plotter
+history, generation counters) along with the state of the random number
+generators. Individuals keep their evaluated fitness and the game constants
+hash it was evaluated with, so a resumed run only re-simulates them if the
+constants changed.
+"""
+
+import argparse
+import gzip
+import os
+import pickle
+import random
+from typing import Any, Dict
+
+import numpy as np
+
+CHECKPOINT_FORMAT_VERSION = 1
+
+
+def add_checkpoint_arguments(parser: argparse.ArgumentParser, default_path: str) -> None:
+    """Add the --resume and --checkpoint_path arguments to a command line parser."""
+    parser.add_argument(
+        "--resume",
+        action="store_true",
+        default=False,
+        help="Continue from the checkpoint instead of starting a new run",
+    )
+    parser.add_argument(
+        "--checkpoint_path",
+        default=default_path,
+        help="Where to write checkpoints and read them from when resuming",
+    )
+
+
+def save_checkpoint(path: str, state: Dict[str, Any]) -> None:
+    """Atomically write a checkpoint, replacing any previous one at path."""
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    checkpoint = {
+        "version": CHECKPOINT_FORMAT_VERSION,
+        "state": state,
+        "random_state": random.getstate(),
+        "numpy_random_state": np.random.get_state(),
+    }
+    # Write to a temporary file first so a crash mid-write keeps the previous checkpoint
+    temp_path = f"{path}.tmp"
+    with gzip.open(temp_path, "wb") as file:
+        pickle.dump(checkpoint, file, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(temp_path, path)
+
+
+def load_checkpoint(path: str, restore_random_state: bool = True) -> Dict[str, Any]:
+    """Read a checkpoint and restore the random number generator states, unless restore_random_state is False.
+
+    Returns:
+        The state that was passed to save_checkpoint.
+    """
+    with gzip.open(path, "rb") as file:
+        checkpoint = pickle.load(file)
+    if checkpoint.get("version") != CHECKPOINT_FORMAT_VERSION:
+        raise ValueError(
+            f"Checkpoint {path} has version {checkpoint.get('version')}, expected {CHECKPOINT_FORMAT_VERSION}"
+        )
+    if restore_random_state:
+        random.setstate(checkpoint["random_state"])
+        np.random.set_state(checkpoint["numpy_random_state"])
+    return checkpoint["state"]
@@ -0,0 +1,181 @@
+"""Which unit, item and spell types each game constant affects.
+
+Constants are named after what they affect: CORE_ARCHER_ATTACK_RANGE affects
+core archers, ITEM_HUNTER_POINTS the hunter item and SPELL_HEALING_AREA_RADIUS
+the healing area spell. A constant belongs to the type with the longest
+matching name, so SKELETON_ARCHER_NECROMANCER_HP only affects the necromancer
+and not skeleton archers. EXPLICIT_DEPENDENCIES covers the constants that are
+named otherwise or that other types also use, and NON_BATTLE_CONSTANTS the
+ones that can't change the result of a battle. Every other constant affects every battle.
+
+Some types create units of other types during a battle: necromancers summon
+skeletons and zombie infections raise basic zombies. They also depend on the
+constants of the types in IMPLIED_DEPENDENCIES.
+
+A ConstantsSnapshot hashes the constants that a set of types depends on, so
+that editing ZOMBIE_TANK_HP only changes the hash of battles with a zombie
+tank in them.
+"""
+
+import hashlib
+import json
+from collections import defaultdict
+from functools import lru_cache
+from typing import Dict, FrozenSet, Iterable, List, Optional, Tuple, Union
+
+from components.item import ItemType
+from components.spell_type import SpellType
+from components.unit_type import UnitType
+from game_constants import gc, get_game_constants_hash
+
+Dependency = Union[UnitType, ItemType, SpellType]
+
+_NECROMANCER_SUMMONS: Dict[UnitType, UnitType] = {
+    UnitType.SKELETON_ARCHER_NECROMANCER: UnitType.SKELETON_ARCHER,
+    UnitType.SKELETON_HORSEMAN_NECROMANCER: UnitType.SKELETON_HORSEMAN,
+    UnitType.SKELETON_MAGE_NECROMANCER: UnitType.SKELETON_MAGE,
+    UnitType.SKELETON_SWORDSMAN_NECROMANCER: UnitType.SKELETON_SWORDSMAN,
+}
+
+# Everything that infects units, turning them into basic zombies when they die
+_INFECTING: Tuple[Dependency, ...] = (
+    UnitType.ZOMBIE_BASIC_ZOMBIE,
+    UnitType.ZOMBIE_FIGHTER,
+    UnitType.ZOMBIE_JUMPER,
+    UnitType.ZOMBIE_SPITTER,
+    UnitType.ZOMBIE_TANK,
+    UnitType.MISC_BRUTE,
+    UnitType.MISC_GRABBER,
+    ItemType.INFECT_ON_HIT,
+    SpellType.INFECTING_AREA,
+)
+
+# Constants that aren't named after what they affect, or that other types also use, by name or name prefix
+EXPLICIT_DEPENDENCIES: Dict[str, Tuple[Dependency, ...]] = {
+    "SKELETON_NECROMANCER_": tuple(_NECROMANCER_SUMMONS),
+    "ZOMBIE_INFECTION_DURATION": _INFECTING,
+    # Soldiers shoot core archer arrows
+    "CORE_ARCHER_ATTACK_DAMAGE": (UnitType.CORE_ARCHER, UnitType.INFANTRY_SOLDIER),
+    "CORE_ARCHER_PROJECTILE_SPEED": (UnitType.CORE_ARCHER, UnitType.INFANTRY_SOLDIER),
+    # Commanders empower allies with the banner bearer's status effect
+    "INFANTRY_BANNER_BEARER_AURA_DAMAGE_PERCENTAGE": (UnitType.INFANTRY_BANNER_BEARER, UnitType.MISC_COMMANDER),
+    # Death explosions look like fireballs
+    "CORE_WIZARD_FIREBALL_AOE_DURATION": (UnitType.CORE_WIZARD, ItemType.EXPLODE_ON_DEATH, SpellType.CHAIN_EXPLODE_ON_DEATH),
+}
+
+# Constants only used for drawing, sound, the user interface or the campaign, by name or name prefix
+NON_BATTLE_CONSTANTS: Tuple[str, ...] = (
+    "MAJOR_GRID_INTERVAL",
+    "PLACEMENT_MOUSE_DISTANCE",
+    "WILHELM_CHANCE",
+    "TEAM1_COLOR",
+    "TEAM2_COLOR",
+    "MAP_",
+    "TARGET_PREVIEW_",
+    "SPELL_HANDLE_SIZE",
+    "CAMERA_",
+    "FIRST_CORRUPTION_TRIGGER_POINTS",
+    "SECOND_CORRUPTION_TRIGGER_POINTS",
+    "CORRUPTION_",
+    "EXPLOSION_VISUAL_SCALE_RATIO",
+)
+
+# Types that create units of other types during a battle
+IMPLIED_DEPENDENCIES: Dict[Dependency, Tuple[Dependency, ...]] = {
+    **{necromancer: (summon,) for necromancer, summon in _NECROMANCER_SUMMONS.items()},
+    **{infecting: (UnitType.ZOMBIE_BASIC_ZOMBIE,) for infecting in _INFECTING},
+    SpellType.SUMMON_SKELETON_SWORDSMEN: (UnitType.SKELETON_SWORDSMAN,),
+    SpellType.SUMMON_LICH: (UnitType.SKELETON_LICH,),
+}
+
+_NAME_PREFIXES: List[Tuple[str, Dependency]] = sorted(
+    [(f"{unit_type.name}_", unit_type) for unit_type in UnitType]
+    + [(f"ITEM_{item_type.name}_", item_type) for item_type in ItemType]
+    + [(f"SPELL_{spell_type.name}_", spell_type) for spell_type in SpellType],
+    key=lambda prefix: len(prefix[0]),
+    reverse=True,
+)
+
+
+@lru_cache(maxsize=None)
+def get_constant_dependencies(field: str) -> Optional[Tuple[Dependency, ...]]:
+    """Get the types a game constant affects.
+
+    Returns:
+        The types, an empty tuple if the constant doesn't affect battles, or
+        None if it affects every battle.
+    """
+    if field.startswith(NON_BATTLE_CONSTANTS):
+        return ()
+    for prefix, dependencies in EXPLICIT_DEPENDENCIES.items():
+        if field.startswith(prefix):
+            return dependencies
+    for prefix, dependency in _NAME_PREFIXES:
+        if field.startswith(prefix):
+            return (dependency,)
+    return None
+
+
+def dependency_closure(dependencies: Iterable[Dependency]) -> FrozenSet[Dependency]:
+    """Add the types that the given types create during a battle, recursively."""
+    closure = set()
+    pending = list(dependencies)
+    while pending:
+        dependency = pending.pop()
+        if dependency not in closure:
+            closure.add(dependency)
+            pending.extend(IMPLIED_DEPENDENCIES.get(dependency, ()))
+    return frozenset(closure)
+
+
+def placement_dependencies(
+    unit_placements: Iterable[Tuple[UnitType, Tuple[float, float], List[ItemType]]],
+    spell_placements: Optional[Iterable[Tuple[SpellType, Tuple[float, float], int]]] = None,
+) -> FrozenSet[Dependency]:
+    """Get the unit, item and spell types in placements."""
+    dependencies = set()
+    for unit_type, _, items in unit_placements:
+        dependencies.add(unit_type)
+        dependencies.update(items)
+    for spell_type, _, _ in spell_placements or []:
+        dependencies.add(spell_type)
+    return frozenset(dependencies)
+
+
+def _hash_values(values: Dict) -> str:
+    return hashlib.md5(json.dumps(values, sort_keys=True).encode()).hexdigest()
+
+
+class ConstantsSnapshot:
+    """Hashes of the current game constants, split by the types they affect.
+
+    Creating a snapshot reloads the constants if game_constants.json has changed.
+    """
+
+    def __init__(self):
+        self.hash = get_game_constants_hash()
+        shared = {}
+        by_dependency: Dict[Dependency, Dict] = defaultdict(dict)
+        for field, value in gc.model_dump().items():
+            dependencies = get_constant_dependencies(field)
+            if dependencies is None:
+                shared[field] = value
+            for dependency in dependencies or ():
+                by_dependency[dependency][field] = value
+        self.shared_hash = _hash_values(shared)
+        self._hashes = {dependency: _hash_values(values) for dependency, values in by_dependency.items()}
+        # Individuals of a battle mostly have the same few sets of types
+        self._hash_cache: Dict[FrozenSet[Dependency], str] = {}
+
+    def hash_for(self, dependencies: Iterable[Dependency]) -> str:
+        """Hash the constants that a battle with the given types depends on."""
+        dependencies = frozenset(dependencies)
+        constants_hash = self._hash_cache.get(dependencies)
+        if constants_hash is None:
+            parts = [self.shared_hash] + sorted(
+                f"{type(dependency).__name__}.{dependency.name}:{self._hashes.get(dependency, '')}"
+                for dependency in dependency_closure(dependencies)
+            )
+            constants_hash = hashlib.md5("|".join(parts).encode()).hexdigest()
+            self._hash_cache[dependencies] = constants_hash
+        return constants_hash
@@ -9,7 +9,6 @@ from typing import Callable, List, Optional, Tuple, Union
 import esper
 from pygame import Vector2
 import numpy as np
-from scipy.optimize import minimize
 
 # Suppress the specific RuntimeWarning about values outside bounds during optimization
 warnings.filterwarnings('ignore', message='Values in x were outside bounds during a minimize step, clipping to bounds', category=RuntimeWarning)
@@ -973,6 +972,9 @@ def calculate_target_position(
         
         return (projectile_pos - target_future).length()
     
+    # Imported here because scipy is slow to import and only needed by a few effects
+    from scipy.optimize import minimize
+
     # Try to find the optimal launch parameters
     result = minimize(
         objective,
@@ -5,6 +5,7 @@ from typing import Dict
 import esper
 import pygame
 import os
+from asset_loader import LazyAssetDict, load_image
 from components.health import Health
 from components.on_death_effects import OnDeathEffect
 from components.on_hit_effects import OnHitEffects
@@ -342,7 +343,7 @@ item_theme_ids: Dict[ItemType, str] = {
 }
 
 # Item icon surfaces for rendering
-item_icon_surfaces: Dict[ItemType, pygame.Surface] = {}
+item_icon_surfaces: LazyAssetDict[ItemType, pygame.Surface] = LazyAssetDict(load_image)
 
 # Item registry
 item_registry: Dict[ItemType, Item] = {
@@ -360,24 +361,26 @@ item_registry: Dict[ItemType, Item] = {
 }
 
 
+_item_icon_filenames: Dict[ItemType, str] = {
+    ItemType.EXTRA_HEALTH: "ExtraHealthIcon.png",
+    ItemType.EXPLODE_ON_DEATH: "ExplodeOnDeathIcon.png",
+    ItemType.UPGRADE_ARMOR: "UpgradeArmorIcon.png",
+    ItemType.DAMAGE_AURA: "DamageAuraIcon.png",
+    ItemType.EXTRA_MOVEMENT_SPEED: "ExtraMovementSpeedIcon.png",
+    ItemType.HEAL_ON_KILL: "HealOnKillIcon.png",
+    ItemType.INFECT_ON_HIT: "InfectOnHitIcon.png",
+    ItemType.HUNTER: "HunterIcon.png",
+    ItemType.REFLECT_DAMAGE: "ReflectDamageIcon.png",
+    ItemType.START_INVISIBLE: "StartInvisibleIcon.png",
+    ItemType.STATIC_DISCHARGE: "StaticDischargeIcon.png"
+}
+
+item_icon_surfaces.register({
+    item_type: os.path.join("assets", "icons", filename)
+    for item_type, filename in _item_icon_filenames.items()
+})
+
+
 def load_item_icons() -> None:
     """Load all item icons."""
-    item_icon_paths: Dict[ItemType, str] = {
-        ItemType.EXTRA_HEALTH: "ExtraHealthIcon.png",
-        ItemType.EXPLODE_ON_DEATH: "ExplodeOnDeathIcon.png",
-        ItemType.UPGRADE_ARMOR: "UpgradeArmorIcon.png",
-        ItemType.DAMAGE_AURA: "DamageAuraIcon.png",
-        ItemType.EXTRA_MOVEMENT_SPEED: "ExtraMovementSpeedIcon.png",
-        ItemType.HEAL_ON_KILL: "HealOnKillIcon.png",
-        ItemType.INFECT_ON_HIT: "InfectOnHitIcon.png",
-        ItemType.HUNTER: "HunterIcon.png",
-        ItemType.REFLECT_DAMAGE: "ReflectDamageIcon.png",
-        ItemType.START_INVISIBLE: "StartInvisibleIcon.png",
-        ItemType.STATIC_DISCHARGE: "StaticDischargeIcon.png"
-    }
-    
-    for item_type, filename in item_icon_paths.items():
-        if item_type in item_icon_surfaces:
-            continue
-        path = os.path.join("assets", "icons", filename)
-        item_icon_surfaces[item_type] = pygame.image.load(path).convert_alpha()
\ No newline at end of file
+    item_icon_surfaces.load_all()
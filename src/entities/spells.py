@@ -6,6 +6,7 @@ import esper
 import math
 import pygame
 import os
+from asset_loader import LazyAssetDict, load_image
 from components.position import Position
 from components.team import Team, TeamType
 from components.unit_type import UnitType
@@ -28,26 +29,28 @@ spell_theme_ids: Dict[SpellType, str] = {
     SpellType.SUMMON_LICH: "#summon_lich_icon"
 }
 
-spell_icon_surfaces: Dict[SpellType, pygame.Surface] = {}
+spell_icon_surfaces: LazyAssetDict[SpellType, pygame.Surface] = LazyAssetDict(load_image)
+
+
+_spell_icon_filenames: Dict[SpellType, str] = {
+    SpellType.SUMMON_SKELETON_SWORDSMEN: "SummonSkeletonSwordsmenIcon.png",
+    SpellType.METEOR_SHOWER: "MeteorShowerIcon.png",
+    SpellType.INFECTING_AREA: "InfectingAreaIcon.png",
+    SpellType.HEALING_AREA: "HealingAreaIcon.png",
+    SpellType.SLOWING_AREA: "SlowingAreaIcon.png",
+    SpellType.CHAIN_EXPLODE_ON_DEATH: "ChainExplodeOnDeathIcon.png",
+    SpellType.SUMMON_LICH: "SummonLichIcon.png",
+}
+
+spell_icon_surfaces.register({
+    spell_type: os.path.join("assets", "icons", filename)
+    for spell_type, filename in _spell_icon_filenames.items()
+})
 
 
 def load_spell_icons() -> None:
     """Load all spell icons."""
-    spell_icon_paths: Dict[SpellType, str] = {
-        SpellType.SUMMON_SKELETON_SWORDSMEN: "SummonSkeletonSwordsmenIcon.png",
-        SpellType.METEOR_SHOWER: "MeteorShowerIcon.png",
-        SpellType.INFECTING_AREA: "InfectingAreaIcon.png",
-        SpellType.HEALING_AREA: "HealingAreaIcon.png",
-        SpellType.SLOWING_AREA: "SlowingAreaIcon.png",
-        SpellType.CHAIN_EXPLODE_ON_DEATH: "ChainExplodeOnDeathIcon.png",
-        SpellType.SUMMON_LICH: "SummonLichIcon.png",
-    }
-    
-    for spell_type, filename in spell_icon_paths.items():
-        if spell_type in spell_icon_surfaces:
-            continue
-        path = os.path.join("assets", "icons", filename)
-        spell_icon_surfaces[spell_type] = pygame.image.load(path).convert_alpha()
+    spell_icon_surfaces.load_all()
 
 
 def create_spell(
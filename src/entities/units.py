@@ -4,6 +4,7 @@ This module contains functions for creating different types of units with their
 """
 
 from enum import Enum
+from asset_loader import LazyAssetDict, load_image, prefetch
 from components.unit_tier import UnitTier, UnitTierComponent
 import esper
 import pygame
@@ -112,7 +113,7 @@ unit_theme_ids: Dict[UnitType, str] = {
     UnitType.ZOMBIE_TANK: "#zombie_tank_icon",
 }
 
-unit_icon_surfaces: Dict[UnitType, pygame.Surface] = {}
+unit_icon_surfaces: LazyAssetDict[UnitType, pygame.Surface] = LazyAssetDict(load_image)
 
 def get_unit_icon_theme_class(unit_tier: 'UnitTier') -> str:
     """Get the appropriate theme class for unit icons based on tier."""
@@ -136,7 +137,7 @@ def get_tier_label_theme_class(unit_tier: 'UnitTier') -> str:
     else:  # UnitTier.BASIC
         return "@tier_label_basic"
 
-sprite_sheets: Dict[UnitType, pygame.Surface] = {}
+sprite_sheets: LazyAssetDict[UnitType, pygame.Surface] = LazyAssetDict(load_image)
 
 class Faction(Enum):
     CORE = 0
@@ -206,117 +207,128 @@ _unit_to_faction = {
     UnitType.ZOMBIE_TANK: Faction.ZOMBIES,
 }
 
+_unit_sprite_sheet_filenames: Dict[UnitType, str] = {
+    UnitType.CORE_ARCHER: "CoreArcher.png", 
+    UnitType.CORE_VETERAN: "CoreVeteran.png",
+    UnitType.CORE_CAVALRY: "CoreCavalry.png",
+    UnitType.CORE_DUELIST: "CoreDuelist.png",
+    UnitType.CORE_LONGBOWMAN: "CoreLongbowman.png",
+    UnitType.CORE_SWORDSMAN: "CoreSwordsman.png", 
+    UnitType.CORE_WIZARD: "CoreWizard.png",
+    UnitType.INFANTRY_BANNER_BEARER: "InfantryBannerBearer.png",
+    UnitType.CRUSADER_BLACK_KNIGHT: "CrusaderBlackKnight.png",
+    UnitType.INFANTRY_CATAPULT: "InfantryCatapult.png",
+    UnitType.CRUSADER_CLERIC: "CrusaderCleric.png",
+    UnitType.MISC_COMMANDER: "MiscCommander.png",
+    UnitType.INFANTRY_CROSSBOWMAN: "InfantryCrossbowman.png",
+    UnitType.CORE_DEFENDER: "CoreDefender.png",
+    UnitType.CRUSADER_GOLD_KNIGHT: "CrusaderGoldKnight.png",
+    UnitType.CRUSADER_GUARDIAN_ANGEL: "CrusaderGuardianAngel.png",
+    UnitType.CRUSADER_PALADIN: "CrusaderPaladin.png",
+    UnitType.INFANTRY_PIKEMAN: "InfantryPikeman.png",
+    UnitType.MISC_RED_KNIGHT: "MiscRedKnight.png",
+    UnitType.INFANTRY_SOLDIER: "InfantrySoldier.png",
+    UnitType.ORC_BERSERKER: "OrcBerserker.png",
+    UnitType.ORC_WARRIOR: "OrcWarrior.png",
+    UnitType.ORC_WARCHIEF: "OrcWarchief.png",
+    UnitType.ORC_GOBLIN: "OrcGoblin.png",
+    UnitType.ORC_WARG_RIDER: "OrcWargRider.png",
+    UnitType.PIRATE_CREW: "PirateCrew.png",
+    UnitType.PIRATE_GUNNER: "PirateGunner.png",
+    UnitType.PIRATE_CAPTAIN: "PirateCaptain.png",
+    UnitType.PIRATE_CANNON: "PirateCannon.png",
+    UnitType.PIRATE_HARPOONER: "PirateHarpooner.png",
+    UnitType.SKELETON_ARCHER: "SkeletonArcher.png",
+    UnitType.SKELETON_MAGE: "SkeletonMage.png",
+    UnitType.SKELETON_SWORDSMAN: "SkeletonSwordsman.png",
+    UnitType.SKELETON_HORSEMAN: "SkeletonHorseman.png",
+    UnitType.SKELETON_ARCHER_NECROMANCER: "SkeletonArcherNecromancer.png",
+    UnitType.SKELETON_HORSEMAN_NECROMANCER: "SkeletonHorsemanNecromancer.png",
+    UnitType.SKELETON_MAGE_NECROMANCER: "SkeletonMageNecromancer.png",
+    UnitType.SKELETON_SWORDSMAN_NECROMANCER: "SkeletonSwordsmanNecromancer.png",
+    UnitType.SKELETON_LICH: "SkeletonLich.png",
+    UnitType.WEREBEAR: "Werebear.png",
+    UnitType.ZOMBIE_BASIC_ZOMBIE: "ZombieBasicZombieNew.png",
+    UnitType.MISC_BRUTE: "ZombieBasicZombie.png",
+    UnitType.ZOMBIE_FIGHTER: "ZombieFighter.png",
+    UnitType.MISC_GRABBER: "ZombieBasicZombie.png",
+    UnitType.ZOMBIE_JUMPER: "ZombieJumper.png",
+    UnitType.ZOMBIE_SPITTER: "ZombieSpitter.png",
+    UnitType.ZOMBIE_TANK: "ZombieTank.png",
+}
+
+_unit_icon_filenames: Dict[UnitType, str] = {
+    UnitType.CORE_ARCHER: "CoreArcherIcon.png",
+    UnitType.CORE_VETERAN: "CoreVeteranIcon.png",
+    UnitType.CORE_CAVALRY: "CoreCavalryIcon.png",
+    UnitType.CORE_DUELIST: "CoreDuelistIcon.png",
+    UnitType.CORE_LONGBOWMAN: "CoreLongbowmanIcon.png",
+    UnitType.CORE_SWORDSMAN: "CoreSwordsmanIcon.png",
+    UnitType.CORE_WIZARD: "CoreWizardIcon.png",
+    UnitType.INFANTRY_BANNER_BEARER: "InfantryBannerBearerIcon.png",
+    UnitType.CRUSADER_BLACK_KNIGHT: "CrusaderBlackKnightIcon.png",
+    UnitType.INFANTRY_CATAPULT: "InfantryCatapultIcon.png",
+    UnitType.CRUSADER_CLERIC: "CrusaderClericIcon.png",
+    UnitType.MISC_COMMANDER: "MiscCommanderIcon.png",
+    UnitType.INFANTRY_CROSSBOWMAN: "InfantryCrossbowmanIcon.png",
+    UnitType.CORE_DEFENDER: "CoreDefenderIcon.png",
+    UnitType.CRUSADER_GOLD_KNIGHT: "CrusaderGoldKnightIcon.png",
+    UnitType.CRUSADER_GUARDIAN_ANGEL: "CrusaderGuardianAngelIcon.png",
+    UnitType.CRUSADER_PALADIN: "CrusaderPaladinIcon.png",
+    UnitType.INFANTRY_PIKEMAN: "InfantryPikemanIcon.png",
+    UnitType.MISC_RED_KNIGHT: "MiscRedKnightIcon.png",
+    UnitType.INFANTRY_SOLDIER: "InfantrySoldierIcon.png",
+    UnitType.ORC_BERSERKER: "OrcBerserkerIcon.png",
+    UnitType.ORC_WARRIOR: "OrcWarriorIcon.png",
+    UnitType.ORC_WARCHIEF: "OrcWarchiefIcon.png",
+    UnitType.ORC_GOBLIN: "OrcGoblinIcon.png",
+    UnitType.ORC_WARG_RIDER: "OrcWargRiderIcon.png",
+    UnitType.PIRATE_CREW: "PirateCrewIcon.png",
+    UnitType.PIRATE_GUNNER: "PirateGunnerIcon.png",
+    UnitType.PIRATE_CAPTAIN: "PirateCaptainIcon.png",
+    UnitType.PIRATE_CANNON: "PirateCannonIcon.png",
+    UnitType.PIRATE_HARPOONER: "PirateHarpoonerIcon.png",
+    UnitType.SKELETON_ARCHER: "SkeletonArcherIcon.png",
+    UnitType.SKELETON_MAGE: "SkeletonMageIcon.png",
+    UnitType.SKELETON_SWORDSMAN: "SkeletonSwordsmanIcon.png",
+    UnitType.SKELETON_HORSEMAN: "SkeletonHorsemanIcon.png",
+    UnitType.SKELETON_ARCHER_NECROMANCER: "SkeletonArcherNecromancerIcon.png",
+    UnitType.SKELETON_HORSEMAN_NECROMANCER: "SkeletonHorsemanNecromancerIcon.png",
+    UnitType.SKELETON_MAGE_NECROMANCER: "SkeletonMageNecromancerIcon.png",
+    UnitType.SKELETON_SWORDSMAN_NECROMANCER: "SkeletonSwordsmanNecromancerIcon.png",
+    UnitType.WEREBEAR: "WerebearIcon.png",
+    UnitType.ZOMBIE_BASIC_ZOMBIE: "ZombieBasicZombieIcon.png",
+    UnitType.MISC_BRUTE: "MiscBruteIcon.png",
+    UnitType.ZOMBIE_FIGHTER: "ZombieFighterIcon.png",
+    UnitType.MISC_GRABBER: "MiscGrabberIcon.png",
+    UnitType.ZOMBIE_JUMPER: "ZombieBasicZombieIcon.png",
+    UnitType.ZOMBIE_SPITTER: "ZombieSpitterIcon.png",
+    UnitType.ZOMBIE_TANK: "ZombieTankIcon.png",
+}
+
+sprite_sheets.register({
+    unit_type: os.path.join("assets", "units", filename)
+    for unit_type, filename in _unit_sprite_sheet_filenames.items()
+})
+unit_icon_surfaces.register({
+    unit_type: os.path.join("assets", "icons", filename)
+    for unit_type, filename in _unit_icon_filenames.items()
+})
+
 def load_sprite_sheets():
-    """Load all sprite sheets and unit icons."""
-    unit_filenames = {
-        UnitType.CORE_ARCHER: "CoreArcher.png", 
-        UnitType.CORE_VETERAN: "CoreVeteran.png",
-        UnitType.CORE_CAVALRY: "CoreCavalry.png",
-        UnitType.CORE_DUELIST: "CoreDuelist.png",
-        UnitType.CORE_LONGBOWMAN: "CoreLongbowman.png",
-        UnitType.CORE_SWORDSMAN: "CoreSwordsman.png", 
-        UnitType.CORE_WIZARD: "CoreWizard.png",
-        UnitType.INFANTRY_BANNER_BEARER: "InfantryBannerBearer.png",
-        UnitType.CRUSADER_BLACK_KNIGHT: "CrusaderBlackKnight.png",
-        UnitType.INFANTRY_CATAPULT: "InfantryCatapult.png",
-        UnitType.CRUSADER_CLERIC: "CrusaderCleric.png",
-        UnitType.MISC_COMMANDER: "MiscCommander.png",
-        UnitType.INFANTRY_CROSSBOWMAN: "InfantryCrossbowman.png",
-        UnitType.CORE_DEFENDER: "CoreDefender.png",
-        UnitType.CRUSADER_GOLD_KNIGHT: "CrusaderGoldKnight.png",
-        UnitType.CRUSADER_GUARDIAN_ANGEL: "CrusaderGuardianAngel.png",
-        UnitType.CRUSADER_PALADIN: "CrusaderPaladin.png",
-        UnitType.INFANTRY_PIKEMAN: "InfantryPikeman.png",
-        UnitType.MISC_RED_KNIGHT: "MiscRedKnight.png",
-        UnitType.INFANTRY_SOLDIER: "InfantrySoldier.png",
-        UnitType.ORC_BERSERKER: "OrcBerserker.png",
-        UnitType.ORC_WARRIOR: "OrcWarrior.png",
-        UnitType.ORC_WARCHIEF: "OrcWarchief.png",
-        UnitType.ORC_GOBLIN: "OrcGoblin.png",
-        UnitType.ORC_WARG_RIDER: "OrcWargRider.png",
-        UnitType.PIRATE_CREW: "PirateCrew.png",
-        UnitType.PIRATE_GUNNER: "PirateGunner.png",
-        UnitType.PIRATE_CAPTAIN: "PirateCaptain.png",
-        UnitType.PIRATE_CANNON: "PirateCannon.png",
-        UnitType.PIRATE_HARPOONER: "PirateHarpooner.png",
-        UnitType.SKELETON_ARCHER: "SkeletonArcher.png",
-        UnitType.SKELETON_MAGE: "SkeletonMage.png",
-        UnitType.SKELETON_SWORDSMAN: "SkeletonSwordsman.png",
-        UnitType.SKELETON_HORSEMAN: "SkeletonHorseman.png",
-        UnitType.SKELETON_ARCHER_NECROMANCER: "SkeletonArcherNecromancer.png",
-        UnitType.SKELETON_HORSEMAN_NECROMANCER: "SkeletonHorsemanNecromancer.png",
-        UnitType.SKELETON_MAGE_NECROMANCER: "SkeletonMageNecromancer.png",
-        UnitType.SKELETON_SWORDSMAN_NECROMANCER: "SkeletonSwordsmanNecromancer.png",
-        UnitType.SKELETON_LICH: "SkeletonLich.png",
-        UnitType.WEREBEAR: "Werebear.png",
-        UnitType.ZOMBIE_BASIC_ZOMBIE: "ZombieBasicZombieNew.png",
-        UnitType.MISC_BRUTE: "ZombieBasicZombie.png",
-        UnitType.ZOMBIE_FIGHTER: "ZombieFighter.png",
-        UnitType.MISC_GRABBER: "ZombieBasicZombie.png",
-        UnitType.ZOMBIE_JUMPER: "ZombieJumper.png",
-        UnitType.ZOMBIE_SPITTER: "ZombieSpitter.png",
-        UnitType.ZOMBIE_TANK: "ZombieTank.png",
-    }
-    for unit_type, filename in unit_filenames.items():
-        if unit_type in sprite_sheets:
-            continue
-        path = os.path.join("assets", "units", filename)
-        sprite_sheets[unit_type] = pygame.image.load(path).convert_alpha()
+    """Load all sprite sheets and unit icons.
+
+    Sprite sheets and icons are loaded lazily on first use, so this is only
+    needed when everything should be resident up front.
+    """
+    sprite_sheets.load_all()
+    unit_icon_surfaces.load_all()
 
-    # Load unit icons
-    unit_icon_paths: Dict[UnitType, str] = {
-        UnitType.CORE_ARCHER: "CoreArcherIcon.png",
-        UnitType.CORE_VETERAN: "CoreVeteranIcon.png",
-        UnitType.CORE_CAVALRY: "CoreCavalryIcon.png",
-        UnitType.CORE_DUELIST: "CoreDuelistIcon.png",
-        UnitType.CORE_LONGBOWMAN: "CoreLongbowmanIcon.png",
-        UnitType.CORE_SWORDSMAN: "CoreSwordsmanIcon.png",
-        UnitType.CORE_WIZARD: "CoreWizardIcon.png",
-        UnitType.INFANTRY_BANNER_BEARER: "InfantryBannerBearerIcon.png",
-        UnitType.CRUSADER_BLACK_KNIGHT: "CrusaderBlackKnightIcon.png",
-        UnitType.INFANTRY_CATAPULT: "InfantryCatapultIcon.png",
-        UnitType.CRUSADER_CLERIC: "CrusaderClericIcon.png",
-        UnitType.MISC_COMMANDER: "MiscCommanderIcon.png",
-        UnitType.INFANTRY_CROSSBOWMAN: "InfantryCrossbowmanIcon.png",
-        UnitType.CORE_DEFENDER: "CoreDefenderIcon.png",
-        UnitType.CRUSADER_GOLD_KNIGHT: "CrusaderGoldKnightIcon.png",
-        UnitType.CRUSADER_GUARDIAN_ANGEL: "CrusaderGuardianAngelIcon.png",
-        UnitType.CRUSADER_PALADIN: "CrusaderPaladinIcon.png",
-        UnitType.INFANTRY_PIKEMAN: "InfantryPikemanIcon.png",
-        UnitType.MISC_RED_KNIGHT: "MiscRedKnightIcon.png",
-        UnitType.INFANTRY_SOLDIER: "InfantrySoldierIcon.png",
-        UnitType.ORC_BERSERKER: "OrcBerserkerIcon.png",
-        UnitType.ORC_WARRIOR: "OrcWarriorIcon.png",
-        UnitType.ORC_WARCHIEF: "OrcWarchiefIcon.png",
-        UnitType.ORC_GOBLIN: "OrcGoblinIcon.png",
-        UnitType.ORC_WARG_RIDER: "OrcWargRiderIcon.png",
-        UnitType.PIRATE_CREW: "PirateCrewIcon.png",
-        UnitType.PIRATE_GUNNER: "PirateGunnerIcon.png",
-        UnitType.PIRATE_CAPTAIN: "PirateCaptainIcon.png",
-        UnitType.PIRATE_CANNON: "PirateCannonIcon.png",
-        UnitType.PIRATE_HARPOONER: "PirateHarpoonerIcon.png",
-        UnitType.SKELETON_ARCHER: "SkeletonArcherIcon.png",
-        UnitType.SKELETON_MAGE: "SkeletonMageIcon.png",
-        UnitType.SKELETON_SWORDSMAN: "SkeletonSwordsmanIcon.png",
-        UnitType.SKELETON_HORSEMAN: "SkeletonHorsemanIcon.png",
-        UnitType.SKELETON_ARCHER_NECROMANCER: "SkeletonArcherNecromancerIcon.png",
-        UnitType.SKELETON_HORSEMAN_NECROMANCER: "SkeletonHorsemanNecromancerIcon.png",
-        UnitType.SKELETON_MAGE_NECROMANCER: "SkeletonMageNecromancerIcon.png",
-        UnitType.SKELETON_SWORDSMAN_NECROMANCER: "SkeletonSwordsmanNecromancerIcon.png",
-        UnitType.WEREBEAR: "WerebearIcon.png",
-        UnitType.ZOMBIE_BASIC_ZOMBIE: "ZombieBasicZombieIcon.png",
-        UnitType.MISC_BRUTE: "MiscBruteIcon.png",
-        UnitType.ZOMBIE_FIGHTER: "ZombieFighterIcon.png",
-        UnitType.MISC_GRABBER: "MiscGrabberIcon.png",
-        UnitType.ZOMBIE_JUMPER: "ZombieBasicZombieIcon.png",
-        UnitType.ZOMBIE_SPITTER: "ZombieSpitterIcon.png",
-        UnitType.ZOMBIE_TANK: "ZombieTankIcon.png",
-    }
-    for unit_type, filename in unit_icon_paths.items():
-        if unit_type in unit_icon_surfaces:
-            continue
-        path = os.path.join("assets", "icons", filename)
-        unit_icon_surfaces[unit_type] = pygame.image.load(path).convert_alpha()
+def prefetch_faction_assets(factions: List["Faction"]) -> None:
+    """Load the sprite sheets and icons of the given factions in the background."""
+    unit_types = [unit_type for faction in factions for unit_type in Faction.units(faction)]
+    prefetch(sprite_sheets, unit_types)
+    prefetch(unit_icon_surfaces, unit_types)
 
 def _get_corruption_power(
         corruption_powers: Optional[List[CorruptionPower]],
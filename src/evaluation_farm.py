@@ -0,0 +1,421 @@
+"""A work queue that spreads battle evaluations over worker processes on many hosts.
+
+The process running the solver hosts a broker with multiprocessing.managers.
+Workers on any host connect to it over TCP, take jobs, and send back results.
+Each worker sends heartbeats while it is connected. If a worker stops sending
+heartbeats, its jobs are handed to another worker. Jobs that raise are retried
+a few times before the error is reported.
+
+EvaluationFarm implements the parts of multiprocessing.Pool that the solver
+uses (map, starmap and apply_async), so it can replace the local process pool.
+
+Start the solver with --farm_address (which listens on 127.0.0.1:50000 by
+default) and workers from the repository root on each host with:
+
+    python src/evaluation_farm.py --address solver-host:50000 --processes 8
+
+Security: the broker and workers exchange pickles, and unpickling runs code.
+Anyone who can connect to the broker with its key can run code on the solver
+host, and a broker can run code on every worker. Both refuse to start unless
+the BATTLESWAP_FARM_AUTHKEY environment variable holds a shared secret key.
+Only listen on a non-loopback address on a trusted network, e.g. behind a
+firewall or an SSH tunnel.
+
+Workers derive some values from the game constants when they start, like the
+point values, so when game_constants.json changes a worker gives its job back
+to the broker and restarts itself.
+"""
+
+import argparse
+import itertools
+import multiprocessing
+import os
+import pickle
+import socket
+import sys
+import threading
+import time
+import traceback
+import uuid
+from collections import deque
+from dataclasses import dataclass
+from multiprocessing.managers import BaseManager
+from typing import Any, Callable, Deque, Dict, Iterable, List, Optional, Tuple
+
+from game_constants import get_game_constants_hash
+
+AUTHKEY_ENV_VAR = "BATTLESWAP_FARM_AUTHKEY"
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 50000
+HEARTBEAT_INTERVAL = 5.0
+HEARTBEAT_TIMEOUT = 30.0
+MAX_RETRIES = 3
+
+
+def get_authkey() -> bytes:
+    """Get the key that the broker and workers use to authenticate each other.
+
+    Raises:
+        RuntimeError: If the key isn't set. There is no default, since anyone
+            who knows the key can run code on the broker and workers.
+    """
+    authkey = os.environ.get(AUTHKEY_ENV_VAR)
+    if not authkey:
+        raise RuntimeError(f"Set the {AUTHKEY_ENV_VAR} environment variable to a secret shared by the broker and workers")
+    return authkey.encode()
+
+
+def parse_address(address: str) -> Tuple[str, int]:
+    """Parse a host:port address. The host defaults to DEFAULT_HOST and the port to DEFAULT_PORT."""
+    host, separator, port = address.rpartition(":")
+    if not separator:
+        host, port = (DEFAULT_HOST, address) if address.isdigit() else (address, "")
+    return host or DEFAULT_HOST, int(port) if port else DEFAULT_PORT
+
+
+@dataclass
+class _Job:
+    # The pickled function and arguments, which workers unpickle themselves so that they can report errors
+    payload: bytes
+    constants_hash: str
+    callback: Optional[Callable[[Any], None]]
+    error_callback: Optional[Callable[[BaseException], None]]
+    attempts: int = 0
+    worker_id: Optional[str] = None
+
+
+class EvaluationBroker:
+    """Hands out jobs to workers and collects their results.
+
+    Lives in the solver's process. Workers call get_job, heartbeat, complete
+    and fail through manager proxies.
+    """
+
+    def __init__(self, heartbeat_timeout: float = HEARTBEAT_TIMEOUT, max_retries: int = MAX_RETRIES):
+        self.heartbeat_timeout = heartbeat_timeout
+        self.max_retries = max_retries
+        self._jobs: Dict[int, _Job] = {}
+        self._pending: Deque[int] = deque()
+        self._heartbeats: Dict[str, float] = {}
+        self._job_ids = itertools.count()
+        self._condition = threading.Condition()
+
+    def submit(
+        self,
+        func: Callable,
+        args: Tuple,
+        callback: Optional[Callable[[Any], None]] = None,
+        error_callback: Optional[Callable[[BaseException], None]] = None,
+        constants_hash: Optional[str] = None,
+    ) -> int:
+        """Queue a job. The callbacks are called on a broker thread.
+
+        Workers refuse the job unless their game constants hash to
+        constants_hash, which defaults to the hash of the current constants.
+
+        Raises:
+            ValueError: If func is defined in the script being run. Workers
+                run their own __main__, so they can't load it.
+        """
+        if getattr(func, "__module__", None) == "__main__":
+            raise ValueError(f"Farm jobs can't use {func.__qualname__} from __main__, import it from its module instead")
+        payload = pickle.dumps((func, args))
+        if constants_hash is None:
+            constants_hash = get_game_constants_hash()
+        with self._condition:
+            job_id = next(self._job_ids)
+            self._jobs[job_id] = _Job(payload, constants_hash, callback, error_callback)
+            self._pending.append(job_id)
+            self._condition.notify()
+        return job_id
+
+    def get_job(self, worker_id: str, timeout: float) -> Optional[Tuple[int, bytes, str]]:
+        """Take the next job, waiting up to timeout seconds for one.
+
+        Returns:
+            The job's id, pickled function and arguments, and constants hash.
+        """
+        deadline = time.monotonic() + timeout
+        with self._condition:
+            self._heartbeats[worker_id] = time.monotonic()
+            while not self._pending:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return None
+                self._condition.wait(remaining)
+            job_id = self._pending.popleft()
+            job = self._jobs[job_id]
+            job.worker_id = worker_id
+            job.attempts += 1
+            return job_id, job.payload, job.constants_hash
+
+    def heartbeat(self, worker_id: str) -> None:
+        """Record that a worker is still alive."""
+        with self._condition:
+            self._heartbeats[worker_id] = time.monotonic()
+
+    def complete(self, worker_id: str, job_id: int, result: Any) -> None:
+        """Report a job's result."""
+        with self._condition:
+            job = self._jobs.get(job_id)
+            # The job may have been reassigned and finished by another worker
+            if job is None or job.worker_id != worker_id:
+                return
+            del self._jobs[job_id]
+        if job.callback is not None:
+            job.callback(result)
+
+    def fail(self, worker_id: str, job_id: int, error: str) -> None:
+        """Report that a job raised an exception, retrying it if it has attempts left."""
+        with self._condition:
+            job = self._jobs.get(job_id)
+            if job is None or job.worker_id != worker_id:
+                return
+            if job.attempts <= self.max_retries:
+                print(f"Job {job_id} failed on {worker_id}, retrying:\n{error}")
+                job.worker_id = None
+                self._pending.append(job_id)
+                self._condition.notify()
+                return
+            del self._jobs[job_id]
+        if job.error_callback is not None:
+            job.error_callback(RuntimeError(f"Job {job_id} failed on {worker_id}:\n{error}"))
+
+    def release(self, worker_id: str, job_id: int) -> None:
+        """Give a job back without counting the attempt, e.g. because the worker is restarting."""
+        with self._condition:
+            job = self._jobs.get(job_id)
+            if job is None or job.worker_id != worker_id:
+                return
+            job.worker_id = None
+            job.attempts -= 1
+            self._heartbeats.pop(worker_id, None)
+            self._pending.appendleft(job_id)
+            self._condition.notify()
+
+    def requeue_lost_jobs(self) -> None:
+        """Give jobs held by workers that stopped sending heartbeats to other workers."""
+        now = time.monotonic()
+        with self._condition:
+            lost_workers = {
+                worker_id for worker_id, last_heartbeat in self._heartbeats.items()
+                if now - last_heartbeat > self.heartbeat_timeout
+            }
+            for worker_id in lost_workers:
+                print(f"Lost worker {worker_id}")
+                del self._heartbeats[worker_id]
+            for job_id, job in self._jobs.items():
+                if job.worker_id in lost_workers:
+                    job.worker_id = None
+                    self._pending.appendleft(job_id)
+            self._condition.notify_all()
+
+    @property
+    def num_workers(self) -> int:
+        with self._condition:
+            return len(self._heartbeats)
+
+
+_broker: Optional[EvaluationBroker] = None
+
+
+def _get_broker() -> EvaluationBroker:
+    return _broker
+
+
+class _BrokerManager(BaseManager):
+    pass
+
+
+_BrokerManager.register("get_broker", callable=_get_broker)
+
+
+class _AsyncResult:
+    """The subset of multiprocessing.pool.AsyncResult used by the solver."""
+
+    def __init__(self):
+        self._event = threading.Event()
+        self._value = None
+        self._error: Optional[BaseException] = None
+
+    def _set(self, value: Any) -> None:
+        self._value = value
+        self._event.set()
+
+    def _set_error(self, error: BaseException) -> None:
+        self._error = error
+        self._event.set()
+
+    def ready(self) -> bool:
+        return self._event.is_set()
+
+    def wait(self, timeout: Optional[float] = None) -> None:
+        self._event.wait(timeout)
+
+    def get(self, timeout: Optional[float] = None) -> Any:
+        if not self._event.wait(timeout):
+            raise multiprocessing.TimeoutError
+        if self._error is not None:
+            raise self._error
+        return self._value
+
+
+class EvaluationFarm:
+    """A drop-in replacement for the local process pool backed by remote workers."""
+
+    def __init__(self, address: Tuple[str, int], heartbeat_timeout: float = HEARTBEAT_TIMEOUT):
+        global _broker
+        if _broker is not None:
+            raise RuntimeError("An evaluation farm is already running in this process")
+        _broker = EvaluationBroker(heartbeat_timeout=heartbeat_timeout)
+        self.broker = _broker
+        self.address = address
+        self._server = _BrokerManager(address=address, authkey=get_authkey()).get_server()
+        self._closed = threading.Event()
+        threading.Thread(target=self._server.serve_forever, name="farm-server", daemon=True).start()
+        threading.Thread(target=self._reap_lost_workers, name="farm-reaper", daemon=True).start()
+        print(f"Evaluation farm listening on {address[0]}:{address[1]}")
+
+    def _reap_lost_workers(self) -> None:
+        while not self._closed.wait(HEARTBEAT_INTERVAL):
+            self.broker.requeue_lost_jobs()
+
+    def apply_async(
+        self,
+        func: Callable,
+        args: Tuple = (),
+        callback: Optional[Callable[[Any], None]] = None,
+        error_callback: Optional[Callable[[BaseException], None]] = None,
+        constants_hash: Optional[str] = None,
+    ) -> _AsyncResult:
+        result = _AsyncResult()
+
+        def on_result(value: Any) -> None:
+            result._set(value)
+            if callback is not None:
+                callback(value)
+
+        def on_error(error: BaseException) -> None:
+            result._set_error(error)
+            if error_callback is not None:
+                error_callback(error)
+
+        self.broker.submit(func, args, on_result, on_error, constants_hash)
+        return result
+
+    def starmap(self, func: Callable, iterable: Iterable[Tuple]) -> List[Any]:
+        constants_hash = get_game_constants_hash()
+        results = [self.apply_async(func, tuple(args), constants_hash=constants_hash) for args in iterable]
+        return [result.get() for result in results]
+
+    def map(self, func: Callable, iterable: Iterable[Any]) -> List[Any]:
+        return self.starmap(func, ((item,) for item in iterable))
+
+    def close(self) -> None:
+        """Stop requeuing jobs. Connected workers keep waiting for new jobs."""
+        self._closed.set()
+
+    def join(self) -> None:
+        pass
+
+
+def _send_heartbeats(broker, worker_id: str, stop: threading.Event) -> None:
+    while not stop.wait(HEARTBEAT_INTERVAL):
+        broker.heartbeat(worker_id)
+
+
+def _restart_worker(address: Tuple[str, int]) -> None:
+    """Replace this process with a new single worker, keeping its process id so a parent can still join it."""
+    sys.stdout.flush()
+    script = os.path.abspath(__file__)
+    os.execv(sys.executable, [sys.executable, script, "--address", f"{address[0]}:{address[1]}", "--processes", "1"])
+
+
+def run_worker(address: Tuple[str, int], worker_id: Optional[str] = None) -> None:
+    """Connect to a broker and evaluate jobs until the connection is lost."""
+    if worker_id is None:
+        worker_id = f"{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:6]}"
+    manager = _BrokerManager(address=address, authkey=get_authkey())
+    # Values derived from the constants on import are only current for these constants
+    startup_constants_hash = get_game_constants_hash()
+    manager.connect()
+    broker = manager.get_broker()
+    stop_heartbeats = threading.Event()
+    threading.Thread(
+        target=_send_heartbeats,
+        args=(broker, worker_id, stop_heartbeats),
+        name="farm-heartbeat",
+        daemon=True,
+    ).start()
+    print(f"Worker {worker_id} connected to {address[0]}:{address[1]}")
+    try:
+        while True:
+            job = broker.get_job(worker_id, HEARTBEAT_INTERVAL)
+            if job is None:
+                continue
+            job_id, payload, constants_hash = job
+            # Reloads the constants if game_constants.json changed
+            current_constants_hash = get_game_constants_hash()
+            if current_constants_hash != startup_constants_hash:
+                # Restart like a new local pool would, so derived values are recomputed too
+                print(f"Worker {worker_id} restarting for new game constants {current_constants_hash}")
+                broker.release(worker_id, job_id)
+                stop_heartbeats.set()
+                _restart_worker(address)
+            try:
+                if current_constants_hash != constants_hash:
+                    raise RuntimeError("This host's game constants differ from the solver's")
+                func, args = pickle.loads(payload)
+                result = func(*args)
+            except Exception:
+                broker.fail(worker_id, job_id, traceback.format_exc())
+            else:
+                broker.complete(worker_id, job_id, result)
+    except (EOFError, ConnectionError):
+        print(f"Worker {worker_id} lost its connection to the broker")
+    finally:
+        stop_heartbeats.set()
+
+
+def add_farm_arguments(parser: argparse.ArgumentParser) -> None:
+    """Add the --farm_address argument for entry points that can use a farm."""
+    parser.add_argument(
+        "--farm_address",
+        nargs="?",
+        const=f"{DEFAULT_HOST}:{DEFAULT_PORT}",
+        default=None,
+        help=(
+            f"Serve evaluations to workers connecting to host:port instead of using a local process pool, "
+            f"{DEFAULT_HOST}:{DEFAULT_PORT} if no address is given. Requires {AUTHKEY_ENV_VAR}"
+        ),
+    )
+
+
+def start_farm_from_args(args: argparse.Namespace) -> Optional[EvaluationFarm]:
+    """Start a farm if --farm_address was given."""
+    if args.farm_address is None:
+        return None
+    return EvaluationFarm(parse_address(args.farm_address))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run evaluation farm workers")
+    parser.add_argument("--address", default=f"{DEFAULT_HOST}:{DEFAULT_PORT}", help="The broker's host:port")
+    parser.add_argument("--processes", type=int, default=multiprocessing.cpu_count())
+    args = parser.parse_args()
+    address = parse_address(args.address)
+    if args.processes == 1:
+        run_worker(address)
+        return
+    workers = [
+        multiprocessing.Process(target=run_worker, args=(address,), daemon=True)
+        for _ in range(args.processes)
+    ]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+
+
+if __name__ == "__main__":
+    main()
@@ -9,8 +9,11 @@ import os
 import sys
 import hashlib
 import json
+from contextlib import contextmanager
 from pathlib import Path
+from typing import Any, Dict, FrozenSet, Iterator, Optional, Tuple
 from pydantic import BaseModel
+import startup_profiler
 
 def get_resource_path(relative_path: str) -> Path:
     """Get absolute path to resource, works for dev and for PyInstaller."""
@@ -761,27 +764,80 @@ class GameConstants(BaseModel):
         frozen = False
 
 gc = None
+# The modification time and size of the file that gc was loaded from
+_loaded_file_state: Optional[Tuple[int, int]] = None
+# The hash of gc, until it is reloaded or overridden
+_gc_hash: Optional[str] = None
+
+def _file_state(path: Path) -> Tuple[int, int]:
+    stat = os.stat(path)
+    return stat.st_mtime_ns, stat.st_size
 
 def get_game_constants_hash() -> str:
-    """Calculate a hash of the current game constants."""
-    reload_game_constants()
-    # Convert the model to a dictionary and then to a JSON string
-    gc_dict = gc.model_dump()
-    gc_json = json.dumps(gc_dict, sort_keys=True)
-    
-    # Calculate the hash
-    return hashlib.md5(gc_json.encode()).hexdigest()
+    """Calculate a hash of the current game constants.
+
+    The constants are reloaded first if game_constants.json has changed since
+    they were loaded, so the hash notices edits made by other processes.
+    """
+    global _gc_hash
+    if _file_state(get_resource_path("data/game_constants.json")) != _loaded_file_state:
+        reload_game_constants()
+    if _gc_hash is None:
+        # Convert the model to a dictionary and then to a JSON string
+        gc_json = json.dumps(gc.model_dump(), sort_keys=True)
+        _gc_hash = hashlib.md5(gc_json.encode()).hexdigest()
+    return _gc_hash
 
 def reload_game_constants() -> None:
     """Reload the game constants from the JSON file."""
-    global gc
+    global gc, _loaded_file_state, _gc_hash
     constants_path = get_resource_path("data/game_constants.json")
-    with open(constants_path, "r") as file:
-        new_gc = GameConstants.model_validate_json(file.read())
+    with startup_profiler.section("validate game_constants.json", "validation"):
+        # Read the state first, so an edit made while reading is noticed next time
+        file_state = _file_state(constants_path)
+        new_gc = GameConstants.model_validate_json(constants_path.read_bytes())
         if gc is None:
             gc = new_gc
         else:
             for field in gc.model_fields:
                 setattr(gc, field, getattr(new_gc, field))
+    _loaded_file_state = file_state
+    _gc_hash = None
+
+# Constants that other modules copy when they're imported: the point values
+# tables (and the glossary's corruption thresholds), the banner bearer aura's
+# status effect class attributes, and hex_grid's default hex size. Changing gc
+# afterwards doesn't reach those copies.
+IMPORT_DERIVED_CONSTANTS: FrozenSet[str] = frozenset(
+    [field for field in GameConstants.model_fields if field.endswith("_POINTS")]
+    + [
+        "HEX_SIZE",
+        "INFANTRY_BANNER_BEARER_AURA_DAMAGE_PERCENTAGE",
+        "INFANTRY_BANNER_BEARER_AURA_MOVEMENT_SPEED",
+    ]
+)
+
+@contextmanager
+def override_game_constants(overrides: Dict[str, Any]) -> Iterator[None]:
+    """Temporarily change game constants in place.
+
+    Modules keep a reference to gc rather than copies of its values, so the
+    new values are used without re-importing anything. Constants in
+    IMPORT_DERIVED_CONSTANTS can't be overridden this way and raise ValueError.
+    """
+    global _gc_hash
+    derived = sorted(IMPORT_DERIVED_CONSTANTS.intersection(overrides))
+    if derived:
+        raise ValueError(f"{', '.join(derived)} can't be overridden after import")
+    original = {field: getattr(gc, field) for field in overrides}
+    try:
+        for field, value in overrides.items():
+            setattr(gc, field, value)
+        _gc_hash = None
+        yield
+    finally:
+        for field, value in original.items():
+            setattr(gc, field, value)
+        _gc_hash = None
 
 reload_game_constants()
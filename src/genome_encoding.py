@@ -0,0 +1,144 @@
+"""Compact binary encoding of army placements.
+
+The solver sends individuals to worker processes for every evaluation. Pickling
+the placements as lists of tuples of enums costs a lot of pipe traffic and time
+at high job rates, so individuals are pickled as a single bytes object instead:
+
+    header: unit count, item count, spell count (uint16 each)
+    units:  unit type id, x, y, item count (UNIT_DTYPE)
+    items:  item type ids of all units in order (uint8)
+    spells: spell type id, x, y, team (SPELL_DTYPE)
+
+Enum ids are the enum's definition order, so the solver and its workers must
+run the same code. Positions are stored as float64, so decoding gives back
+exactly the placements that were encoded, including item order and duplicate
+items.
+
+canonical_genome encodes placements in the same layout after rounding
+positions to a grid and sorting units, items and spells, so armies that only
+differ by tiny position changes or by placement order get the same bytes.
+"""
+
+import struct
+from typing import List, Tuple
+
+import numpy as np
+
+from components.item import ItemType
+from components.spell_type import SpellType
+from components.unit_type import UnitType
+
+UnitPlacement = Tuple[UnitType, Tuple[float, float], List[ItemType]]
+SpellPlacement = Tuple[SpellType, Tuple[float, float], int]
+
+HEADER_DTYPE = np.dtype([("unit_count", "<u2"), ("item_count", "<u2"), ("spell_count", "<u2")])
+UNIT_DTYPE = np.dtype([("unit_type", "<u2"), ("x", "<f8"), ("y", "<f8"), ("item_count", "u1")])
+ITEM_DTYPE = np.dtype("u1")
+SPELL_DTYPE = np.dtype([("spell_type", "<u2"), ("x", "<f8"), ("y", "<f8"), ("team", "i1")])
+
+# The same layouts for decoding. For the few placements in an army, struct is
+# much faster than creating numpy arrays.
+_HEADER_STRUCT = struct.Struct("<HHH")
+_UNIT_STRUCT = struct.Struct("<HddB")
+_SPELL_STRUCT = struct.Struct("<Hddb")
+assert _HEADER_STRUCT.size == HEADER_DTYPE.itemsize
+assert _UNIT_STRUCT.size == UNIT_DTYPE.itemsize
+assert _SPELL_STRUCT.size == SPELL_DTYPE.itemsize
+
+_UNIT_TYPES = list(UnitType)
+_ITEM_TYPES = list(ItemType)
+_SPELL_TYPES = list(SpellType)
+_UNIT_TYPE_IDS = {unit_type: i for i, unit_type in enumerate(_UNIT_TYPES)}
+_ITEM_TYPE_IDS = {item_type: i for i, item_type in enumerate(_ITEM_TYPES)}
+_SPELL_TYPE_IDS = {spell_type: i for i, spell_type in enumerate(_SPELL_TYPES)}
+
+
+def _pack(
+    units: List[Tuple[int, float, float, int]],
+    item_ids: List[int],
+    spells: List[Tuple[int, float, float, int]],
+) -> bytes:
+    return b"".join([
+        np.array([(len(units), len(item_ids), len(spells))], dtype=HEADER_DTYPE).tobytes(),
+        np.array(units, dtype=UNIT_DTYPE).tobytes(),
+        bytes(item_ids),
+        np.array(spells, dtype=SPELL_DTYPE).tobytes(),
+    ])
+
+
+def encode_placements(
+    unit_placements: List[UnitPlacement],
+    spell_placements: List[SpellPlacement],
+) -> bytes:
+    """Encode unit and spell placements into a compact bytes object."""
+    units = [
+        (_UNIT_TYPE_IDS[unit_type], x, y, len(items))
+        for unit_type, (x, y), items in unit_placements
+    ]
+    item_ids = [_ITEM_TYPE_IDS[item_type] for _, _, items in unit_placements for item_type in items]
+    spells = [
+        (_SPELL_TYPE_IDS[spell_type], x, y, team)
+        for spell_type, (x, y), team in spell_placements
+    ]
+    return _pack(units, item_ids, spells)
+
+
+def canonical_genome(
+    unit_placements: List[UnitPlacement],
+    spell_placements: List[SpellPlacement],
+    origin: Tuple[float, float],
+    quantum: float,
+) -> bytes:
+    """Encode placements so that effectively identical armies get the same bytes.
+
+    Positions are rounded to a grid with cells of size quantum around origin,
+    the same way snap_position_to_grid rounds to GRID_SIZE around the hex
+    center. The canonical genome stores grid indices instead of positions, and
+    its units, each unit's items and spells are sorted.
+    """
+    origin_x, origin_y = origin
+    units = sorted(
+        (
+            _UNIT_TYPE_IDS[unit_type],
+            round((x - origin_x) / quantum),
+            round((y - origin_y) / quantum),
+            sorted(_ITEM_TYPE_IDS[item_type] for item_type in items),
+        )
+        for unit_type, (x, y), items in unit_placements
+    )
+    spells = sorted(
+        (
+            _SPELL_TYPE_IDS[spell_type],
+            round((x - origin_x) / quantum),
+            round((y - origin_y) / quantum),
+            team,
+        )
+        for spell_type, (x, y), team in spell_placements
+    )
+    return _pack(
+        [(unit_type_id, grid_x, grid_y, len(item_ids)) for unit_type_id, grid_x, grid_y, item_ids in units],
+        [item_id for _, _, _, item_ids in units for item_id in item_ids],
+        spells,
+    )
+
+
+def decode_placements(genome: bytes) -> Tuple[List[UnitPlacement], List[SpellPlacement]]:
+    """Decode placements encoded with encode_placements."""
+    unit_count, item_count, spell_count = _HEADER_STRUCT.unpack_from(genome)
+    offset = _HEADER_STRUCT.size
+    units_end = offset + unit_count * _UNIT_STRUCT.size
+    units = _UNIT_STRUCT.iter_unpack(genome[offset:units_end])
+    item_ids = genome[units_end:units_end + item_count]
+    spells = _SPELL_STRUCT.iter_unpack(genome[units_end + item_count:])
+
+    unit_placements = []
+    item_index = 0
+    for unit_type_id, x, y, unit_item_count in units:
+        items = [_ITEM_TYPES[item_id] for item_id in item_ids[item_index:item_index + unit_item_count]]
+        item_index += unit_item_count
+        unit_placements.append((_UNIT_TYPES[unit_type_id], (x, y), items))
+    spell_placements = [
+        (_SPELL_TYPES[spell_type_id], (x, y), team)
+        for spell_type_id, x, y, team in spells
+    ]
+    return unit_placements, spell_placements
@@ -3,6 +3,7 @@
 from typing import Dict, Optional
 import pygame
 import os
+from asset_loader import SoundBank, prefetch
 from pydispatch import dispatcher
 from events import (CHANGE_MUSIC_VOLUME, PLAY_SOUND, ChangeMusicVolumeEvent, 
                    PlaySoundEvent, STOP_ALL_SOUNDS, StopAllSoundsEvent, 
@@ -10,16 +11,33 @@ from events import (CHANGE_MUSIC_VOLUME, PLAY_SOUND, ChangeMusicVolumeEvent,
                    MUTE_DRUMS, UNMUTE_DRUMS, MuteDrumsEvent, UnmuteDrumsEvent)
 from settings import settings
 
+# Sound effects up to this file size stay loaded once played
+RESIDENT_SOUND_MAX_FILE_SIZE = 256 * 1024
+# Decoded memory budgets for the evictable parts of each sound bank
+SOUND_BANK_BUDGET_BYTES = 32 * 1024 * 1024
+VOICE_BANK_BUDGET_BYTES = 8 * 1024 * 1024
+
 class SoundHandler:
     """Manages loading and playing of sound effects."""
     
     def __init__(self) -> None:
         """Initialize the sound manager."""
         pygame.mixer.init()
-        self.sounds: Dict[str, pygame.mixer.Sound] = {}
-        self.voices: Dict[str, pygame.mixer.Sound] = {}
+        self.sounds = SoundBank(
+            budget_bytes=SOUND_BANK_BUDGET_BYTES,
+            resident_max_file_size=RESIDENT_SOUND_MAX_FILE_SIZE,
+        )
+        self.voices = SoundBank(budget_bytes=VOICE_BANK_BUDGET_BYTES)
         self._load_sounds()
         self._load_voices()
+        # Short sound effects are played constantly, so warm them up front.
+        # Long effects and voice lines are only loaded when first played.
+        prefetch(self.sounds, [
+            filename for filename in self.sounds.paths
+            if self.sounds.is_resident(filename)
+        ])
+        # Sounds that may still be playing, so stopping only touches those
+        self._active_sounds: Dict[str, pygame.mixer.Sound] = {}
         pygame.mixer.set_num_channels(24)
         dispatcher.connect(self.handle_play_sound, signal=PLAY_SOUND)
         dispatcher.connect(self.handle_play_voice, signal=PLAY_VOICE)
@@ -35,20 +53,28 @@ class SoundHandler:
         pygame.mixer.set_reserved(2)
 
     def _load_sounds(self) -> None:
-        """Load all sound effects from the assets directory."""
+        """Register all sound effects from the assets directory.
+
+        Sounds are decoded lazily the first time they are played.
+        """
         sound_dir = os.path.join("assets", "sounds")
-        for filename in os.listdir(sound_dir):
-            if filename.endswith(".wav"):
-                path = os.path.join(sound_dir, filename)
-                self.sounds[filename] = pygame.mixer.Sound(path)
+        self.sounds.register({
+            filename: os.path.join(sound_dir, filename)
+            for filename in os.listdir(sound_dir)
+            if filename.endswith(".wav")
+        })
 
     def _load_voices(self) -> None:
-        """Load all voice lines from the assets directory."""
+        """Register all voice lines from the assets directory.
+
+        Voice lines are decoded lazily the first time they are played.
+        """
         voice_dir = os.path.join("assets", "voices")
-        for filename in os.listdir(voice_dir):
-            if filename.endswith(".wav"):
-                path = os.path.join(voice_dir, filename)
-                self.voices[filename] = pygame.mixer.Sound(path)
+        self.voices.register({
+            filename: os.path.join(voice_dir, filename)
+            for filename in os.listdir(voice_dir)
+            if filename.endswith(".wav")
+        })
 
     def handle_play_sound(self, event: PlaySoundEvent) -> None:
         """Play a sound effect by name."""
@@ -59,6 +85,11 @@ class SoundHandler:
         else:
             sound.set_volume(event.volume * settings.SOUND_VOLUME)
             sound.play()
+            self._active_sounds = {
+                filename: active_sound for filename, active_sound in self._active_sounds.items()
+                if active_sound.get_num_channels() > 0
+            }
+            self._active_sounds[event.filename] = sound
 
     def handle_play_voice(self, event: PlayVoiceEvent) -> None:
         """Play a voice line by name."""
@@ -71,10 +102,13 @@ class SoundHandler:
 
     def handle_stop_all_sounds(self, event: StopAllSoundsEvent) -> None:
         """Stop all currently playing sound effects."""
-        for sound in self.sounds.values():
-            sound.fadeout(1000)
-        for voice in self.voices.values():
-            voice.fadeout(1000)
+        for sound in self._active_sounds.values():
+            if sound.get_num_channels() > 0:
+                sound.fadeout(1000)
+        self._active_sounds = {}
+        for channel in (self._voice_channel, self._drum_channel):
+            if channel.get_busy():
+                channel.fadeout(1000)
 
     def handle_change_music(self, event: ChangeMusicEvent) -> None:
         """Change the music to the given filename."""
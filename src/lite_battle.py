@@ -0,0 +1,320 @@
+"""An approximate battle engine that simulates thousands of battles at once with NumPy.
+
+simulate_battle runs every unit's components through the full entity
+component system, which takes about a second per battle. The lite engine
+keeps each battle's units as rows of arrays (position, health, range, damage,
+attack cooldown, speed, team) and steps a whole batch of battles in lockstep.
+Each step, every unit targets its closest living enemy, walks towards it until
+it is in range, and hits it once per attack cooldown.
+
+Stats come from each unit type's game constants: *_HP, *_MOVEMENT_SPEED and
+the first of its range, damage and cooldown constants in _RANGE_SUFFIXES,
+_DAMAGE_SUFFIXES and _COOLDOWN_SUFFIXES, so units with a ranged and a melee
+stance always use their ranged stance. Some specials are approximated:
+
+- Wizards and catapults damage every enemy within a radius of their target.
+- Clerics, guardian angels and paladins heal their closest wounded ally,
+  paladins only themselves.
+- Necromancers summon their skeletons next to themselves every cooldown.
+
+Everything else is ignored: tiers, items, spells, armor, corruption powers,
+projectile travel time, collisions, status effects and other abilities. The
+results are only meant to rank armies, so check the rank correlation with
+simulate_battle using lite_calibration.py before relying on them.
+"""
+
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from auto_battle import BattleOutcome
+from components.team import TeamType
+from components.unit_type import UnitType
+from constant_dependencies import _NECROMANCER_SUMMONS
+from game_constants import gc
+
+# Placements of (unit_type, position, items), like simulate_battle takes
+Placements = List[Tuple[UnitType, Tuple[float, float], List]]
+
+_RANGE_SUFFIXES = (
+    "ATTACK_RANGE", "RANGED_RANGE", "RANGED_ATTACK_RANGE", "GUN_RANGE", "MAXIMUM_GUN_RANGE",
+    "RANGE", "MAXIMUM_RANGE", "MELEE_RANGE", "ABILITY_RANGE",
+)
+_DAMAGE_SUFFIXES = ("ATTACK_DAMAGE", "RANGED_DAMAGE", "RANGED_ATTACK_DAMAGE", "GUN_DAMAGE", "DAMAGE", "MELEE_DAMAGE")
+_COOLDOWN_SUFFIXES = ("COOLDOWN", "GUN_COOLDOWN", "ANIMATION_ATTACK_DURATION")
+
+DEFAULT_RANGE = 30.0
+DEFAULT_COOLDOWN = 1.0
+# For area attacks whose size is only given as a sprite scale
+DEFAULT_SPLASH_RADIUS = 50.0
+# Vertical distance counts this many times over when choosing targets, like ByDistance(y_bias=2)
+TARGETING_Y_BIAS = 2.0
+MAX_SUMMONS_PER_NECROMANCER = 12
+
+
+@dataclass(frozen=True)
+class LiteUnitStats:
+    hp: float
+    speed: float
+    attack_range: float
+    damage: float
+    cooldown: float
+    splash_radius: float = 0.0
+    healing: float = 0.0
+    heal_range: float = 0.0
+    heal_cooldown: float = DEFAULT_COOLDOWN
+    summon: Optional[UnitType] = None
+    summon_batch_size: int = 0
+
+
+def _first_constant(prefix: str, suffixes: Sequence[str], default: float) -> float:
+    for suffix in suffixes:
+        value = getattr(gc, f"{prefix}_{suffix}", None)
+        if value is not None:
+            return value
+    return default
+
+
+def lite_unit_stats(unit_type: UnitType) -> LiteUnitStats:
+    """Get the stats of a unit type from the current game constants."""
+    prefix = "SKELETON_NECROMANCER" if unit_type in _NECROMANCER_SUMMONS else unit_type.name
+    stats = dict(
+        hp=_first_constant(prefix, ("HP",), 0.0),
+        speed=_first_constant(prefix, ("MOVEMENT_SPEED",), 0.0),
+        attack_range=_first_constant(prefix, _RANGE_SUFFIXES, DEFAULT_RANGE),
+        damage=_first_constant(prefix, _DAMAGE_SUFFIXES, 0.0),
+        cooldown=_first_constant(prefix, _COOLDOWN_SUFFIXES, DEFAULT_COOLDOWN),
+    )
+    if unit_type in _NECROMANCER_SUMMONS:
+        stats.update(
+            damage=0.0,
+            summon=_NECROMANCER_SUMMONS[unit_type],
+            summon_batch_size=getattr(gc, f"{unit_type.name}_BATCH_SIZE"),
+            cooldown=getattr(gc, f"{unit_type.name}_COOLDOWN"),
+        )
+    elif unit_type == UnitType.CORE_WIZARD:
+        stats.update(splash_radius=gc.CORE_WIZARD_FIREBALL_AOE_RADIUS)
+    elif unit_type == UnitType.INFANTRY_CATAPULT:
+        stats.update(splash_radius=DEFAULT_SPLASH_RADIUS)
+    elif unit_type == UnitType.CRUSADER_CLERIC:
+        stats.update(
+            damage=0.0,
+            healing=gc.CRUSADER_CLERIC_HEALING,
+            heal_range=gc.CRUSADER_CLERIC_ATTACK_RANGE,
+            heal_cooldown=gc.CRUSADER_CLERIC_ANIMATION_ATTACK_DURATION,
+        )
+    elif unit_type == UnitType.CRUSADER_GUARDIAN_ANGEL:
+        stats.update(
+            damage=0.0,
+            healing=gc.CRUSADER_GUARDIAN_ANGEL_HEALING,
+            heal_range=gc.CRUSADER_GUARDIAN_ANGEL_ATTACHMENT_RANGE,
+            heal_cooldown=gc.CRUSADER_GUARDIAN_ANGEL_HEAL_COOLDOWN,
+        )
+    elif unit_type == UnitType.CRUSADER_PALADIN:
+        stats.update(
+            healing=gc.CRUSADER_PALADIN_SKILL_HEAL,
+            heal_cooldown=gc.CRUSADER_PALADIN_SKILL_COOLDOWN,
+        )
+    return LiteUnitStats(**stats)
+
+
+# The per unit arrays of a batch of battles, each of shape (battles, units)
+_FLOAT_FIELDS = (
+    "x", "y", "hp", "max_hp", "speed", "attack_range", "damage", "cooldown", "splash_radius",
+    "healing", "heal_range", "heal_cooldown", "attack_timer", "heal_timer", "spawn_time",
+)
+
+
+class LiteBattles:
+    """A batch of battles stepped in lockstep.
+
+    Battles with fewer units are padded with rows that are never alive.
+    Summoned units have rows from the start, which come alive next to their
+    necromancer at their spawn time if it is still alive.
+    """
+
+    def __init__(self, battles: Sequence[Tuple[Placements, Placements]], stats: Dict[UnitType, LiteUnitStats]):
+        rows_per_battle = [self._rows(ally_placements, enemy_placements, stats) for ally_placements, enemy_placements in battles]
+        num_rows = max((len(rows) for rows in rows_per_battle), default=0)
+        shape = (len(battles), num_rows)
+        for field in _FLOAT_FIELDS:
+            setattr(self, field, np.zeros(shape, dtype=np.float32))
+        self.team = np.zeros(shape, dtype=np.int8)
+        # The row of the necromancer that summons each row, or -1
+        self.owner = np.full(shape, -1, dtype=np.int64)
+        self.pending = np.zeros(shape, dtype=bool)
+        for b, rows in enumerate(rows_per_battle):
+            for i, (team, x, y, unit_stats, owner, spawn_time) in enumerate(rows):
+                self.team[b, i] = team.value
+                self.x[b, i] = x
+                self.y[b, i] = y
+                self.max_hp[b, i] = unit_stats.hp
+                self.hp[b, i] = unit_stats.hp if owner < 0 else 0.0
+                self.speed[b, i] = unit_stats.speed
+                self.attack_range[b, i] = unit_stats.attack_range
+                self.damage[b, i] = unit_stats.damage
+                self.cooldown[b, i] = unit_stats.cooldown
+                self.splash_radius[b, i] = unit_stats.splash_radius
+                self.healing[b, i] = unit_stats.healing
+                self.heal_range[b, i] = unit_stats.heal_range
+                self.heal_cooldown[b, i] = unit_stats.heal_cooldown
+                self.owner[b, i] = owner
+                self.spawn_time[b, i] = spawn_time
+                self.pending[b, i] = owner >= 0
+        self.time = 0.0
+
+    @staticmethod
+    def _rows(ally_placements: Placements, enemy_placements: Placements, stats: Dict[UnitType, LiteUnitStats]) -> List[Tuple]:
+        rows = []
+        summons = []
+        for team, placements in ((TeamType.TEAM1, ally_placements), (TeamType.TEAM2, enemy_placements)):
+            for unit_type, (x, y), _ in placements:
+                unit_stats = stats[unit_type]
+                owner = len(rows)
+                rows.append((team, x, y, unit_stats, -1, 0.0))
+                if unit_stats.summon is not None:
+                    summons.extend(
+                        (team, x, y, stats[unit_stats.summon], owner, (k // unit_stats.summon_batch_size + 1) * unit_stats.cooldown)
+                        for k in range(MAX_SUMMONS_PER_NECROMANCER)
+                    )
+        return rows + summons
+
+    def select(self, battles: np.ndarray) -> None:
+        """Keep only some of the battles."""
+        for field in _FLOAT_FIELDS + ("team", "owner", "pending"):
+            setattr(self, field, getattr(self, field)[battles])
+
+    def step(self, dt: float) -> None:
+        num_battles, num_rows = self.hp.shape
+        batch = np.arange(num_battles)[:, None]
+        alive = self.hp > 0
+        # Offsets and distances from unit i (axis 1) to unit j (axis 2)
+        dx = self.x[:, None, :] - self.x[:, :, None]
+        dy = self.y[:, None, :] - self.y[:, :, None]
+        distance = np.hypot(dx, dy)
+        same_team = self.team[:, :, None] == self.team[:, None, :]
+        enemies = alive[:, :, None] & alive[:, None, :] & ~same_team
+
+        # Target the closest enemy
+        targeting = np.where(enemies, np.hypot(dx, TARGETING_Y_BIAS * dy), np.inf)
+        target = targeting.argmin(axis=2)
+        has_target = np.isfinite(targeting[batch, np.arange(num_rows), target])
+        target_distance = np.take_along_axis(distance, target[..., None], axis=2)[..., 0]
+        in_range = has_target & (target_distance <= self.attack_range)
+
+        # Walk towards it until it is in range
+        moving = has_target & ~in_range & (self.speed > 0)
+        step = np.minimum(self.speed * dt, target_distance - self.attack_range)
+        scale = np.where(moving, step / np.maximum(target_distance, 1e-6), 0.0)
+        self.x += np.take_along_axis(dx, target[..., None], axis=2)[..., 0] * scale
+        self.y += np.take_along_axis(dy, target[..., None], axis=2)[..., 0] * scale
+
+        # Hit it once per cooldown, along with the enemies within the splash radius of it
+        self.attack_timer = np.where(in_range, self.attack_timer + dt, 0.0)
+        attacking = in_range & (self.damage > 0) & (self.attack_timer >= self.cooldown)
+        self.attack_timer = np.where(attacking, self.attack_timer - self.cooldown, self.attack_timer)
+        from_target = distance[batch, target]
+        hit = attacking[:, :, None] & enemies & (
+            (from_target <= self.splash_radius[:, :, None]) | (np.arange(num_rows) == target[:, :, None])
+        )
+        damage = (hit * self.damage[:, :, None]).sum(axis=1)
+
+        # Heal the closest wounded ally in range once per heal cooldown
+        healers = alive & (self.healing > 0)
+        self.heal_timer = np.where(healers, np.minimum(self.heal_timer + dt, self.heal_cooldown), 0.0)
+        wounded = alive & (self.hp < self.max_hp)
+        heal_distance = np.where(
+            same_team & alive[:, :, None] & wounded[:, None, :] & (distance <= self.heal_range[:, :, None]),
+            distance,
+            np.inf,
+        )
+        heal_target = heal_distance.argmin(axis=2)
+        healing = (
+            healers
+            & (self.heal_timer >= self.heal_cooldown)
+            & np.isfinite(heal_distance[batch, np.arange(num_rows), heal_target])
+        )
+        self.heal_timer = np.where(healing, 0.0, self.heal_timer)
+        healed = np.zeros_like(self.hp)
+        np.add.at(healed, (np.broadcast_to(batch, healing.shape)[healing], heal_target[healing]), self.healing[healing])
+
+        self.hp = np.where(alive, np.clip(self.hp - damage + healed, 0.0, self.max_hp), self.hp)
+        self.time += dt
+
+        # Summon skeletons next to their necromancer if it is still alive
+        owner = np.maximum(self.owner, 0)
+        spawning = self.pending & (self.spawn_time <= self.time) & (np.take_along_axis(self.hp, owner, axis=1) > 0)
+        self.x = np.where(spawning, np.take_along_axis(self.x, owner, axis=1), self.x)
+        self.y = np.where(spawning, np.take_along_axis(self.y, owner, axis=1), self.y)
+        self.hp = np.where(spawning, self.max_hp, self.hp)
+        self.pending &= ~spawning
+
+    def team_health(self, team: TeamType) -> np.ndarray:
+        return np.where(self.team == team.value, np.maximum(self.hp, 0.0), 0.0).sum(axis=1)
+
+
+def _simulate_batch(
+    battles: Sequence[Tuple[Placements, Placements]],
+    stats: Dict[UnitType, LiteUnitStats],
+    max_duration: float,
+    dt: float,
+) -> List[Tuple[BattleOutcome, float, float]]:
+    results: List[Optional[Tuple[BattleOutcome, float, float]]] = [None] * len(battles)
+    state = LiteBattles(battles, stats)
+    remaining = np.arange(len(battles))
+    while len(remaining):
+        state.step(dt)
+        team1_health = state.team_health(TeamType.TEAM1)
+        team2_health = state.team_health(TeamType.TEAM2)
+        # Summons that haven't come yet don't keep a team alive
+        done = (team1_health <= 0) | (team2_health <= 0) | (state.time >= max_duration)
+        if not done.any():
+            continue
+        for i in np.flatnonzero(done):
+            if team2_health[i] <= 0:
+                # Team 1 also wins if both teams die
+                outcome = BattleOutcome.TEAM1_VICTORY
+            elif team1_health[i] <= 0:
+                outcome = BattleOutcome.TEAM2_VICTORY
+            else:
+                outcome = BattleOutcome.TIMEOUT
+            results[remaining[i]] = (outcome, float(team1_health[i]), float(team2_health[i]))
+        remaining = remaining[~done]
+        state.select(~done)
+    return results
+
+
+def simulate_lite_battles(
+    battles: Sequence[Tuple[Placements, Placements]],
+    max_duration: float = 120.0,
+    dt: float = 0.1,
+    max_batch_size: int = 1024,
+) -> List[Tuple[BattleOutcome, float, float]]:
+    """Simulate battles with the lite engine.
+
+    Args:
+        battles: The (team 1, team 2) placements of each battle, in world coordinates.
+        max_duration: Battles still going after this many seconds are timeouts.
+        dt: The length of a step in seconds.
+        max_batch_size: The most battles stepped together, which bounds the memory used.
+
+    Returns:
+        The outcome and each team's health left for each battle.
+    """
+    unit_types = {unit_type for placements in battles for side in placements for unit_type, _, _ in side}
+    stats = {unit_type: lite_unit_stats(unit_type) for unit_type in unit_types}
+    stats.update({
+        unit_stats.summon: lite_unit_stats(unit_stats.summon)
+        for unit_stats in list(stats.values())
+        if unit_stats.summon is not None
+    })
+    # Batch battles of similar sizes together so there is less padding
+    order = sorted(range(len(battles)), key=lambda i: len(battles[i][0]) + len(battles[i][1]))
+    results: List[Optional[Tuple[BattleOutcome, float, float]]] = [None] * len(battles)
+    for start in range(0, len(order), max_batch_size):
+        indices = order[start:start + max_batch_size]
+        batch_results = _simulate_batch([battles[i] for i in indices], stats, max_duration, dt)
+        for i, result in zip(indices, batch_results):
+            results[i] = result
+    return results
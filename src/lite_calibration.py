@@ -0,0 +1,79 @@
+"""Check how well the lite battle engine ranks armies compared to simulate_battle.
+
+Random armies are generated for each battle, like the initial populations of
+battle_solver, and simulated both with simulate_battle and with the lite
+engine. The Spearman rank correlation of their fitnesses is reported for each
+battle and overall, along with how often the outcomes agree and how long each
+engine took. The lite engine is only useful as a prefilter for battles where
+the rank correlation is well above zero.
+
+    python src/lite_calibration.py --battles Soldiers "Behold the Wizard's Power!" --armies 64
+"""
+
+import startup_profiler
+startup_profiler.enable_if_requested()
+
+import argparse
+import random
+import time
+
+import numpy as np
+
+from battle_solver import Fitness, _evaluate_all, _lite_fitnesses, cleanup_process_pool, random_population, use_evaluation_farm
+from battles import get_battles_view
+from evaluation_farm import add_farm_arguments, start_farm_from_args
+from surrogate import rank_correlation
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare lite battle engine fitnesses with simulate_battle")
+    parser.add_argument("--battles", nargs="*", default=None, help="Battles to compare, all non-test battles by default")
+    parser.add_argument("--armies", type=int, default=32, help="Random armies to simulate per battle")
+    parser.add_argument("--dt", type=float, default=0.1, help="Length of a lite engine step in seconds")
+    parser.add_argument("--max_duration", type=float, default=120.0)
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument(startup_profiler.PROFILE_STARTUP_FLAG, action="store_true", default=False)
+    add_farm_arguments(parser)
+    args = parser.parse_args()
+    use_evaluation_farm(start_farm_from_args(args))
+    if args.seed is not None:
+        random.seed(args.seed)
+
+    battle_ids = args.battles or [battle.id for battle in get_battles_view() if not battle.is_test]
+    populations = {battle_id: random_population(battle_id=battle_id, size=args.armies) for battle_id in battle_ids}
+    individuals = [ind for population in populations.values() for ind in population.individuals]
+    startup_profiler.finish("lite_calibration")
+
+    start_time = time.perf_counter()
+    lite_fitnesses = _lite_fitnesses(individuals, args.max_duration, args.dt)
+    lite_seconds = time.perf_counter() - start_time
+    try:
+        start_time = time.perf_counter()
+        fitnesses = _evaluate_all(individuals, args.max_duration, use_powers=False)
+        seconds = time.perf_counter() - start_time
+    finally:
+        cleanup_process_pool()
+
+    print(f"\n{'Battle':<45} {'Rank correlation':>16} {'Outcome agreement':>18}")
+    correlations = []
+    start = 0
+    for battle_id in battle_ids:
+        lite, real = lite_fitnesses[start:start + args.armies], fitnesses[start:start + args.armies]
+        start += args.armies
+        correlation = rank_correlation(lite, real, key=Fitness._as_tuple)
+        agreement = np.mean([a.outcome == b.outcome for a, b in zip(lite, real)])
+        if not np.isnan(correlation):
+            correlations.append(correlation)
+        print(f"{battle_id:<45} {correlation:>16.2f} {agreement:>18.2f}")
+
+    agreement = np.mean([a.outcome == b.outcome for a, b in zip(lite_fitnesses, fitnesses)])
+    print(f"\nMean rank correlation per battle: {np.mean(correlations) if correlations else float('nan'):.2f}")
+    print(f"Overall rank correlation: {rank_correlation(lite_fitnesses, fitnesses, key=Fitness._as_tuple):.2f}")
+    print(f"Outcome agreement: {agreement:.2f}")
+    print(f"simulate_battle: {seconds:.1f}s, lite engine: {lite_seconds:.2f}s for {len(individuals)} armies")
+
+
+if __name__ == "__main__":
+    # Pickled jobs have to name this module rather than __main__ for farm workers to load them
+    from lite_calibration import main
+    main()
@@ -5,19 +5,18 @@ This module initializes the game, sets up the display, creates processors,
 and runs the main game loop.
 """
 
+import startup_profiler
+startup_profiler.enable_if_requested()
+
 import argparse
 import sys
 import pygame
-from entities.units import load_sprite_sheets
-from entities.spells import load_spell_icons
-from entities.items import load_item_icons
 from handlers.combat_handler import CombatHandler
 from handlers.sound_handler import SoundHandler
 from handlers.state_machine import StateMachine
 from scenes.scene_manager import scene_manager
 from selected_unit_manager import selected_unit_manager
 import timing
-from visuals import load_visual_sheets
 from info_mode_manager import info_mode_manager
 #import steam
 
@@ -44,23 +43,29 @@ pygame.display.set_caption("Battle Swap")
 # Initialize font for FPS counter
 fps_font = pygame.font.SysFont('Arial', 30)
 
-# Load sprite sheets
-load_sprite_sheets()
-load_spell_icons()
-load_item_icons()
-load_visual_sheets()
+# Sprite sheets, icons and sounds are loaded lazily on first use. The main menu
+# prefetches the assets for the current campaign in the background.
 
 combat_handler = CombatHandler()
 state_machine = StateMachine()
-sound_handler = SoundHandler()
+with startup_profiler.section("SoundHandler"):
+    sound_handler = SoundHandler()
 
 
 parser = argparse.ArgumentParser()
 parser.add_argument("--no_dev", action="store_true", default=False)
+parser.add_argument(
+    startup_profiler.PROFILE_STARTUP_FLAG,
+    action="store_true",
+    default=False,
+    help="Print a ranked startup time report and write a trace file to profiles/",
+)
 args = parser.parse_args()
 
-scene_manager.initialize(screen, developer_mode=not args.no_dev)
+with startup_profiler.section("scene_manager.initialize"):
+    scene_manager.initialize(screen, developer_mode=not args.no_dev)
 selected_unit_manager.initialize(scene_manager.manager)
+startup_profiler.finish("main")
 
 # Main game loop
 running = True
@@ -0,0 +1,337 @@
+"""Point-normalized matchups between every pair of unit variants.
+
+A variant is a unit type at a tier, optionally carrying one item. For each
+pair of variants, armies of about the same number of points fight in each
+formation, from both sides of the arena. The matrix records how often the row
+variant wins and how much health it has left per point it cost.
+
+Results are cached with the hash of the game constants that the variants'
+types depend on (see constant_dependencies). After editing
+game_constants.json, only the matchups whose constants changed are simulated
+again.
+
+    python src/matchup_matrix.py --tiers ELITE --items NONE HUNTER
+"""
+
+import startup_profiler
+startup_profiler.enable_if_requested()
+
+import argparse
+import csv
+import math
+import os
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Callable, Dict, FrozenSet, List, Optional, Tuple
+
+from auto_battle import BattleOutcome, simulate_battle_with_dependencies
+from battle_solver import (
+    ALLOWED_UNIT_TYPES, _get_team_health, cleanup_process_pool, get_constants, PoolJobs, use_evaluation_farm,
+)
+from battles import get_battle_id
+from checkpoint import load_checkpoint, save_checkpoint
+from components.item import ItemType
+from components.team import TeamType
+from components.unit_tier import UnitTier
+from components.unit_type import UnitType
+from constant_dependencies import Dependency
+from evaluation_farm import add_farm_arguments, start_farm_from_args
+from game_constants import gc
+from hex_grid import axial_to_world
+from placement_geometry import calculate_group_placement_positions
+from point_values import get_unit_point_value, item_values
+from tournament import ARENA_BATTLE_ID, mirror_placements
+
+FORMATION_SPACING = 40.0
+# How far behind the edge of no man's land the front rank stands
+FORMATION_DISTANCE = 100.0
+
+# The number of units in each rank of a formation of n units
+FORMATIONS: Dict[str, Callable[[int], int]] = {
+    "line": lambda n: math.ceil(n / 2),
+    "block": lambda n: math.ceil(math.sqrt(n)),
+    "column": lambda n: min(n, 3),
+}
+
+
+@dataclass(frozen=True)
+class UnitVariant:
+    unit_type: UnitType
+    tier: UnitTier
+    item: Optional[ItemType] = None
+
+    @property
+    def name(self) -> str:
+        name = f"{self.unit_type.name}/{self.tier.name}"
+        if self.item is not None:
+            name += f"+{self.item.name}"
+        return name
+
+    @property
+    def items(self) -> List[ItemType]:
+        return [] if self.item is None else [self.item]
+
+    @property
+    def dependencies(self) -> FrozenSet[Dependency]:
+        return frozenset([self.unit_type] + self.items)
+
+    @property
+    def points(self) -> int:
+        points = get_unit_point_value(self.unit_type, self.tier)
+        if self.item is not None:
+            points += item_values[self.item]
+        return points
+
+    def army_size(self, points: float) -> int:
+        """The number of units that costs closest to points, at least one."""
+        return max(1, round(points / self.points))
+
+
+# The score, health left and points of the first variant, then the health left and points of the second
+MatchupGame = Tuple[float, float, float, float, float]
+MatchupKey = Tuple[UnitVariant, UnitVariant, str, float, float, Tuple[int, int]]
+
+
+@lru_cache(maxsize=None)
+def _formation_positions(formation: str, num_units: int, hex_coords: Tuple[int, int]) -> Tuple[Tuple[float, float], ...]:
+    """Positions of a formation on team 1's side of the arena, facing team 2."""
+    center_x, center_y = axial_to_world(*hex_coords)
+    units_per_rank = FORMATIONS[formation](num_units)
+    offsets = [
+        (
+            -(i // units_per_rank) * FORMATION_SPACING,
+            (i % units_per_rank - (units_per_rank - 1) / 2) * FORMATION_SPACING,
+        )
+        for i in range(num_units)
+    ]
+    front = (center_x - gc.NO_MANS_LAND_WIDTH / 2 - FORMATION_DISTANCE, center_y)
+    return tuple(calculate_group_placement_positions(
+        front, offsets, ARENA_BATTLE_ID, hex_coords, required_team=TeamType.TEAM1,
+    ))
+
+
+def _play_game(
+    team1: UnitVariant,
+    team1_positions: Tuple[Tuple[float, float], ...],
+    team2: UnitVariant,
+    team2_positions: Tuple[Tuple[float, float], ...],
+    hex_coords: Tuple[int, int],
+    max_duration: float,
+) -> Tuple[float, float, float]:
+    """Play one game, returning team 1's score and both teams' health left."""
+    center_x, _ = axial_to_world(*hex_coords)
+    enemy_placements, _ = mirror_placements(
+        [(team2.unit_type, position, team2.items) for position in team2_positions], [], center_x,
+    )
+    outcome, (team1_health, team2_health) = simulate_battle_with_dependencies(
+        ally_placements=[(team1.unit_type, position, team1.items) for position in team1_positions],
+        enemy_placements=enemy_placements,
+        max_duration=max_duration,
+        hex_coords=hex_coords,
+        post_battle_callback=lambda _: (_get_team_health(TeamType.TEAM1), _get_team_health(TeamType.TEAM2)),
+        ally_tier=team1.tier,
+        enemy_tier=team2.tier,
+    )
+    score = {
+        BattleOutcome.TEAM1_VICTORY: 1.0,
+        BattleOutcome.TEAM2_VICTORY: 0.0,
+        BattleOutcome.TIMEOUT: 0.5,
+    }[outcome]
+    return score, team1_health, team2_health
+
+
+def _play_matchup(
+    variant_a: UnitVariant,
+    positions_a: Tuple[Tuple[float, float], ...],
+    variant_b: UnitVariant,
+    positions_b: Tuple[Tuple[float, float], ...],
+    hex_coords: Tuple[int, int],
+    max_duration: float,
+) -> List[MatchupGame]:
+    """Play A as team 1 against B, then B as team 1 against A, from A's point of view."""
+    points_a = len(positions_a) * variant_a.points
+    points_b = len(positions_b) * variant_b.points
+    score, health_a, health_b = _play_game(variant_a, positions_a, variant_b, positions_b, hex_coords, max_duration)
+    games = [(score, health_a, points_a, health_b, points_b)]
+    score, health_b, health_a = _play_game(variant_b, positions_b, variant_a, positions_a, hex_coords, max_duration)
+    games.append((1.0 - score, health_a, points_a, health_b, points_b))
+    return games
+
+
+def _flip(games: List[MatchupGame]) -> List[MatchupGame]:
+    return [(1.0 - score, health_b, points_b, health_a, points_a) for score, health_a, points_a, health_b, points_b in games]
+
+
+class MatchupMatrix:
+    """Matchups between unit variants, cached by the constants they depend on."""
+
+    def __init__(
+        self,
+        points: float = 1000,
+        formations: Tuple[str, ...] = tuple(FORMATIONS),
+        max_duration: float = 120.0,
+        hex_coords: Optional[Tuple[int, int]] = None,
+        results: Optional[Dict[MatchupKey, Tuple[str, List[MatchupGame]]]] = None,
+    ):
+        self.points = points
+        self.formations = formations
+        self.max_duration = max_duration
+        self.hex_coords = hex_coords or get_battle_id(ARENA_BATTLE_ID).hex_coords
+        # The games of each matchup, with the hash of the constants they were played with
+        self.results = results if results is not None else {}
+        self.num_simulated = 0
+        self.num_cached = 0
+
+    def _key(self, variant_a: UnitVariant, variant_b: UnitVariant, formation: str) -> MatchupKey:
+        return (variant_a, variant_b, formation, self.points, self.max_duration, tuple(self.hex_coords))
+
+    def update(self, variants: List[UnitVariant], on_progress: Optional[Callable[[int, int], None]] = None) -> None:
+        """Play every matchup between variants that isn't cached with the current constants.
+
+        Args:
+            variants: The variants of the matrix.
+            on_progress: Called with the number of finished and total matchups as they finish.
+        """
+        constants = get_constants()
+        variants = sorted(set(variants), key=lambda variant: variant.name)
+        jobs = []
+        for i, variant_a in enumerate(variants):
+            for variant_b in variants[i:]:
+                constants_hash = constants.hash_for(variant_a.dependencies | variant_b.dependencies)
+                for formation in self.formations:
+                    key = self._key(variant_a, variant_b, formation)
+                    cached = self.results.get(key)
+                    if cached is not None and cached[0] == constants_hash:
+                        self.num_cached += 1
+                        continue
+                    jobs.append((key, constants_hash))
+
+        pool_jobs = PoolJobs()
+        for i, ((variant_a, variant_b, formation, *_), _) in enumerate(jobs):
+            positions_a = _formation_positions(formation, variant_a.army_size(self.points), self.hex_coords)
+            positions_b = _formation_positions(formation, variant_b.army_size(self.points), self.hex_coords)
+            pool_jobs.submit(
+                i,
+                _play_matchup,
+                (variant_a, positions_a, variant_b, positions_b, self.hex_coords, self.max_duration),
+            )
+        for num_finished in range(1, len(jobs) + 1):
+            i, games = pool_jobs.get()
+            key, constants_hash = jobs[i]
+            self.results[key] = (constants_hash, games)
+            self.num_simulated += 1
+            if on_progress is not None:
+                on_progress(num_finished, len(jobs))
+
+    def games(self, variant_a: UnitVariant, variant_b: UnitVariant) -> List[MatchupGame]:
+        """All cached games between two variants, from A's point of view."""
+        flipped = variant_a.name > variant_b.name
+        if flipped:
+            variant_a, variant_b = variant_b, variant_a
+        games = []
+        for formation in self.formations:
+            cached = self.results.get(self._key(variant_a, variant_b, formation))
+            if cached is not None:
+                games.extend(cached[1])
+        return _flip(games) if flipped else games
+
+    def win_rate(self, variant_a: UnitVariant, variant_b: UnitVariant) -> Optional[float]:
+        """How often A beats B, counting timeouts as half a win."""
+        games = self.games(variant_a, variant_b)
+        if not games:
+            return None
+        return sum(score for score, *_ in games) / len(games)
+
+    def health_per_point(self, variant_a: UnitVariant, variant_b: UnitVariant) -> Optional[float]:
+        """A's average health left at the end of its games against B, per point of its army."""
+        games = self.games(variant_a, variant_b)
+        if not games:
+            return None
+        return sum(health_a / points_a for _, health_a, points_a, _, _ in games) / len(games)
+
+    def write_csv(self, variants: List[UnitVariant], path: str, cell: Callable[[UnitVariant, UnitVariant], Optional[float]]) -> None:
+        """Write a matrix with a row and column for each variant."""
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(path, "w", newline="", encoding="utf-8") as f:
+            writer = csv.writer(f)
+            writer.writerow([""] + [variant.name for variant in variants])
+            for variant_a in variants:
+                values = [cell(variant_a, variant_b) for variant_b in variants]
+                writer.writerow([variant_a.name] + ["" if value is None else f"{value:.4g}" for value in values])
+
+    def __str__(self) -> str:
+        return f"Matchups simulated: {self.num_simulated}, reused from cache: {self.num_cached}, cached: {len(self.results)}"
+
+
+def _parse_variants(unit_names: Optional[List[str]], tier_names: List[str], item_names: List[str]) -> List[UnitVariant]:
+    unit_types = [UnitType[name] for name in unit_names] if unit_names else ALLOWED_UNIT_TYPES
+    tiers = [UnitTier[name] for name in tier_names]
+    items = [None if name == "NONE" else ItemType[name] for name in item_names]
+    return [
+        UnitVariant(unit_type, tier, item)
+        for unit_type in unit_types
+        for tier in tiers
+        for item in items
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compute win rates between every pair of unit variants")
+    parser.add_argument("--units", nargs="*", default=None, help="Unit types to include, all allowed unit types by default")
+    parser.add_argument("--tiers", nargs="+", default=["ELITE"], choices=[tier.name for tier in UnitTier])
+    parser.add_argument(
+        "--items",
+        nargs="+",
+        default=["NONE"],
+        choices=["NONE"] + [item_type.name for item_type in ItemType],
+        help="Items to give each unit, one at a time. NONE is the unit without an item",
+    )
+    parser.add_argument("--points", type=float, default=1000, help="The approximate points of each army")
+    parser.add_argument("--formations", nargs="+", default=list(FORMATIONS), choices=list(FORMATIONS))
+    parser.add_argument("--max_duration", type=float, default=120.0)
+    parser.add_argument("--cache_path", default="checkpoints/matchup_matrix.pkl.gz")
+    parser.add_argument("--output_dir", default="plots")
+    parser.add_argument(startup_profiler.PROFILE_STARTUP_FLAG, action="store_true", default=False)
+    add_farm_arguments(parser)
+    args = parser.parse_args()
+    use_evaluation_farm(start_farm_from_args(args))
+
+    variants = _parse_variants(args.units, args.tiers, args.items)
+    results = load_checkpoint(args.cache_path)["results"] if os.path.exists(args.cache_path) else None
+    matrix = MatchupMatrix(
+        points=args.points,
+        formations=tuple(args.formations),
+        max_duration=args.max_duration,
+        results=results,
+    )
+    startup_profiler.finish("matchup_matrix")
+
+    def report_progress(num_finished: int, total: int) -> None:
+        if num_finished % 100 == 0 or num_finished == total:
+            print(f"Played {num_finished}/{total} matchups")
+
+    try:
+        matrix.update(variants, on_progress=report_progress)
+    finally:
+        save_checkpoint(args.cache_path, {"results": matrix.results})
+        cleanup_process_pool()
+    print(matrix)
+
+    matrix.write_csv(variants, os.path.join(args.output_dir, "matchup_win_rate.csv"), matrix.win_rate)
+    matrix.write_csv(variants, os.path.join(args.output_dir, "matchup_health_per_point.csv"), matrix.health_per_point)
+
+    print("\nAverage win rate against all variants:")
+    average_win_rates = {
+        variant: sum(matrix.win_rate(variant, opponent) for opponent in variants) / len(variants)
+        for variant in variants
+    }
+    for variant, win_rate in sorted(average_win_rates.items(), key=lambda item: item[1], reverse=True):
+        print(f"  {variant.name:<45} {win_rate:.3f} ({variant.army_size(args.points)} units, {variant.points} points each)")
+
+
+if __name__ == "__main__":
+    # Pickled jobs have to name this module rather than __main__ for farm workers to load them
+    from matchup_matrix import main
+    main()
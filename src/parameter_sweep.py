@@ -0,0 +1,407 @@
+"""Sweep game constants over the campaign solutions and a battery of matchups.
+
+Each swept constant gets a range, and a grid or Latin hypercube design picks
+the combinations of values to try. At every design point, the campaign's
+best solutions are simulated against their battles and a battery of
+point-normalized matchups is played (see matchup_matrix). Workers apply a
+design point's values to the game constants in place for the duration of a
+job, so one pool tries every point without restarting or editing
+game_constants.json.
+
+A scenario that has none of the types a swept constant affects (see
+constant_dependencies) can't change between design points, so it is only
+simulated with the current constants.
+
+The results table has a row per design point, with the first row for the
+current constants. Each scenario has two columns. The first is a score: 1 for
+a campaign solution's win and 0.5 for a timeout, or a matchup's win rate. The
+second is a health margin, which shows changes that don't flip the outcome:
+the solution's health left minus its enemies', or for a matchup, the first
+unit type's health left per point minus the second's.
+
+    python src/parameter_sweep.py --param CORE_ARCHER_ATTACK_RANGE=300:500 \\
+        --param INFANTRY_PIKEMAN_ATTACK_DAMAGE=20:40 --design lhs --samples 16
+"""
+
+import startup_profiler
+startup_profiler.enable_if_requested()
+
+import argparse
+import csv
+import itertools
+import os
+from dataclasses import dataclass
+from typing import Callable, Dict, FrozenSet, List, NamedTuple, Optional, Tuple, Union
+
+import numpy as np
+
+from auto_battle import BattleOutcome
+from battle_solver import ALLOWED_UNIT_TYPES, Individual, cleanup_process_pool, get_constants, PoolJobs, use_evaluation_farm
+from battles import get_battle_id, get_battles_view
+from components.unit_tier import UnitTier
+from components.unit_type import UnitType
+from constant_dependencies import Dependency, dependency_closure, get_constant_dependencies
+from evaluation_farm import add_farm_arguments, start_farm_from_args
+from game_constants import GameConstants, IMPORT_DERIVED_CONSTANTS, override_game_constants
+from hex_grid import axial_to_world
+from matchup_matrix import FORMATIONS, UnitVariant, _formation_positions, _play_matchup
+from tournament import ARENA_BATTLE_ID
+
+# Team 1's score for each outcome, counting timeouts as half a win
+_TEAM1_SCORES = {
+    BattleOutcome.TEAM1_VICTORY: 1.0,
+    BattleOutcome.TEAM2_VICTORY: 0.0,
+    BattleOutcome.TIMEOUT: 0.5,
+}
+
+DesignPoint = Dict[str, Union[int, float]]
+
+
+class ScenarioResult(NamedTuple):
+    score: float
+    health_margin: float
+
+
+@dataclass(frozen=True)
+class SweepParameter:
+    name: str
+    low: float
+    high: float
+
+    @property
+    def is_int(self) -> bool:
+        return GameConstants.model_fields[self.name].annotation is int
+
+    def value(self, fraction: float) -> Union[int, float]:
+        """The value a fraction of the way from low to high."""
+        value = self.low + fraction * (self.high - self.low)
+        return round(value) if self.is_int else value
+
+
+def parse_parameter(spec: str) -> SweepParameter:
+    """Parse a NAME=LOW:HIGH argument."""
+    name, _, value_range = spec.partition("=")
+    low, _, high = value_range.partition(":")
+    field = GameConstants.model_fields.get(name)
+    if field is None:
+        raise argparse.ArgumentTypeError(f"{name} isn't a game constant")
+    if field.annotation not in (int, float):
+        raise argparse.ArgumentTypeError(f"{name} isn't a number")
+    if name in IMPORT_DERIVED_CONSTANTS:
+        raise argparse.ArgumentTypeError(f"{name} is read when modules are imported, so it can't be swept")
+    if get_constant_dependencies(name) == ():
+        raise argparse.ArgumentTypeError(f"{name} doesn't affect battles")
+    try:
+        return SweepParameter(name, float(low), float(high))
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"Expected NAME=LOW:HIGH, got {spec}")
+
+
+def _unique(design: List[DesignPoint]) -> List[DesignPoint]:
+    # Integer constants can round different fractions to the same point
+    unique = {tuple(sorted(point.items())): point for point in design}
+    return list(unique.values())
+
+
+def grid_design(parameters: List[SweepParameter], steps: int) -> List[DesignPoint]:
+    """Every combination of steps evenly spaced values of each parameter."""
+    fractions = np.linspace(0, 1, steps) if steps > 1 else [0.5]
+    return _unique([
+        {parameter.name: parameter.value(fraction) for parameter, fraction in zip(parameters, combination)}
+        for combination in itertools.product(fractions, repeat=len(parameters))
+    ])
+
+
+def latin_hypercube_design(parameters: List[SweepParameter], samples: int, seed: Optional[int] = None) -> List[DesignPoint]:
+    """Samples points, with each parameter's range split into samples strata that each have one point."""
+    rng = np.random.default_rng(seed)
+    fractions = {
+        parameter.name: (rng.permutation(samples) + rng.random(samples)) / samples
+        for parameter in parameters
+    }
+    return _unique([
+        {parameter.name: parameter.value(fractions[parameter.name][i]) for parameter in parameters}
+        for i in range(samples)
+    ])
+
+
+def _campaign_score(
+    battle_id: str,
+    unit_placements: List[Tuple],
+    use_powers: bool,
+    max_duration: float,
+) -> ScenarioResult:
+    fitness = Individual(battle_id, unit_placements).evaluate(max_duration, use_powers)
+    return ScenarioResult(_TEAM1_SCORES[fitness.outcome], fitness.team1_health - fitness.team2_health)
+
+
+def _matchup_win_rate(
+    variant_a: UnitVariant,
+    variant_b: UnitVariant,
+    formation_positions: List[Tuple[Tuple[Tuple[float, float], ...], Tuple[Tuple[float, float], ...]]],
+    hex_coords: Tuple[int, int],
+    max_duration: float,
+) -> ScenarioResult:
+    games = [
+        game
+        for positions_a, positions_b in formation_positions
+        for game in _play_matchup(variant_a, positions_a, variant_b, positions_b, hex_coords, max_duration)
+    ]
+    return ScenarioResult(
+        sum(score for score, *_ in games) / len(games),
+        sum(health_a / points_a - health_b / points_b for _, health_a, points_a, health_b, points_b in games) / len(games),
+    )
+
+
+def _run_scenario(overrides: DesignPoint, run: Callable[..., ScenarioResult], args: Tuple) -> ScenarioResult:
+    with override_game_constants(overrides):
+        return run(*args)
+
+
+@dataclass
+class Scenario:
+    """A simulation whose score is compared between design points."""
+    name: str
+    dependencies: FrozenSet[Dependency]
+    run: Callable[..., ScenarioResult]
+    args: Tuple
+
+    @property
+    def is_campaign(self) -> bool:
+        return self.run is _campaign_score
+
+
+def campaign_scenarios(battle_ids: Optional[List[str]] = None, max_duration: float = 120.0) -> List[Scenario]:
+    """A scenario for each best solution and best corrupted solution in the campaign."""
+    scenarios = []
+    for battle in get_battles_view():
+        if battle_ids is not None and battle.id not in battle_ids:
+            continue
+        for name, solution, use_powers in [
+            (battle.id, battle.best_solution, False),
+            (f"{battle.id} (corrupted)", battle.best_corrupted_solution, True),
+        ]:
+            if solution is None:
+                continue
+            # Solutions are saved relative to the battle's hex, like its enemies
+            world_x, world_y = axial_to_world(*(battle.hex_coords or (0, 0)))
+            solution = [
+                (unit_type, (x + world_x, y + world_y), items)
+                for unit_type, (x, y), items in solution
+            ]
+            scenarios.append(Scenario(
+                name=f"campaign/{name}",
+                dependencies=Individual(battle.id, solution).dependencies,
+                run=_campaign_score,
+                args=(battle.id, solution, use_powers, max_duration),
+            ))
+    return scenarios
+
+
+def matchup_scenarios(
+    unit_types: List[UnitType],
+    opponents: List[UnitType],
+    points: float = 1000,
+    formations: Tuple[str, ...] = ("line",),
+    max_duration: float = 120.0,
+) -> List[Scenario]:
+    """A scenario for each matchup of a unit type against an opponent, in every formation."""
+    hex_coords = get_battle_id(ARENA_BATTLE_ID).hex_coords
+    pairs = {
+        tuple(sorted((unit_type, opponent), key=lambda unit_type: unit_type.name))
+        for unit_type in unit_types
+        for opponent in opponents
+        if unit_type != opponent
+    }
+    scenarios = []
+    for unit_type_a, unit_type_b in sorted(pairs, key=lambda pair: (pair[0].name, pair[1].name)):
+        variant_a = UnitVariant(unit_type_a, UnitTier.ELITE)
+        variant_b = UnitVariant(unit_type_b, UnitTier.ELITE)
+        formation_positions = [
+            (
+                _formation_positions(formation, variant_a.army_size(points), hex_coords),
+                _formation_positions(formation, variant_b.army_size(points), hex_coords),
+            )
+            for formation in formations
+        ]
+        scenarios.append(Scenario(
+            name=f"matchup/{unit_type_a.name} vs {unit_type_b.name}",
+            dependencies=variant_a.dependencies | variant_b.dependencies,
+            run=_matchup_win_rate,
+            args=(variant_a, variant_b, formation_positions, hex_coords, max_duration),
+        ))
+    return scenarios
+
+
+def _is_affected(scenario: Scenario, parameters: List[SweepParameter]) -> bool:
+    closure = dependency_closure(scenario.dependencies)
+    for parameter in parameters:
+        dependencies = get_constant_dependencies(parameter.name)
+        if dependencies is None or closure.intersection(dependencies):
+            return True
+    return False
+
+
+class ParameterSweep:
+    """Scores every scenario at every design point on the process pool."""
+
+    def __init__(self, parameters: List[SweepParameter], scenarios: List[Scenario]):
+        self.parameters = parameters
+        self.scenarios = scenarios
+        self.affected = [scenario for scenario in scenarios if _is_affected(scenario, parameters)]
+
+    def run(
+        self,
+        design: List[DesignPoint],
+        on_progress: Optional[Callable[[int, int], None]] = None,
+    ) -> List[Dict[str, ScenarioResult]]:
+        """Simulate the scenarios at the current constants, then at each design point.
+
+        Returns:
+            The result of each scenario by name, for the current constants followed by each design point.
+        """
+        get_constants()
+        points: List[DesignPoint] = [{}] + design
+        jobs = [(0, scenario) for scenario in self.scenarios]
+        jobs += [(i, scenario) for i in range(1, len(points)) for scenario in self.affected]
+
+        pool_jobs = PoolJobs()
+        for job_index, (point_index, scenario) in enumerate(jobs):
+            pool_jobs.submit(job_index, _run_scenario, (points[point_index], scenario.run, scenario.args))
+        results: List[Dict[str, ScenarioResult]] = [{} for _ in points]
+        for num_finished in range(1, len(jobs) + 1):
+            job_index, result = pool_jobs.get()
+            point_index, scenario = jobs[job_index]
+            results[point_index][scenario.name] = result
+            if on_progress is not None:
+                on_progress(num_finished, len(jobs))
+
+        # Scenarios that no swept constant affects have the same result everywhere
+        for point_results in results[1:]:
+            for scenario in self.scenarios:
+                point_results.setdefault(scenario.name, results[0][scenario.name])
+        return results
+
+    def summary(self, results: Dict[str, ScenarioResult], baseline: Dict[str, ScenarioResult]) -> Dict[str, float]:
+        """Campaign wins, and how much the design point changed campaign and matchup results."""
+        campaign = [scenario.name for scenario in self.scenarios if scenario.is_campaign]
+        matchups = [scenario.name for scenario in self.scenarios if not scenario.is_campaign]
+
+        def mean_change(field: str) -> float:
+            if not matchups:
+                return 0.0
+            return sum(abs(getattr(results[name], field) - getattr(baseline[name], field)) for name in matchups) / len(matchups)
+
+        return {
+            "campaign_wins": sum(results[name].score == 1.0 for name in campaign),
+            "campaign_changed": sum(results[name].score != baseline[name].score for name in campaign),
+            "matchup_mean_change": mean_change("score"),
+            "matchup_mean_health_change": mean_change("health_margin"),
+        }
+
+    def write_csv(self, design: List[DesignPoint], results: List[Dict[str, ScenarioResult]], path: str) -> None:
+        """Write the results table, with a row per design point."""
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        names = [scenario.name for scenario in self.scenarios]
+        summary_columns = list(self.summary(results[0], results[0]))
+        scenario_columns = [column for name in names for column in (name, f"{name}/health_margin")]
+        with open(path, "w", newline="", encoding="utf-8") as f:
+            writer = csv.writer(f)
+            writer.writerow(["point"] + [parameter.name for parameter in self.parameters] + summary_columns + scenario_columns)
+            for i, (point, point_results) in enumerate(zip([{}] + design, results)):
+                summary = self.summary(point_results, results[0])
+                writer.writerow(
+                    ["current" if i == 0 else i]
+                    + [point.get(parameter.name, "") for parameter in self.parameters]
+                    + [f"{summary[column]:.4g}" for column in summary_columns]
+                    + [f"{value:.4g}" for name in names for value in point_results[name]]
+                )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Simulate the campaign and a battery of matchups over ranges of game constants")
+    parser.add_argument(
+        "--param",
+        dest="parameters",
+        type=parse_parameter,
+        action="append",
+        required=True,
+        help="A game constant and the range to sweep it over, as NAME=LOW:HIGH. Can be repeated",
+    )
+    parser.add_argument("--design", choices=["grid", "lhs"], default="grid", help="A full grid, or a Latin hypercube sample")
+    parser.add_argument("--steps", type=int, default=3, help="Values of each constant in a grid design")
+    parser.add_argument("--samples", type=int, default=10, help="Points in a Latin hypercube design")
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--battles", nargs="*", default=None, help="Campaign battles to simulate, all with solutions by default")
+    parser.add_argument(
+        "--units",
+        nargs="*",
+        default=None,
+        help="Unit types to play matchups for, the unit types the swept constants affect by default",
+    )
+    parser.add_argument("--opponents", nargs="*", default=None, help="Opponents for the matchups, all allowed unit types by default")
+    parser.add_argument("--points", type=float, default=1000, help="The approximate points of each matchup army")
+    parser.add_argument("--formations", nargs="+", default=["line"], choices=list(FORMATIONS))
+    parser.add_argument("--max_duration", type=float, default=120.0)
+    parser.add_argument("--output", default="plots/parameter_sweep.csv")
+    parser.add_argument(startup_profiler.PROFILE_STARTUP_FLAG, action="store_true", default=False)
+    add_farm_arguments(parser)
+    args = parser.parse_args()
+    use_evaluation_farm(start_farm_from_args(args))
+
+    parameters: List[SweepParameter] = args.parameters
+    if args.design == "grid":
+        design = grid_design(parameters, args.steps)
+    else:
+        design = latin_hypercube_design(parameters, args.samples, args.seed)
+
+    if args.units is not None:
+        unit_types = [UnitType[name] for name in args.units]
+    else:
+        unit_types = sorted({
+            dependency
+            for parameter in parameters
+            for dependency in get_constant_dependencies(parameter.name) or ()
+            if isinstance(dependency, UnitType)
+        }, key=lambda unit_type: unit_type.name)
+    opponents = [UnitType[name] for name in args.opponents] if args.opponents else ALLOWED_UNIT_TYPES
+    scenarios = campaign_scenarios(args.battles, args.max_duration) + matchup_scenarios(
+        unit_types, opponents, args.points, tuple(args.formations), args.max_duration,
+    )
+    sweep = ParameterSweep(parameters, scenarios)
+    print(
+        f"{len(design)} design points, {len(scenarios)} scenarios of which "
+        f"{len(sweep.affected)} are affected by the swept constants"
+    )
+    startup_profiler.finish("parameter_sweep")
+
+    def report_progress(num_finished: int, total: int) -> None:
+        if num_finished % 100 == 0 or num_finished == total:
+            print(f"Simulated {num_finished}/{total} scenarios")
+
+    try:
+        results = sweep.run(design, on_progress=report_progress)
+    finally:
+        cleanup_process_pool()
+    sweep.write_csv(design, results, args.output)
+
+    header = "".join(f"{parameter.name:>32}" for parameter in parameters)
+    print(f"\n{'Point':<8}{header} {'Campaign wins':>14} {'Matchup change':>15} {'Health change':>14}  Changed campaign battles")
+    campaign_names = [scenario.name for scenario in scenarios if scenario.is_campaign]
+    for i, (point, point_results) in enumerate(zip([{}] + design, results)):
+        summary = sweep.summary(point_results, results[0])
+        values = "".join(f"{point[parameter.name]:>32.4g}" if point else f"{'current':>32}" for parameter in parameters)
+        changed = [name.partition("/")[2] for name in campaign_names if point_results[name].score != results[0][name].score]
+        print(
+            f"{'current' if i == 0 else i:<8}{values} {summary['campaign_wins']:>8}/{len(campaign_names):<5} "
+            f"{summary['matchup_mean_change']:>15.3f} {summary['matchup_mean_health_change']:>14.3f}  {', '.join(changed)}"
+        )
+    print(f"\nWrote the results table to {args.output}")
+
+
+if __name__ == "__main__":
+    # Pickled jobs have to name this module rather than __main__ for farm workers to load them
+    from parameter_sweep import main
+    main()
@@ -0,0 +1,460 @@
+"""Placement geometry for battlefields.
+
+Computes the legal areas where units and spells can be placed and clips
+positions into them. This module doesn't depend on rendering or the player's
+progress, so the solver and headless workers can use it directly.
+"""
+from collections import OrderedDict
+from contextlib import contextmanager
+from functools import lru_cache
+import random
+from typing import Generator, Hashable, List, Optional, Tuple
+import esper
+import numpy as np
+import shapely
+from shapely.ops import nearest_points
+from components.placing import Placing
+from components.position import Position
+from components.spell import SpellComponent
+from components.team import TeamType
+from components.unit_type import UnitTypeComponent
+from game_constants import gc
+from hex_grid import axial_to_world, get_hex_vertices
+
+LARGE_NUMBER = 10000
+SMALL_GEOMETRY_TOLERANCE = 1e-6
+
+@contextmanager
+def use_world(world_id: str) -> Generator[None, None, None]:
+    """
+    Context manager for temporarily switching to a different Esper world.
+    
+    Automatically switches back to the original world when exiting the context.
+    """
+    starting_world = esper.current_world
+    esper.switch_world(world_id)
+    try:
+        yield
+    finally:
+        esper.switch_world(starting_world)
+
+def snap_position_to_grid(x: float, y: float, hex_coords: Tuple[int, int]) -> tuple[float, float]:
+    """Snap world coordinates to the nearest grid intersection.
+    
+    Args:
+        x: World x coordinate
+        y: World y coordinate
+        hex_coords: (q,r) axial coordinates of the hex cell containing the grid
+        
+    Returns:
+        Tuple of (x, y) world coordinates snapped to grid
+    """
+    # Get the hex center as the grid origin
+    center_x, center_y = axial_to_world(*hex_coords)
+    
+    # Offset coordinates relative to hex center
+    rel_x = x - center_x
+    rel_y = y - center_y
+    
+    # Snap to grid
+    snapped_x = round(rel_x / gc.GRID_SIZE) * gc.GRID_SIZE
+    snapped_y = round(rel_y / gc.GRID_SIZE) * gc.GRID_SIZE
+    
+    # Convert back to world coordinates
+    return (snapped_x + center_x, snapped_y + center_y)
+
+def get_battlefield_polygon(hex_coords: Tuple[int, int]) -> shapely.Polygon:
+    """Get the battlefield polygon for a hex."""
+    return shapely.Polygon(get_hex_vertices(*hex_coords))
+
+def _get_no_mans_land_polygon(hex_coords: Tuple[int, int]) -> shapely.Polygon:
+    """Get the strip between the two teams' sides where no units can be placed."""
+    hex_center_x, _ = axial_to_world(*hex_coords)
+    return shapely.Polygon([
+        (hex_center_x - gc.NO_MANS_LAND_WIDTH//2, -LARGE_NUMBER), 
+        (hex_center_x - gc.NO_MANS_LAND_WIDTH//2, LARGE_NUMBER), 
+        (hex_center_x + gc.NO_MANS_LAND_WIDTH//2, LARGE_NUMBER), 
+        (hex_center_x + gc.NO_MANS_LAND_WIDTH//2, -LARGE_NUMBER)
+    ])
+
+def _get_team_half_plane(hex_coords: Tuple[int, int], team: TeamType) -> shapely.Polygon:
+    """Get the half plane on a team's side of the hex center."""
+    hex_center_x, _ = axial_to_world(*hex_coords)
+    return shapely.Polygon([
+        (hex_center_x, -LARGE_NUMBER),
+        (hex_center_x, LARGE_NUMBER),
+        (-LARGE_NUMBER if team == TeamType.TEAM1 else LARGE_NUMBER, LARGE_NUMBER),
+        (-LARGE_NUMBER if team == TeamType.TEAM1 else LARGE_NUMBER, -LARGE_NUMBER)
+    ])
+
+@lru_cache(maxsize=256)
+def _get_base_legal_area(
+    hex_coords: Tuple[int, int],
+    required_team: Optional[TeamType],
+    for_spells: bool,
+    no_mans_land_width: float,
+) -> shapely.Geometry:
+    """Get the legal area of a hex before removing obstacles.
+
+    The result is prepared so that repeated containment checks are fast. The
+    game constants it depends on are part of the cache key so that reloading
+    them invalidates it.
+    """
+    # Spells can be placed anywhere within the battlefield
+    legal_area = get_battlefield_polygon(hex_coords)
+    if not for_spells:
+        legal_area = legal_area.difference(_get_no_mans_land_polygon(hex_coords))
+        # If team is specified, restrict to appropriate side
+        if required_team is not None:
+            legal_area = legal_area.intersection(_get_team_half_plane(hex_coords, required_team))
+    shapely.prepare(legal_area)
+    return legal_area
+
+_OBSTACLE_CACHE_SIZE = 64
+_obstacle_area_cache: "OrderedDict[tuple, shapely.Geometry]" = OrderedDict()
+
+def _subtract_obstacles(
+    base_key: tuple,
+    legal_area: shapely.Geometry,
+    obstacle_positions: Tuple[Tuple[float, float], ...],
+) -> shapely.Geometry:
+    """Remove a circle around each obstacle from a legal area.
+
+    Results are cached by obstacle positions. When the positions extend a
+    cached set by one, as they do while a group of units is placed one unit at
+    a time, only the new circle is subtracted from the cached result. When
+    they are a cached set with one position removed, as after a unit is
+    deleted, only the removed circle is added back, less the circles of the
+    obstacles that overlap it.
+    """
+    radius = gc.UNIT_PLACEMENT_MINIMUM_DISTANCE
+    key = (base_key, radius, obstacle_positions)
+    cached = _obstacle_area_cache.get(key)
+    if cached is not None:
+        _obstacle_area_cache.move_to_end(key)
+        return cached
+    prefix_area = _obstacle_area_cache.get((base_key, radius, obstacle_positions[:-1]))
+    superset = _find_obstacle_superset(base_key, radius, obstacle_positions) if prefix_area is None else None
+    if prefix_area is not None:
+        result = prefix_area.difference(shapely.Point(obstacle_positions[-1]).buffer(radius))
+    elif superset is not None:
+        superset_area, (removed_x, removed_y) = superset
+        restored = legal_area.intersection(shapely.Point(removed_x, removed_y).buffer(radius))
+        # Only obstacles within two radii of the removed one overlap its circle
+        neighbors = [
+            (x, y) for x, y in obstacle_positions
+            if (x - removed_x) ** 2 + (y - removed_y) ** 2 < (2 * radius) ** 2
+        ]
+        if neighbors:
+            restored = restored.difference(shapely.union_all(shapely.buffer(shapely.points(neighbors), radius)))
+        result = superset_area.union(restored)
+    else:
+        circles = shapely.buffer(shapely.points(obstacle_positions), radius)
+        result = legal_area.difference(shapely.union_all(circles))
+    shapely.prepare(result)
+    _obstacle_area_cache[key] = result
+    if len(_obstacle_area_cache) > _OBSTACLE_CACHE_SIZE:
+        _obstacle_area_cache.popitem(last=False)
+    return result
+
+def _find_obstacle_superset(
+    base_key: tuple,
+    radius: float,
+    obstacle_positions: Tuple[Tuple[float, float], ...],
+) -> Optional[Tuple[shapely.Geometry, Tuple[float, float]]]:
+    """Find a cached area whose obstacles are these positions plus one more, and that position."""
+    for (cached_base_key, cached_radius, cached_positions), area in reversed(_obstacle_area_cache.items()):
+        if cached_base_key != base_key or cached_radius != radius or len(cached_positions) != len(obstacle_positions) + 1:
+            continue
+        # Removing an obstacle keeps the others in the same order
+        i = 0
+        while i < len(obstacle_positions) and cached_positions[i] == obstacle_positions[i]:
+            i += 1
+        if cached_positions[i + 1:] == obstacle_positions[i:]:
+            return area, cached_positions[i]
+    return None
+
+def _get_obstacle_positions(battle_id: str, include_units: bool) -> List[Tuple[float, float]]:
+    """Get the positions of placed units (if include_units) and spells in a battle."""
+    obstacle_positions = []
+    with use_world(battle_id):
+        if include_units:
+            for ent, (pos, _) in esper.get_components(Position, UnitTypeComponent):
+                if esper.has_component(ent, Placing):
+                    continue
+                obstacle_positions.append((pos.x, pos.y))
+        # Spells are always obstacles
+        for ent, (pos, _) in esper.get_components(Position, SpellComponent):
+            if esper.has_component(ent, Placing):
+                continue
+            obstacle_positions.append((pos.x, pos.y))
+    return obstacle_positions
+
+def get_legal_placement_area(
+    battle_id: str,
+    hex_coords: Tuple[int, int],
+    required_team: Optional[TeamType] = None,
+    include_units: bool = True,
+    additional_unit_positions: Optional[List[Tuple[float, float]]] = None,
+) -> shapely.Geometry:
+    """Get the legal placement area for a hex.
+    
+    Args:
+        battle_id: ID of the battle to check
+        hex_coords: (q,r) axial coordinates of the hex
+        required_team: If provided, restrict to this team's side
+        include_units: If True, also restrict placement around existing units
+        additional_unit_positions: Additional unit positions to consider as obstacles
+
+    Returns:
+        Prepared shapely geometry representing the legal placement area
+    """    
+    base_key = (tuple(hex_coords), required_team, False, gc.NO_MANS_LAND_WIDTH)
+    legal_area = _get_base_legal_area(*base_key)
+
+    # Additional positions go last so that placing a group one unit at a time
+    # can reuse the area computed for the previous unit
+    all_obstacle_positions = _get_obstacle_positions(battle_id, include_units)
+    if additional_unit_positions:
+        all_obstacle_positions.extend(additional_unit_positions)
+    if all_obstacle_positions:
+        legal_area = _subtract_obstacles(base_key, legal_area, tuple(all_obstacle_positions))
+    
+    return legal_area
+
+def get_legal_spell_placement_area(
+    battle_id: str,
+    hex_coords: Tuple[int, int],
+) -> shapely.Geometry:
+    """Get the legal placement area for spells, considering both unit and spell collisions.
+    
+    Args:
+        battle_id: ID of the battle to check
+        hex_coords: (q,r) axial coordinates of the hex
+
+    Returns:
+        Prepared shapely geometry representing the legal spell placement area
+    """
+    base_key = (tuple(hex_coords), None, True, gc.NO_MANS_LAND_WIDTH)
+    legal_area = _get_base_legal_area(*base_key)
+
+    all_obstacle_positions = _get_obstacle_positions(battle_id, include_units=True)
+    if all_obstacle_positions:
+        legal_area = _subtract_obstacles(base_key, legal_area, tuple(all_obstacle_positions))
+    
+    return legal_area
+
+class PointSampler:
+    """Draws uniformly random points from a geometry.
+
+    Candidates are drawn in batches from the geometry's bounding box and
+    tested together with shapely.contains_xy. The accepted points are pooled
+    and handed out one at a time, so each sample costs no geometry work. The
+    generator is seeded from random, so runs seeded with random.seed, or
+    resumed from a checkpoint of its state, are reproducible.
+    """
+
+    def __init__(self, geometry: shapely.Geometry, batch_size: int = 256, max_batches: int = 20):
+        self.geometry = geometry
+        self.batch_size = batch_size
+        self.max_batches = max_batches
+        self._rng = np.random.default_rng(random.getrandbits(64))
+        self._xs = np.empty(0)
+        self._ys = np.empty(0)
+
+    def _refill(self) -> None:
+        min_x, min_y, max_x, max_y = self.geometry.bounds
+        for _ in range(self.max_batches):
+            xs = self._rng.uniform(min_x, max_x, self.batch_size)
+            ys = self._rng.uniform(min_y, max_y, self.batch_size)
+            inside = shapely.contains_xy(self.geometry, xs, ys)
+            if inside.any():
+                self._xs = xs[inside]
+                self._ys = ys[inside]
+                return
+
+    def sample(self) -> Optional[Tuple[float, float]]:
+        """Get a random point in the geometry, or None if none could be found."""
+        if len(self._xs) == 0:
+            if self.geometry.is_empty:
+                return None
+            self._refill()
+            if len(self._xs) == 0:
+                return None
+        x, y = self._xs[-1], self._ys[-1]
+        self._xs = self._xs[:-1]
+        self._ys = self._ys[:-1]
+        return (float(x), float(y))
+
+_SAMPLER_CACHE_SIZE = 256
+_samplers: "OrderedDict[Hashable, PointSampler]" = OrderedDict()
+
+def sample_legal_point(key: Hashable, legal_area: shapely.Geometry) -> Optional[Tuple[float, float]]:
+    """Get a random point in a legal area, reusing the pool of points kept under key.
+
+    The pool is discarded when the area for a key changes. The legal area
+    functions return the same cached geometry while the area stays the same,
+    so the pool survives across calls. Only the most recently used pools are
+    kept.
+    """
+    sampler = _samplers.get(key)
+    if sampler is None or sampler.geometry is not legal_area:
+        sampler = PointSampler(legal_area)
+        _samplers[key] = sampler
+        if len(_samplers) > _SAMPLER_CACHE_SIZE:
+            _samplers.popitem(last=False)
+    _samplers.move_to_end(key)
+    return sampler.sample()
+
+def get_center_line(hex_coords: Tuple[int, int]) -> shapely.LineString:
+    """Get the center line of a hex."""
+    hex_center_x, _ = axial_to_world(*hex_coords)
+    return shapely.LineString([(hex_center_x, -LARGE_NUMBER), (hex_center_x, LARGE_NUMBER)]).intersection(
+        get_battlefield_polygon(hex_coords)
+    )
+
+def clip_to_polygon(
+    polygon: shapely.Polygon,
+    x: float,
+    y: float,
+) -> Tuple[float, float]:
+    point = shapely.Point(x, y)
+    if polygon.covers(point):
+        return (x, y)
+    # Shrink slightly to avoid snapping exactly to boundaries due to precision
+    shrunk_polygon = polygon.buffer(-SMALL_GEOMETRY_TOLERANCE)
+    result = nearest_points(point, shrunk_polygon)[1]
+    assert polygon.covers(shapely.Point(result.x, result.y))
+    return (result.x, result.y)
+
+def calculate_group_placement_positions(
+    mouse_world_pos: Tuple[float, float],
+    unit_offsets: List[Tuple[float, float]],
+    battle_id: str,
+    hex_coords: Tuple[int, int],
+    required_team: Optional[TeamType] = None,
+    snap_to_grid: bool = False,
+    sandbox_mode: bool = False,
+) -> List[Tuple[float, float]]:
+    """Calculate placement positions for a group of units.
+    
+    This function ensures that:
+    1. Each unit ends up on a different grid cell (when grid snapping is enabled)
+    2. All units are on the legal side for the correct team
+    3. No units end up outside the legal zone
+    4. Units don't overlap with existing units
+    
+    Args:
+        mouse_world_pos: World position of the mouse cursor
+        unit_offsets: List of (x, y) offsets from the group center for each unit
+        battle_id: ID of the battle
+        hex_coords: Hex coordinates of the battle
+        required_team: Team restriction (if any)
+        snap_to_grid: Whether to snap to grid
+        sandbox_mode: Whether in sandbox mode
+        
+    Returns:
+        List of (x, y) world positions for each unit
+    """
+    if not unit_offsets:
+        return []
+    
+    # Calculate positions sequentially, each considering previously placed units
+    calculated_positions = []
+    
+    for i, (offset_x, offset_y) in enumerate(unit_offsets):
+        # Calculate ideal position
+        ideal_x = mouse_world_pos[0] + offset_x
+        ideal_y = mouse_world_pos[1] + offset_y
+        
+        # Get legal area considering existing units + previously calculated positions
+        legal_area = get_legal_placement_area(
+            battle_id,
+            hex_coords,
+            required_team=required_team,
+            additional_unit_positions=calculated_positions,
+        )
+        
+        # Clip to legal placement area
+        clipped_pos = clip_to_polygon(legal_area, ideal_x, ideal_y)
+        
+        # Apply grid snapping if enabled
+        if snap_to_grid:
+            clipped_pos = snap_position_to_grid(clipped_pos[0], clipped_pos[1], hex_coords)
+            
+            # If grid snapping results in collision, try nearby grid positions
+            if calculated_positions:
+                # Check if this grid position would collide with any previously placed units
+                min_distance = gc.UNIT_PLACEMENT_MINIMUM_DISTANCE
+                for prev_pos in calculated_positions:
+                    distance = ((clipped_pos[0] - prev_pos[0])**2 + (clipped_pos[1] - prev_pos[1])**2)**0.5
+                    if distance < min_distance:
+                        # Find nearest available grid position
+                        clipped_pos = find_nearest_available_grid_position(
+                            clipped_pos[0], clipped_pos[1], hex_coords, legal_area, calculated_positions
+                        )
+                        break
+        
+        calculated_positions.append(clipped_pos)
+    
+    return calculated_positions
+
+def find_nearest_available_grid_position(
+    x: float, 
+    y: float, 
+    hex_coords: Tuple[int, int], 
+    legal_area: shapely.Polygon, 
+    occupied_positions: List[Tuple[float, float]]
+) -> Tuple[float, float]:
+    """Find the nearest available grid position that doesn't collide with occupied positions.
+    
+    Args:
+        x: Initial x coordinate
+        y: Initial y coordinate
+        hex_coords: Hex coordinates for grid reference
+        legal_area: Legal placement area
+        occupied_positions: List of already occupied positions
+        
+    Returns:
+        Tuple of (x, y) coordinates for the nearest available grid position
+    """
+    # Start from the given position
+    center_x, center_y = axial_to_world(*hex_coords)
+    
+    # Convert to grid coordinates
+    grid_x = round((x - center_x) / gc.GRID_SIZE)
+    grid_y = round((y - center_y) / gc.GRID_SIZE)
+    
+    # Try positions in expanding spiral pattern
+    for radius in range(0, 20):  # Maximum search radius
+        for dx in range(-radius, radius + 1):
+            for dy in range(-radius, radius + 1):
+                if abs(dx) != radius and abs(dy) != radius and radius > 0:
+                    continue  # Only check perimeter of current radius
+                
+                test_grid_x = grid_x + dx
+                test_grid_y = grid_y + dy
+                
+                # Convert back to world coordinates
+                test_x = test_grid_x * gc.GRID_SIZE + center_x
+                test_y = test_grid_y * gc.GRID_SIZE + center_y
+                
+                # Check if position is in legal area
+                test_point = shapely.Point(test_x, test_y)
+                if not legal_area.contains(test_point):
+                    continue
+                
+                # Check if position is far enough from occupied positions
+                min_distance = gc.UNIT_PLACEMENT_MINIMUM_DISTANCE
+                is_valid = True
+                for occupied_pos in occupied_positions:
+                    distance = ((test_x - occupied_pos[0])**2 + (test_y - occupied_pos[1])**2)**0.5
+                    if distance < min_distance:
+                        is_valid = False
+                        break
+                
+                if is_valid:
+                    return (test_x, test_y)
+    
+    # If no grid position found, return the clipped position
+    return clip_to_polygon(legal_area, x, y)
@@ -0,0 +1,160 @@
+"""Streaming plot output for long solver runs.
+
+Rebuilding every plotly figure from the full history each generation gets
+slower as a run goes on, and blocks the evolution loop while it does. Instead,
+each generation's metrics are appended as one row to a CSV log, and the HTML is
+rendered from the log by a separate process, at most every min_interval
+seconds. The loop never waits for a render; if one is still running, the next
+generation's render is skipped.
+
+Render a log on demand with:
+
+    python src/plot_output.py plots/battle.csv plots/battle.html
+"""
+
+import csv
+import os
+import subprocess
+import sys
+import time
+from collections import defaultdict
+from typing import Dict, List, Optional
+
+GENERATION_COLUMN = "generation"
+
+
+class MetricsLog:
+    """An append-only CSV file with one row of metrics per generation.
+
+    The columns are fixed by the first row written. Metrics without a column
+    are dropped and missing metrics are left empty.
+    """
+
+    def __init__(self, path: str, resume: bool = False):
+        self.path = path
+        self.columns: Optional[List[str]] = None
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        if resume and os.path.exists(path):
+            with open(path, newline="", encoding="utf-8") as f:
+                self.columns = next(csv.reader(f), None)
+        elif os.path.exists(path):
+            os.remove(path)
+
+    def append(self, generation: int, metrics: Dict[str, float]) -> None:
+        with open(self.path, "a", newline="", encoding="utf-8") as f:
+            writer = csv.writer(f)
+            if self.columns is None:
+                self.columns = [GENERATION_COLUMN] + sorted(metrics)
+                writer.writerow(self.columns)
+            row = dict(metrics, **{GENERATION_COLUMN: generation})
+            writer.writerow([row.get(column, "") for column in self.columns])
+
+
+def read_metrics_log(path: str) -> Dict[str, List[Optional[float]]]:
+    """Read a metrics log into a column per metric."""
+    with open(path, newline="", encoding="utf-8") as f:
+        reader = csv.reader(f)
+        columns = next(reader, None) or []
+        values: Dict[str, List[Optional[float]]] = {column: [] for column in columns}
+        for row in reader:
+            # The last row may still be being written
+            if len(row) != len(columns):
+                continue
+            for column, value in zip(columns, row):
+                values[column].append(float(value) if value else None)
+    return values
+
+
+def render_metrics_log(log_path: str, html_path: str) -> None:
+    """Render a metrics log to HTML, with one figure per metric group.
+
+    Metrics are grouped by everything before the last "/" in their name, so
+    "Soldiers/unit_counts/CORE_ARCHER" is a line in the "Soldiers/unit_counts"
+    figure.
+    """
+    import plotly.graph_objects as go
+
+    values = read_metrics_log(log_path)
+    generations = values.pop(GENERATION_COLUMN, [])
+    groups: Dict[str, List[str]] = defaultdict(list)
+    for column in values:
+        group, _, _ = column.rpartition("/")
+        groups[group].append(column)
+
+    html = "<h1>Table of Contents</h1><ul>"
+    for group in groups:
+        html += f"<li><a href='#{group}'>{group}</a></li>"
+    html += "</ul>"
+    for i, (group, columns) in enumerate(groups.items()):
+        fig = go.Figure()
+        for column in columns:
+            fig.add_trace(go.Scatter(
+                x=generations,
+                y=values[column],
+                name=column.rpartition("/")[2],
+                mode='lines',
+                hovertemplate='%{fullData.name}<extra></extra>',
+            ))
+        fig.update_layout(
+            title=group,
+            xaxis_title="Generation",
+            showlegend=True,
+            legend=dict(
+                yanchor="top",
+                y=0.99,
+                xanchor="left",
+                x=1.05
+            ),
+            margin=dict(r=200)  # Add right margin for legend
+        )
+        html += f"<h2 id='{group}'>{group}</h2>"
+        # Only include plotly.js once, from the CDN, to keep the file small
+        html += fig.to_html(full_html=False, include_plotlyjs="cdn" if i == 0 else False)
+
+    directory = os.path.dirname(html_path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    # Write to a temporary file first so the page is never seen half written
+    temp_path = f"{html_path}.tmp"
+    with open(temp_path, "w", encoding="utf-8") as f:
+        f.write(html)
+    os.replace(temp_path, html_path)
+
+
+class PlotRenderer:
+    """Renders a metrics log to HTML in a separate process, at most every min_interval seconds."""
+
+    def __init__(self, log_path: str, html_path: str, min_interval: float = 30.0):
+        self.log_path = log_path
+        self.html_path = html_path
+        self.min_interval = min_interval
+        self._process: Optional[subprocess.Popen] = None
+        self._last_render_time = float("-inf")
+
+    def is_rendering(self) -> bool:
+        return self._process is not None and self._process.poll() is None
+
+    def maybe_render(self) -> None:
+        """Start a render unless one is running or the last one was too recent."""
+        if self.is_rendering() or time.monotonic() - self._last_render_time < self.min_interval:
+            return
+        self._last_render_time = time.monotonic()
+        self._process = subprocess.Popen(
+            [sys.executable, os.path.abspath(__file__), self.log_path, self.html_path],
+        )
+
+    def close(self) -> None:
+        """Wait for a running render, then render the final state of the log."""
+        if self._process is not None:
+            self._process.wait()
+        if os.path.exists(self.log_path):
+            render_metrics_log(self.log_path, self.html_path)
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 3:
+        print("Usage: python src/plot_output.py <metrics log> <html output>")
+        sys.exit(1)
+    render_metrics_log(sys.argv[1], sys.argv[2])
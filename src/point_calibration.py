@@ -0,0 +1,360 @@
+"""Estimate fair point values for units from simulated matches between mixed armies.
+
+Each iteration plays matches between random mixed armies that cost about the
+same under the current point estimates, on both sides of the arena. A logistic
+model is then fit to all matches: the chance that army A beats army B is
+
+    sigmoid(sum over unit types of strength[unit_type] * (count in A - count in B))
+
+A unit's fair cost is proportional to its strength, scaled so the fair costs
+match the current *_POINTS values as closely as possible overall. The point
+estimates move part of the way towards the fair costs, and the next
+iteration's armies are built with them, so matches become more even and more
+informative as the estimates converge.
+
+Matches are kept with the hash of the constants their armies depend on, so a
+resumed calibration only reuses matches whose units haven't changed since. The
+result is a unified diff of data/game_constants.json that can be reviewed and
+applied with git apply.
+
+    python src/point_calibration.py --iterations 10 --matches_per_iteration 2000
+"""
+
+import startup_profiler
+startup_profiler.enable_if_requested()
+
+import argparse
+import difflib
+import os
+import random
+import re
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from auto_battle import BattleOutcome
+from battle_solver import (
+    ALLOWED_UNIT_TYPES, Individual, _get_random_legal_position, cleanup_process_pool, get_constants,
+    PoolJobs, use_evaluation_farm,
+)
+from battles import get_battle_id
+from checkpoint import add_checkpoint_arguments, load_checkpoint, save_checkpoint
+from components.team import TeamType
+from components.unit_type import UnitType
+from evaluation_farm import add_farm_arguments, start_farm_from_args
+from game_constants import get_resource_path
+from plot_output import MetricsLog, PlotRenderer
+from point_values import unit_values
+from tournament import ARENA_BATTLE_ID, _play_both_sides
+
+# Team 1's score for each outcome, counting timeouts as half a win
+_TEAM1_SCORES = {
+    BattleOutcome.TEAM1_VICTORY: 1.0,
+    BattleOutcome.TEAM2_VICTORY: 0.0,
+    BattleOutcome.TIMEOUT: 0.5,
+}
+
+
+@dataclass
+class CalibrationGame:
+    counts_a: Dict[UnitType, int]
+    counts_b: Dict[UnitType, int]
+    score_a: float
+    constants_hash: str
+
+
+@dataclass
+class IterationDiagnostics:
+    iteration: int
+    num_games: int
+    log_likelihood_per_game: float
+    # How far this iteration's games were from a draw on average, 0 for perfectly even armies
+    mean_decisiveness: float
+    max_relative_change: float
+    mean_relative_standard_error: float
+
+    def __str__(self) -> str:
+        return (
+            f"Iteration {self.iteration}: {self.num_games} games, "
+            f"log likelihood per game: {self.log_likelihood_per_game:.4f}, "
+            f"mean decisiveness: {self.mean_decisiveness:.3f}, "
+            f"max relative change: {self.max_relative_change:.3f}, "
+            f"mean relative standard error: {self.mean_relative_standard_error:.3f}"
+        )
+
+
+def fit_strengths(
+    games: List[CalibrationGame],
+    unit_types: List[UnitType],
+    regularization: float = 1.0,
+    max_steps: int = 50,
+) -> Tuple[np.ndarray, np.ndarray, float]:
+    """Fit each unit type's strength with L2 regularized logistic regression.
+
+    Returns:
+        The strengths, their standard errors, and the log likelihood of the games.
+    """
+    index = {unit_type: i for i, unit_type in enumerate(unit_types)}
+    x = np.zeros((len(games), len(unit_types)))
+    for row, game in enumerate(games):
+        for unit_type, count in game.counts_a.items():
+            x[row, index[unit_type]] += count
+        for unit_type, count in game.counts_b.items():
+            x[row, index[unit_type]] -= count
+    y = np.array([game.score_a for game in games])
+
+    strengths = np.zeros(len(unit_types))
+    hessian = regularization * np.eye(len(unit_types))
+    for _ in range(max_steps):
+        p = 1 / (1 + np.exp(-x @ strengths))
+        gradient = x.T @ (y - p) - regularization * strengths
+        hessian = x.T @ (x * (p * (1 - p))[:, None]) + regularization * np.eye(len(unit_types))
+        step = np.linalg.solve(hessian, gradient)
+        strengths += step
+        if np.max(np.abs(step)) < 1e-8:
+            break
+    p = np.clip(1 / (1 + np.exp(-x @ strengths)), 1e-12, 1 - 1e-12)
+    log_likelihood = float(np.sum(y * np.log(p) + (1 - y) * np.log(1 - p)))
+    standard_errors = np.sqrt(np.diag(np.linalg.inv(hessian)))
+    return strengths, standard_errors, log_likelihood
+
+
+class PointCalibration:
+    """Iteratively estimates fair unit costs from matches between mixed armies."""
+
+    def __init__(
+        self,
+        unit_types: Optional[List[UnitType]] = None,
+        army_points: float = 1000,
+        min_unit_types: int = 2,
+        max_unit_types: int = 4,
+        max_duration: float = 120.0,
+        step_size: float = 0.5,
+        regularization: float = 1.0,
+        arena_battle_id: str = ARENA_BATTLE_ID,
+    ):
+        self.unit_types = list(unit_types or ALLOWED_UNIT_TYPES)
+        self.army_points = army_points
+        self.min_unit_types = min_unit_types
+        self.max_unit_types = max_unit_types
+        self.max_duration = max_duration
+        self.step_size = step_size
+        self.regularization = regularization
+        self.arena_battle_id = arena_battle_id
+        self.hex_coords = get_battle_id(arena_battle_id).hex_coords or (0, 0)
+        self.costs: Dict[UnitType, float] = {unit_type: float(unit_values[unit_type]) for unit_type in self.unit_types}
+        self.standard_errors: Dict[UnitType, float] = {unit_type: float("nan") for unit_type in self.unit_types}
+        self.games: List[CalibrationGame] = []
+        self.history: List[IterationDiagnostics] = []
+
+    def random_counts(self) -> Dict[UnitType, int]:
+        """Random counts of a few unit types that cost about army_points under the current costs."""
+        num_unit_types = random.randint(self.min_unit_types, min(self.max_unit_types, len(self.unit_types)))
+        unit_types = random.sample(self.unit_types, num_unit_types)
+        shares = np.random.dirichlet(np.ones(num_unit_types))
+        return {
+            unit_type: max(1, round(share * self.army_points / self.costs[unit_type]))
+            for unit_type, share in zip(unit_types, shares)
+        }
+
+    def _army(self, counts: Dict[UnitType, int]) -> Individual:
+        unit_placements = [
+            (unit_type, _get_random_legal_position(TeamType.TEAM1, self.hex_coords, self.arena_battle_id), [])
+            for unit_type, count in counts.items()
+            for _ in range(count)
+        ]
+        return Individual(self.arena_battle_id, unit_placements)
+
+    def play(self, num_matches: int) -> List[CalibrationGame]:
+        """Play matches between random armies on the process pool. Each match is a game on each side."""
+        constants = get_constants()
+        armies = [(self.random_counts(), self.random_counts()) for _ in range(num_matches)]
+        pool_jobs = PoolJobs()
+        for i, (counts_a, counts_b) in enumerate(armies):
+            pool_jobs.submit(
+                i,
+                _play_both_sides,
+                (self._army(counts_a), self._army(counts_b), self.hex_coords, self.max_duration),
+            )
+        games = []
+        for num_finished in range(1, num_matches + 1):
+            i, result = pool_jobs.get()
+            counts_a, counts_b = armies[i]
+            constants_hash = constants.hash_for(set(counts_a) | set(counts_b))
+            a_as_team1, b_as_team1 = result
+            games.append(CalibrationGame(counts_a, counts_b, _TEAM1_SCORES[a_as_team1], constants_hash))
+            games.append(CalibrationGame(counts_a, counts_b, 1.0 - _TEAM1_SCORES[b_as_team1], constants_hash))
+            if num_finished % 100 == 0:
+                print(f"Played {num_finished}/{num_matches} matches")
+        return games
+
+    def iterate(self, num_matches: int) -> IterationDiagnostics:
+        """Play a batch of matches and move the costs towards the fitted fair costs."""
+        new_games = self.play(num_matches)
+        self.games.extend(new_games)
+        constants = get_constants()
+        # Games played before an edit to one of their units' constants no longer apply
+        valid_games = [
+            game for game in self.games
+            if game.constants_hash == constants.hash_for(set(game.counts_a) | set(game.counts_b))
+        ]
+        strengths, standard_errors, log_likelihood = fit_strengths(valid_games, self.unit_types, self.regularization)
+
+        current = np.array([self.costs[unit_type] for unit_type in self.unit_types])
+        # Units that never help an army get the smallest cost that still lets them be counted
+        strengths = np.maximum(strengths, 1e-3 * np.max(np.abs(strengths)) + 1e-9)
+        scale = float(current @ strengths / (strengths @ strengths))
+        fair = scale * strengths
+        # Units that weren't in any game keep their cost
+        played = {unit_type for game in valid_games for unit_type in (*game.counts_a, *game.counts_b)}
+        fair = np.array([
+            cost if unit_type in played else current_cost
+            for unit_type, cost, current_cost in zip(self.unit_types, fair, current)
+        ])
+        updated = current + self.step_size * (fair - current)
+
+        diagnostics = IterationDiagnostics(
+            iteration=len(self.history) + 1,
+            num_games=len(valid_games),
+            log_likelihood_per_game=log_likelihood / len(valid_games),
+            mean_decisiveness=float(np.mean([abs(game.score_a - 0.5) * 2 for game in new_games])),
+            max_relative_change=float(np.max(np.abs(updated - current) / current)),
+            mean_relative_standard_error=float(np.mean(scale * standard_errors / fair)),
+        )
+        for unit_type, cost, standard_error in zip(self.unit_types, updated, standard_errors):
+            self.costs[unit_type] = float(cost)
+            self.standard_errors[unit_type] = float(scale * standard_error)
+        self.history.append(diagnostics)
+        return diagnostics
+
+    def metrics(self) -> Dict[str, float]:
+        """The latest diagnostics and costs, for a MetricsLog."""
+        latest = self.history[-1]
+        metrics = {
+            "convergence/log_likelihood_per_game": latest.log_likelihood_per_game,
+            "convergence/mean_decisiveness": latest.mean_decisiveness,
+            "convergence/max_relative_change": latest.max_relative_change,
+            "convergence/mean_relative_standard_error": latest.mean_relative_standard_error,
+        }
+        for unit_type, cost in self.costs.items():
+            metrics[f"points/{unit_type.name}"] = cost
+        return metrics
+
+    def proposed_points(self, round_to: int = 5) -> Dict[UnitType, int]:
+        return {
+            unit_type: max(round_to, int(round(cost / round_to)) * round_to)
+            for unit_type, cost in self.costs.items()
+        }
+
+
+def proposed_constants_diff(points: Dict[UnitType, int]) -> str:
+    """A unified diff of game_constants.json that sets each unit's *_POINTS constant."""
+    path = get_resource_path("data/game_constants.json")
+    with open(path, encoding="utf-8") as f:
+        text = f.read()
+    new_text = text
+    for unit_type, value in points.items():
+        new_text = re.sub(
+            rf'("{unit_type.name}_POINTS"\s*:\s*)[0-9.]+',
+            lambda match: f"{match.group(1)}{value}",
+            new_text,
+        )
+    return "".join(difflib.unified_diff(
+        text.splitlines(keepends=True),
+        new_text.splitlines(keepends=True),
+        "a/data/game_constants.json",
+        "b/data/game_constants.json",
+    ))
+
+
+def run_point_calibration(
+    iterations: int = 10,
+    matches_per_iteration: int = 2000,
+    tolerance: float = 0.02,
+    round_to: int = 5,
+    diff_path: str = "plots/point_calibration.diff",
+    resume: bool = False,
+    checkpoint_path: str = "checkpoints/point_calibration.pkl.gz",
+    **calibration_kwargs,
+):
+    """
+    Run point calibration until the costs converge or the iterations run out.
+
+    Args:
+        iterations: The maximum number of iterations
+        matches_per_iteration: Matches between new random armies played each iteration
+        tolerance: Stop once no cost changes by more than this fraction in an iteration
+        round_to: Proposed points are rounded to a multiple of this
+        diff_path: Where to write the proposed diff of game_constants.json
+        resume: Continue from the checkpoint at checkpoint_path
+        checkpoint_path: Where checkpoints are written after every iteration
+        calibration_kwargs: Passed to PointCalibration when not resuming
+    """
+    if resume:
+        calibration = load_checkpoint(checkpoint_path)["calibration"]
+        print(f"Resumed from {checkpoint_path} after iteration {len(calibration.history)}")
+    else:
+        calibration = PointCalibration(**calibration_kwargs)
+    metrics_log = MetricsLog("plots/point_calibration.csv", resume=resume)
+    plot_renderer = PlotRenderer("plots/point_calibration.csv", "plots/point_calibration.html")
+    startup_profiler.finish("point_calibration")
+    try:
+        while len(calibration.history) < iterations:
+            diagnostics = calibration.iterate(matches_per_iteration)
+            print(diagnostics)
+            metrics_log.append(diagnostics.iteration, calibration.metrics())
+            plot_renderer.maybe_render()
+            save_checkpoint(checkpoint_path, {"calibration": calibration})
+            if diagnostics.max_relative_change < tolerance:
+                print("Converged")
+                break
+    finally:
+        cleanup_process_pool()
+        plot_renderer.close()
+
+    proposed = calibration.proposed_points(round_to)
+    print(f"\n{'Unit Type':<35} {'Current':>8} {'Proposed':>9} {'Std Err':>8}")
+    for unit_type in sorted(proposed, key=lambda unit_type: proposed[unit_type] / unit_values[unit_type]):
+        print(
+            f"{unit_type.name:<35} {unit_values[unit_type]:>8} {proposed[unit_type]:>9} "
+            f"{calibration.standard_errors[unit_type]:>8.1f}"
+        )
+    diff = proposed_constants_diff(proposed)
+    directory = os.path.dirname(diff_path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    with open(diff_path, "w", encoding="utf-8") as f:
+        f.write(diff)
+    print(f"\nWrote the proposed changes to {diff_path}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Estimate fair unit point values from simulated matches")
+    parser.add_argument("--iterations", type=int, default=10)
+    parser.add_argument("--matches_per_iteration", type=int, default=2000)
+    parser.add_argument("--army_points", type=float, default=1000)
+    parser.add_argument("--max_duration", type=float, default=120.0)
+    parser.add_argument("--units", nargs="*", default=None, help="Unit types to calibrate, all allowed unit types by default")
+    parser.add_argument("--diff_path", default="plots/point_calibration.diff")
+    add_checkpoint_arguments(parser, default_path="checkpoints/point_calibration.pkl.gz")
+    add_farm_arguments(parser)
+    parser.add_argument(startup_profiler.PROFILE_STARTUP_FLAG, action="store_true", default=False)
+    args = parser.parse_args()
+    use_evaluation_farm(start_farm_from_args(args))
+    run_point_calibration(
+        iterations=args.iterations,
+        matches_per_iteration=args.matches_per_iteration,
+        diff_path=args.diff_path,
+        resume=args.resume,
+        checkpoint_path=args.checkpoint_path,
+        unit_types=[UnitType[name] for name in args.units] if args.units else None,
+        army_points=args.army_points,
+        max_duration=args.max_duration,
+    )
+
+
+if __name__ == "__main__":
+    # Pickled jobs have to name this module rather than __main__ for farm workers to load them
+    from point_calibration import main
+    main()
@@ -15,7 +15,6 @@ from components.unusable_corpse import UnusableCorpse
 from effects import PlaySound, SoundEffect
 from entities.units import create_unit
 from events import DEATH, PLAY_SOUND, DeathEvent, emit_event
-from progress_manager import progress_manager
 from unit_condition import Infected
 from voice import play_death
 from components.summoned import SummonedBy
@@ -19,6 +19,7 @@ from point_values import unit_values, item_values, spell_values, get_unit_point_
 from hex_grid import hex_neighbors
 from game_constants import gc
 import random
+import startup_profiler
 
 # Current version of the progress manager
 # Increment this when making breaking changes to save file format
@@ -133,7 +134,7 @@ def calculate_total_available_points() -> int:
     )
     points += sum(item_values[item_type] * count for item_type, count in progress_manager.acquired_items.items())
     points += sum(spell_values[spell_type] * count for spell_type, count in progress_manager.acquired_spells.items())
-    for battle in battles.get_battles():
+    for battle in battles.get_battles_view():
         if battle.hex_coords in progress_manager.solutions:
             solution = progress_manager.solutions[battle.hex_coords]
             # Enemy units
@@ -375,13 +376,13 @@ class ProgressManager(BaseModel):
 
     def should_show_congratulations(self) -> bool:
         return all(
-            battle.hex_coords in self.solutions for battle in battles.get_battles()
+            battle.hex_coords in self.solutions for battle in battles.get_battles_view()
             if not battle.is_test
         ) and not self.game_completed
     
     def should_show_corruption_congratulations(self) -> bool:
         return all(
-            battle.hex_coords in self.solutions and self.solutions[battle.hex_coords].solved_corrupted for battle in battles.get_battles()
+            battle.hex_coords in self.solutions and self.solutions[battle.hex_coords].solved_corrupted for battle in battles.get_battles_view()
             if not battle.is_test
         ) and not self.game_completed_corruption
     
@@ -817,6 +818,11 @@ def is_save_compatible(save_data: dict) -> bool:
 
 def load_progress() -> None:
     """Load the progress from the JSON file or create default progress if the file doesn't exist."""
+    with startup_profiler.section("validate progress.json", "validation"):
+        _load_progress()
+
+
+def _load_progress() -> None:
     global progress_manager
     progress_path = get_progress_path()
     
@@ -856,7 +862,7 @@ def reset_progress() -> None:
     progress_manager.solutions = {}
     progress_manager.unit_tiers = {}
     progress_manager.hex_states = {
-        hex_coords: HexLifecycleState.FOGGED for hex_coords in upgrade_hexes.get_upgrade_hexes() + [battle.hex_coords for battle in battles.get_battles() if not battle.is_test]
+        hex_coords: HexLifecycleState.FOGGED for hex_coords in upgrade_hexes.get_upgrade_hexes() + [battle.hex_coords for battle in battles.get_battles_view() if not battle.is_test]
     }
     for starting_hex in STARTING_HEXES:
         progress_manager.hex_states[starting_hex] = HexLifecycleState.UNCLAIMED
@@ -0,0 +1,131 @@
+"""Check that solutions still win when their units and spells are moved a little.
+
+Each solution is simulated as copies with every unit and spell moved by
+gaussian noise, clipped to the legal placement areas. Solutions that win less
+than --min_win_rate of the time are reported as fragile, and the exit code is
+1 if there are any, so this can be run before copying a solution into
+battles.json.
+
+Check the campaign's solutions in battles.json:
+
+    python src/robustness.py --copies 32 --noise_scale 10
+
+Or the best individuals of a battle_solver or balance_overview checkpoint:
+
+    python src/robustness.py --checkpoint checkpoints/balance_overview.pkl.gz
+"""
+
+import startup_profiler
+startup_profiler.enable_if_requested()
+
+import argparse
+import random
+import sys
+from typing import List, Optional, Tuple
+
+from auto_battle import BattleOutcome
+from battle_solver import Individual, _evaluate_all, cleanup_process_pool, evaluate_robustness, use_evaluation_farm
+from battles import get_battles_view
+from checkpoint import load_checkpoint
+from evaluation_farm import add_farm_arguments, start_farm_from_args
+from hex_grid import axial_to_world
+
+# A name for each solution, the solution, and whether it is simulated with the battle's corruption powers
+Solution = Tuple[str, Individual, bool]
+
+
+def campaign_solutions(battle_ids: Optional[List[str]] = None) -> List[Solution]:
+    """The best solution and best corrupted solution of each battle in battles.json."""
+    solutions = []
+    for battle in get_battles_view():
+        if battle_ids is not None and battle.id not in battle_ids:
+            continue
+        for name, solution, use_powers in [
+            (battle.id, battle.best_solution, False),
+            (f"{battle.id} (corrupted)", battle.best_corrupted_solution, True),
+        ]:
+            if solution is None:
+                continue
+            # Solutions are saved relative to the battle's hex, like its enemies
+            world_x, world_y = axial_to_world(*(battle.hex_coords or (0, 0)))
+            unit_placements = [
+                (unit_type, (x + world_x, y + world_y), items)
+                for unit_type, (x, y), items in solution
+            ]
+            solutions.append((name, Individual(battle.id, unit_placements), use_powers))
+    return solutions
+
+
+def checkpoint_solutions(path: str, battle_ids: Optional[List[str]] = None) -> List[Solution]:
+    """The best individual of each population in a battle_solver or balance_overview checkpoint."""
+    state = load_checkpoint(path)
+    if "battle_populations" in state:
+        populations = state["battle_populations"]
+    else:
+        population = state["population"]
+        populations = {population.individuals[0].battle_id: population}
+    return [
+        (battle_id, population.best_individuals[0], False)
+        for battle_id, population in populations.items()
+        if battle_ids is None or battle_id in battle_ids
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Check that solutions still win when their positions are jittered")
+    parser.add_argument("--checkpoint", default=None, help="Check the best individuals of this checkpoint instead of battles.json")
+    parser.add_argument("--battles", nargs="*", default=None, help="Battles to check, all by default")
+    parser.add_argument("--copies", type=int, default=32, help="Jittered copies of each solution to simulate")
+    parser.add_argument("--noise_scale", type=float, default=10.0, help="Standard deviation of the jitter, in pixels")
+    parser.add_argument("--min_win_rate", type=float, default=0.75, help="Solutions that win less often than this are fragile")
+    parser.add_argument("--max_duration", type=float, default=120.0)
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument(startup_profiler.PROFILE_STARTUP_FLAG, action="store_true", default=False)
+    add_farm_arguments(parser)
+    args = parser.parse_args()
+    use_evaluation_farm(start_farm_from_args(args))
+
+    if args.checkpoint is not None:
+        solutions = checkpoint_solutions(args.checkpoint, args.battles)
+    else:
+        solutions = campaign_solutions(args.battles)
+    # Loading a checkpoint restores the random state, so seed afterwards
+    if args.seed is not None:
+        random.seed(args.seed)
+    startup_profiler.finish("robustness")
+
+    try:
+        results = {}
+        for use_powers in (False, True):
+            group = [(name, individual) for name, individual, powers in solutions if powers == use_powers]
+            if not group:
+                continue
+            individuals = [individual for _, individual in group]
+            nominal = _evaluate_all(individuals, args.max_duration, use_powers)
+            robustness = evaluate_robustness(individuals, args.copies, args.noise_scale, args.max_duration, use_powers)
+            for (name, _), fitness, solution_robustness in zip(group, nominal, robustness):
+                results[name] = (fitness, solution_robustness)
+    finally:
+        cleanup_process_pool()
+
+    print(f"\n{'Solution':<45} {'Outcome':<15} {'Win rate':>8} {'95% CI':>12}")
+    fragile = []
+    for name, _, _ in solutions:
+        fitness, solution_robustness = results[name]
+        low, high = solution_robustness.confidence_interval()
+        is_fragile = fitness.outcome != BattleOutcome.TEAM1_VICTORY or solution_robustness.win_rate < args.min_win_rate
+        if is_fragile:
+            fragile.append(name)
+        print(
+            f"{name:<45} {fitness.outcome.name:<15} {solution_robustness.win_rate:>8.2f} {f'{low:.2f}-{high:.2f}':>12}"
+            f"{'  FRAGILE' if is_fragile else ''}"
+        )
+    if fragile:
+        print(f"\n{len(fragile)} of {len(solutions)} solutions don't win reliably", file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    # Pickled jobs have to name this module rather than __main__ for farm workers to load them
+    from robustness import main
+    main()
@@ -7,7 +7,7 @@ import pygame
 import pygame_gui
 import esper
 
-from battles import get_battles
+from battles import get_battles_view
 from components.hitbox import Hitbox
 from components.position import Position
 from components.team import Team, TeamType
@@ -679,7 +679,7 @@ class CampaignScene(Scene):
 
         # Draw circles around units if there is a selected unit type
         if selected_unit_manager.selected_unit_type is not None:
-            for battle in get_battles():
+            for battle in get_battles_view():
                 hex_state = progress_manager.get_hex_state(battle.hex_coords)
                 if battle.hex_coords is not None and hex_state is not None and hex_state != HexLifecycleState.FOGGED:
                     with use_world(battle.id):
@@ -692,7 +692,7 @@ class CampaignScene(Scene):
         
         # Draw circles around units equipped with the selected item
         if selected_unit_manager.selected_item_type is not None:
-            for battle in get_battles():
+            for battle in get_battles_view():
                 hex_state = progress_manager.get_hex_state(battle.hex_coords)
                 if battle.hex_coords is not None and hex_state is not None and hex_state != HexLifecycleState.FOGGED:
                     with use_world(battle.id):
@@ -5,7 +5,7 @@ from typing import List, Tuple, Optional
 import pygame
 import pygame_gui
 
-from battles import get_battles, update_battle, Battle
+from battles import get_battles_view, update_battle, Battle
 import battles
 from events import CHANGE_MUSIC, ChangeMusicEvent, emit_event
 from progress_manager import HexLifecycleState, progress_manager
@@ -58,7 +58,7 @@ class CampaignEditorScene(Scene):
         """Get the count of unique unit types across all battles."""
         unique_unit_types = set()
 
-        for battle in get_battles():
+        for battle in get_battles_view():
             # Count enemy unit types
             for unit_type, _, _ in battle.enemies:
                 unique_unit_types.add(unit_type)
@@ -297,7 +297,7 @@ class CampaignEditorScene(Scene):
                         if self.selected_hex is not None:
                             # Add the upgrade hex and rebuild the view
                             upgrade_hexes.add_upgrade_hex(self.selected_hex)
-                            self.world_map_view.rebuild(get_battles())
+                            self.world_map_view.rebuild(get_battles_view())
                             self.selected_hex = None
                             self.create_context_buttons()
                             self.create_statistics_display()
@@ -323,7 +323,7 @@ class CampaignEditorScene(Scene):
                                 progress_manager.clear_hex_state(battle.hex_coords)
                             battles.delete_battle(battle.id)
                             self.selected_hex = None
-                            self.world_map_view.rebuild(get_battles())
+                            self.world_map_view.rebuild(get_battles_view())
                             self.create_context_buttons()
                             self.create_statistics_display()
                     elif event.ui_element == self.context_buttons.get("corruption"):
@@ -337,13 +337,13 @@ class CampaignEditorScene(Scene):
                                 # Add corruption
                                 self.corrupted_hexes.append(battle.hex_coords)
                             self.create_context_buttons()
-                            self.world_map_view.rebuild(get_battles())
+                            self.world_map_view.rebuild(get_battles_view())
                     elif event.ui_element == self.context_buttons.get("delete_upgrade"):
                         # Delete the selected upgrade hex
                         if self.selected_hex is not None and upgrade_hexes.is_upgrade_hex(self.selected_hex):
                             upgrade_hexes.remove_upgrade_hex(self.selected_hex)
                             self.selected_hex = None
-                            self.world_map_view.rebuild(get_battles())
+                            self.world_map_view.rebuild(get_battles_view())
                             self.create_context_buttons()
                             self.create_statistics_display()
                     # Handle save battle dialog events
@@ -379,14 +379,14 @@ class CampaignEditorScene(Scene):
                             
                             self.save_battle_dialog.kill()
                             delattr(self, 'save_battle_dialog')
-                            self.world_map_view.rebuild(get_battles())
+                            self.world_map_view.rebuild(get_battles_view())
                             self.create_context_buttons()
                             self.create_statistics_display()
                         elif event.ui_element == self.save_battle_dialog.save_test_button:
                             self.save_battle_dialog.save_battle(is_test=True)
                             self.save_battle_dialog.kill()
                             delattr(self, 'save_battle_dialog')
-                            self.world_map_view.rebuild(get_battles())
+                            self.world_map_view.rebuild(get_battles_view())
                             self.create_context_buttons()
                             self.create_statistics_display()
                         elif event.ui_element == self.save_battle_dialog.cancel_button:
@@ -415,7 +415,7 @@ class CampaignEditorScene(Scene):
                             if progress_manager.get_hex_state(clicked_hex) is None:
                                 progress_manager.set_hex_state(clicked_hex, HexLifecycleState.UNCLAIMED)
                         
-                        self.world_map_view.rebuild(get_battles())
+                        self.world_map_view.rebuild(get_battles_view())
                         self.selected_hex = None
                         self.move_target_hex = None
                         self.create_context_buttons()
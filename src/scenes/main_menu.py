@@ -7,8 +7,34 @@ from scenes.scene import Scene
 from events import CHANGE_MUSIC, ChangeMusicEvent, emit_event, PLAY_SOUND, PlaySoundEvent
 from scenes.events import SettingsSceneEvent, SetupBattleSceneEvent, CampaignSceneEvent, DeveloperToolsSceneEvent
 from world_map_view import WorldMapView
-from progress_manager import progress_manager, reset_progress, has_incompatible_save
+from progress_manager import HexLifecycleState, progress_manager, reset_progress, has_incompatible_save
 from game_constants import gc
+from asset_loader import prefetch
+from battles import get_battles_view
+from entities.units import Faction, prefetch_faction_assets
+from entities.items import item_icon_surfaces
+from entities.spells import spell_icon_surfaces
+
+
+def prefetch_campaign_assets() -> None:
+    """Prefetch the assets for the visible campaign map and the barracks."""
+    factions = set()
+    for battle in get_battles_view():
+        if battle.is_test or battle.hex_coords is None:
+            continue
+        hex_state = progress_manager.get_hex_state(battle.hex_coords)
+        if hex_state is None or hex_state == HexLifecycleState.FOGGED:
+            continue
+        for unit_type, _, _ in battle.enemies:
+            factions.add(Faction.faction_of(unit_type))
+    for unit_type, count in progress_manager.available_units(None).items():
+        if count > 0:
+            factions.add(Faction.faction_of(unit_type))
+    prefetch_faction_assets(sorted(factions, key=lambda faction: faction.value))
+    prefetch(item_icon_surfaces, progress_manager.acquired_items.keys())
+    prefetch(spell_icon_surfaces, progress_manager.acquired_spells.keys())
+
+
 class MainMenuScene(Scene):
     """Main menu scene with primary navigation options for the game."""
 
@@ -21,6 +47,7 @@ class MainMenuScene(Scene):
         self.developer_mode = developer_mode
         self.confirmation_dialog: Optional[pygame_gui.windows.UIConfirmationDialog] = None
         self.create_buttons(developer_mode)
+        prefetch_campaign_assets()
         
         # Check for incompatible save file
         if has_incompatible_save():
@@ -0,0 +1,243 @@
+"""Startup instrumentation for the game and solver entry points.
+
+When enabled, this records how long every module import takes, along with named
+sections such as data validation, asset loading and scene initialization. At the
+end of startup it prints a ranked report and writes a trace file that can be
+opened in chrome://tracing or https://ui.perfetto.dev.
+
+Enable it by setting the BATTLESWAP_PROFILE_STARTUP environment variable or by
+passing --profile_startup to an entry point. Entry points must import this
+module before anything else so that their imports are timed. Only the main
+process is profiled; pool and farm worker processes import the same entry
+points, and inherit the environment, but shouldn't each write a report.
+"""
+
+import atexit
+import contextlib
+import importlib.abc
+import json
+import multiprocessing
+import os
+import sys
+import threading
+import time
+from dataclasses import dataclass
+from typing import ContextManager, Dict, List, Optional
+
+PROFILE_STARTUP_ENV_VAR = "BATTLESWAP_PROFILE_STARTUP"
+PROFILE_STARTUP_FLAG = "--profile_startup"
+
+
+@dataclass
+class TimedEvent:
+    """A timed span of startup work."""
+    name: str
+    category: str
+    start: float
+    duration: float
+    thread_id: int
+    self_duration: Optional[float] = None
+
+
+class _TimedLoader(importlib.abc.Loader):
+    """Wraps a module loader to time how long executing the module takes."""
+
+    def __init__(self, loader: importlib.abc.Loader, profiler: "StartupProfiler"):
+        self._loader = loader
+        self._profiler = profiler
+
+    def __getattr__(self, name: str):
+        return getattr(self._loader, name)
+
+    def create_module(self, spec):
+        return self._loader.create_module(spec)
+
+    def exec_module(self, module) -> None:
+        self._profiler._start_import(module.__name__)
+        try:
+            self._loader.exec_module(module)
+        finally:
+            self._profiler._end_import()
+
+
+class _ImportTimingFinder(importlib.abc.MetaPathFinder):
+    """Meta path finder that wraps the loaders found by the other finders."""
+
+    def __init__(self, profiler: "StartupProfiler"):
+        self._profiler = profiler
+
+    def find_spec(self, fullname, path, target=None):
+        for finder in sys.meta_path:
+            if finder is self or not hasattr(finder, "find_spec"):
+                continue
+            spec = finder.find_spec(fullname, path, target)
+            if spec is None:
+                continue
+            # Builtin and frozen importers are shared classes, not per-module loaders
+            if spec.loader is not None and hasattr(spec.loader, "exec_module") and not isinstance(spec.loader, type):
+                spec.loader = _TimedLoader(spec.loader, self._profiler)
+            return spec
+        return None
+
+
+class StartupProfiler:
+    """Records import times and named sections during startup."""
+
+    def __init__(self):
+        self.events: List[TimedEvent] = []
+        self.origin = time.perf_counter()
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._finder = _ImportTimingFinder(self)
+
+    def install(self) -> None:
+        """Start timing module imports."""
+        if self._finder not in sys.meta_path:
+            sys.meta_path.insert(0, self._finder)
+
+    def uninstall(self) -> None:
+        """Stop timing module imports."""
+        if self._finder in sys.meta_path:
+            sys.meta_path.remove(self._finder)
+
+    def _import_stack(self) -> List[List]:
+        if not hasattr(self._local, "import_stack"):
+            self._local.import_stack = []
+        return self._local.import_stack
+
+    def _start_import(self, name: str) -> None:
+        # [name, start, time spent in nested imports]
+        self._import_stack().append([name, time.perf_counter(), 0.0])
+
+    def _end_import(self) -> None:
+        import_stack = self._import_stack()
+        name, start, child_duration = import_stack.pop()
+        duration = time.perf_counter() - start
+        if import_stack:
+            import_stack[-1][2] += duration
+        self._record(TimedEvent(
+            name=name,
+            category="import",
+            start=start - self.origin,
+            duration=duration,
+            thread_id=threading.get_ident(),
+            self_duration=duration - child_duration,
+        ))
+
+    def _record(self, event: TimedEvent) -> None:
+        with self._lock:
+            self.events.append(event)
+
+    @contextlib.contextmanager
+    def section(self, name: str, category: str = "section"):
+        """Time a named block of startup work."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self._record(TimedEvent(
+                name=name,
+                category=category,
+                start=start - self.origin,
+                duration=time.perf_counter() - start,
+                thread_id=threading.get_ident(),
+            ))
+
+    def report(self, top_n: int = 30) -> str:
+        """Create a ranked, human readable report of the recorded events."""
+        with self._lock:
+            events = list(self.events)
+        imports = [event for event in events if event.category == "import"]
+        lines = [f"Startup profile ({time.perf_counter() - self.origin:.3f}s since profiling began)"]
+
+        lines.append(f"\nSlowest imports by self time (top {top_n} of {len(imports)}):")
+        lines.append(f"{'Self (ms)':>10} {'Total (ms)':>11}  Module")
+        for event in sorted(imports, key=lambda e: e.self_duration, reverse=True)[:top_n]:
+            lines.append(f"{event.self_duration * 1000:>10.1f} {event.duration * 1000:>11.1f}  {event.name}")
+
+        totals: Dict[str, List[float]] = {}
+        for event in events:
+            if event.category == "import":
+                continue
+            key = f"[{event.category}] {event.name}"
+            total = totals.setdefault(key, [0.0, 0])
+            total[0] += event.duration
+            total[1] += 1
+        lines.append("\nSections by total time:")
+        lines.append(f"{'Total (ms)':>10} {'Calls':>6}  Section")
+        for key, (duration, count) in sorted(totals.items(), key=lambda item: item[1][0], reverse=True):
+            lines.append(f"{duration * 1000:>10.1f} {count:>6}  {key}")
+        return "\n".join(lines)
+
+    def write_trace(self, path: str) -> None:
+        """Write the recorded events in the Chrome trace event format."""
+        with self._lock:
+            events = list(self.events)
+        trace_events = [
+            {
+                "name": event.name,
+                "cat": event.category,
+                "ph": "X",
+                "ts": event.start * 1e6,
+                "dur": event.duration * 1e6,
+                "pid": os.getpid(),
+                "tid": event.thread_id,
+            }
+            for event in events
+        ]
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump({"traceEvents": trace_events}, f)
+
+
+_profiler: Optional[StartupProfiler] = None
+_finished = False
+
+
+def enable() -> None:
+    """Start recording startup events."""
+    global _profiler
+    if _profiler is None:
+        _profiler = StartupProfiler()
+        _profiler.install()
+        atexit.register(finish)
+
+
+def enable_if_requested() -> None:
+    """Enable profiling if requested by the environment or the command line, in the main process only."""
+    if multiprocessing.parent_process() is not None:
+        return
+    if os.environ.pop(PROFILE_STARTUP_ENV_VAR, None) or PROFILE_STARTUP_FLAG in sys.argv:
+        enable()
+
+
+def is_enabled() -> bool:
+    """Check whether startup profiling is enabled."""
+    return _profiler is not None
+
+
+def section(name: str, category: str = "section") -> ContextManager:
+    """Time a named block of work if profiling is enabled."""
+    if _profiler is None or _finished:
+        return contextlib.nullcontext()
+    return _profiler.section(name, category)
+
+
+def finish(label: Optional[str] = None) -> None:
+    """Stop profiling, print the report and write the trace file.
+
+    Does nothing if profiling isn't enabled or has already finished.
+    """
+    global _finished
+    if _profiler is None or _finished:
+        return
+    _finished = True
+    _profiler.uninstall()
+    if label is None:
+        label = os.path.splitext(os.path.basename(sys.argv[0]))[0] or "startup"
+    trace_path = os.path.join("profiles", f"startup_{label}.json")
+    print(_profiler.report())
+    _profiler.write_trace(trace_path)
+    print(f"\nWrote startup trace to {trace_path}")
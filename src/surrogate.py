@@ -0,0 +1,227 @@
+"""An online surrogate model that predicts an army's fitness without simulating it.
+
+Each army is described by a fixed length feature vector (see
+placement_features): the counts of each unit, item and spell type on both
+sides, both sides' points, and statistics of where the army's units and
+spells are relative to the enemies. SurrogateModel is a small NumPy MLP that
+is trained on the features and fitnesses of armies as they are simulated, so
+it can rank new armies before deciding which of them are worth simulating.
+"""
+
+from typing import Any, Callable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from components.item import ItemType
+from components.spell_type import SpellType
+from components.unit_type import UnitType
+from point_values import item_values, spell_values, unit_values
+
+UnitPlacements = Sequence[Tuple[UnitType, Tuple[float, float], List[ItemType]]]
+SpellPlacements = Sequence[Tuple[SpellType, Tuple[float, float], int]]
+
+_UNIT_TYPES = list(UnitType)
+_ITEM_TYPES = list(ItemType)
+_SPELL_TYPES = list(SpellType)
+_UNIT_INDEX = {unit_type: i for i, unit_type in enumerate(_UNIT_TYPES)}
+_ITEM_INDEX = {item_type: i for i, item_type in enumerate(_ITEM_TYPES)}
+_SPELL_INDEX = {spell_type: i for i, spell_type in enumerate(_SPELL_TYPES)}
+# Distances and points are divided by these so the features are around 1
+DISTANCE_SCALE = 100.0
+POINTS_SCALE = 1000.0
+NUM_POSITION_FEATURES = 9
+
+
+def _position_features(
+    positions: np.ndarray,
+    spell_positions: np.ndarray,
+    enemy_positions: np.ndarray,
+) -> np.ndarray:
+    features = np.zeros(NUM_POSITION_FEATURES)
+    if len(positions) == 0 or len(enemy_positions) == 0:
+        return features
+    enemy_centroid = enemy_positions.mean(axis=0)
+    offset = (positions.mean(axis=0) - enemy_centroid) / DISTANCE_SCALE
+    nearest_enemy = np.sqrt(
+        ((positions[:, None, :] - enemy_positions[None, :, :]) ** 2).sum(axis=2)
+    ).min(axis=1) / DISTANCE_SCALE
+    features[0:2] = offset
+    features[2] = np.hypot(*offset)
+    features[3:5] = positions.std(axis=0) / DISTANCE_SCALE
+    features[5] = nearest_enemy.mean()
+    features[6] = nearest_enemy.min()
+    if len(spell_positions):
+        spell_offsets = (spell_positions - enemy_centroid) / DISTANCE_SCALE
+        features[7] = np.hypot(spell_offsets[:, 0], spell_offsets[:, 1]).mean()
+    features[8] = enemy_positions.std(axis=0).mean() / DISTANCE_SCALE
+    return features
+
+
+def placement_features(
+    unit_placements: UnitPlacements,
+    spell_placements: SpellPlacements,
+    enemy_placements: UnitPlacements,
+) -> np.ndarray:
+    """Describe an army and the enemies it is placed against, in world coordinates."""
+    unit_counts = np.zeros(len(_UNIT_TYPES))
+    item_counts = np.zeros(len(_ITEM_TYPES))
+    spell_counts = np.zeros(len(_SPELL_TYPES))
+    enemy_unit_counts = np.zeros(len(_UNIT_TYPES))
+    points = 0.0
+    for unit_type, _, items in unit_placements:
+        unit_counts[_UNIT_INDEX[unit_type]] += 1
+        points += unit_values[unit_type]
+        for item_type in items:
+            item_counts[_ITEM_INDEX[item_type]] += 1
+            points += item_values[item_type]
+    for spell_type, _, _ in spell_placements:
+        spell_counts[_SPELL_INDEX[spell_type]] += 1
+        points += spell_values[spell_type]
+    enemy_points = 0.0
+    for unit_type, _, items in enemy_placements:
+        enemy_unit_counts[_UNIT_INDEX[unit_type]] += 1
+        enemy_points += unit_values[unit_type] + sum(item_values[item_type] for item_type in items)
+    position_features = _position_features(
+        np.array([position for _, position, _ in unit_placements], dtype=float).reshape(-1, 2),
+        np.array([position for _, position, _ in spell_placements], dtype=float).reshape(-1, 2),
+        np.array([position for _, position, _ in enemy_placements], dtype=float).reshape(-1, 2),
+    )
+    return np.concatenate([
+        unit_counts,
+        item_counts,
+        spell_counts,
+        enemy_unit_counts,
+        [points / POINTS_SCALE, enemy_points / POINTS_SCALE],
+        position_features,
+    ])
+
+
+def _ranks(keys: Sequence[Any]) -> np.ndarray:
+    """Ranks starting at 0, with tied keys sharing their average rank."""
+    order = sorted(range(len(keys)), key=keys.__getitem__)
+    ranks = np.empty(len(keys))
+    start = 0
+    while start < len(order):
+        end = start
+        while end + 1 < len(order) and keys[order[end + 1]] == keys[order[start]]:
+            end += 1
+        ranks[order[start:end + 1]] = (start + end) / 2
+        start = end + 1
+    return ranks
+
+
+def rank_correlation(a: Sequence[Any], b: Sequence[Any], key: Optional[Callable[[Any], Any]] = None) -> float:
+    """Spearman rank correlation between two lists of scores for the same items.
+
+    Scores are compared directly, or by key(score) if key is given. Tied
+    scores share their average rank.
+    """
+    if len(a) < 2:
+        return float("nan")
+    if key is not None:
+        a, b = [key(x) for x in a], [key(x) for x in b]
+    ranks_a, ranks_b = _ranks(a), _ranks(b)
+    if ranks_a.std() == 0 or ranks_b.std() == 0:
+        return float("nan")
+    return float(np.corrcoef(ranks_a, ranks_b)[0, 1])
+
+
+class SurrogateModel:
+    """A one hidden layer MLP regressor trained online with Adam.
+
+    Only the most recent max_samples samples are kept, so the model follows the
+    population as it moves and as the game constants change. Features and
+    targets are standardized with the statistics of the kept samples each time
+    the model is fit.
+    """
+
+    def __init__(
+        self,
+        hidden_size: int = 32,
+        learning_rate: float = 1e-3,
+        epochs: int = 5,
+        batch_size: int = 64,
+        max_samples: int = 5000,
+        seed: int = 0,
+    ):
+        self.hidden_size = hidden_size
+        self.learning_rate = learning_rate
+        self.epochs = epochs
+        self.batch_size = batch_size
+        self.max_samples = max_samples
+        self._rng = np.random.default_rng(seed)
+        self._features: Optional[np.ndarray] = None
+        self._targets: Optional[np.ndarray] = None
+        self._params: Optional[List[np.ndarray]] = None
+        self._moments: List[Tuple[np.ndarray, np.ndarray]] = []
+        self._steps = 0
+        self._feature_mean = self._feature_std = None
+        self._target_mean, self._target_std = 0.0, 1.0
+
+    @property
+    def num_samples(self) -> int:
+        return 0 if self._targets is None else len(self._targets)
+
+    @property
+    def is_trained(self) -> bool:
+        return self._params is not None
+
+    def add(self, features: np.ndarray, targets: np.ndarray) -> None:
+        """Add samples, forgetting the oldest beyond max_samples."""
+        if self._features is None:
+            self._features, self._targets = features, targets
+        else:
+            self._features = np.concatenate([self._features, features])[-self.max_samples:]
+            self._targets = np.concatenate([self._targets, targets])[-self.max_samples:]
+
+    def _init_params(self, num_features: int) -> None:
+        self._params = [
+            self._rng.normal(0, 1 / np.sqrt(num_features), (num_features, self.hidden_size)),
+            np.zeros(self.hidden_size),
+            self._rng.normal(0, 1 / np.sqrt(self.hidden_size), self.hidden_size),
+            np.zeros(1),
+        ]
+        self._moments = [(np.zeros_like(p), np.zeros_like(p)) for p in self._params]
+        self._steps = 0
+
+    def _forward(self, x: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        w1, b1, w2, b2 = self._params
+        hidden = np.tanh(x @ w1 + b1)
+        return hidden, hidden @ w2 + b2
+
+    def fit(self) -> None:
+        """Continue training on the kept samples for a few epochs."""
+        if self.num_samples == 0:
+            return
+        if self._params is None or self._params[0].shape[0] != self._features.shape[1]:
+            self._init_params(self._features.shape[1])
+        self._feature_mean = self._features.mean(axis=0)
+        self._feature_std = self._features.std(axis=0) + 1e-6
+        self._target_mean = float(self._targets.mean())
+        self._target_std = float(self._targets.std()) + 1e-6
+        x = (self._features - self._feature_mean) / self._feature_std
+        y = (self._targets - self._target_mean) / self._target_std
+        beta1, beta2 = 0.9, 0.999
+        for _ in range(self.epochs):
+            order = self._rng.permutation(len(y))
+            for start in range(0, len(y), self.batch_size):
+                batch = order[start:start + self.batch_size]
+                hidden, prediction = self._forward(x[batch])
+                error = (prediction - y[batch]) / len(batch)
+                w2 = self._params[2]
+                hidden_error = np.outer(error, w2) * (1 - hidden ** 2)
+                gradients = [x[batch].T @ hidden_error, hidden_error.sum(axis=0), hidden.T @ error, np.array([error.sum()])]
+                self._steps += 1
+                for i, (param, gradient) in enumerate(zip(self._params, gradients)):
+                    m, v = self._moments[i]
+                    m[:] = beta1 * m + (1 - beta1) * gradient
+                    v[:] = beta2 * v + (1 - beta2) * gradient ** 2
+                    m_hat = m / (1 - beta1 ** self._steps)
+                    v_hat = v / (1 - beta2 ** self._steps)
+                    param -= self.learning_rate * m_hat / (np.sqrt(v_hat) + 1e-8)
+
+    def predict(self, features: np.ndarray) -> np.ndarray:
+        """Predict the targets of samples, which must only be called once the model is trained."""
+        x = (features - self._feature_mean) / self._feature_std
+        _, prediction = self._forward(x)
+        return prediction * self._target_std + self._target_mean
@@ -0,0 +1,177 @@
+"""Swiss tournaments between armies, used to rate them in army_evolution.
+
+Armies are placed on team 1's side of an arena hex. A match plays both sides:
+army A against army B mirrored onto team 2's side, then B against A mirrored,
+in a single job so that neither army is favored by its side of the map.
+
+Each round pairs the players with the fewest matches first, each with the
+closest rated player that it hasn't played yet, so new armies are rated
+quickly and every match is informative. Results are reported to a callback as
+soon as each match finishes so ratings are updated while the round is still
+running, and they are cached by the canonical pair of armies so rematches
+aren't simulated again. A cached result is only reused while the game
+constants that both armies depend on are unchanged.
+"""
+
+from typing import Callable, Dict, List, Optional, Protocol, Tuple
+
+from auto_battle import BattleOutcome, simulate_battle_with_dependencies
+from battle_solver import Individual, PoolJobs, get_constants
+from components.team import TeamType
+from constant_dependencies import ConstantsSnapshot, placement_dependencies
+from hex_grid import axial_to_world
+
+# Armies are placed on team 1's side of this battle's hex. Its enemies aren't used.
+ARENA_BATTLE_ID = "Soldiers"
+
+
+class Player(Protocol):
+    """An army with a rating. Individuals with these attributes can play."""
+    elo: float
+    matches_played: int
+    canonical_genome: bytes
+    unit_placements: List[Tuple]
+    spell_placements: List[Tuple]
+
+
+# Called with (team 1 player, team 2 player, outcome) for every game of a match
+GameCallback = Callable[[Player, Player, BattleOutcome], None]
+
+
+def mirror_placements(
+    unit_placements: List[Tuple],
+    spell_placements: List[Tuple],
+    center_x: float,
+) -> Tuple[List[Tuple], List[Tuple]]:
+    """Mirror placements across a vertical line onto the other team's side."""
+    mirrored_units = [
+        (unit_type, (2 * center_x - x, y), items)
+        for unit_type, (x, y), items in unit_placements
+    ]
+    mirrored_spells = [
+        (spell_type, (2 * center_x - x, y), TeamType(team).other().value)
+        for spell_type, (x, y), team in spell_placements
+    ]
+    return mirrored_units, mirrored_spells
+
+
+def _simulate_game(team1: Individual, team2: Individual, hex_coords: Tuple[int, int], max_duration: float) -> BattleOutcome:
+    center_x, _ = axial_to_world(*hex_coords)
+    enemy_units, enemy_spells = mirror_placements(team2.unit_placements, team2.spell_placements, center_x)
+    return simulate_battle_with_dependencies(
+        ally_placements=team1.unit_placements,
+        enemy_placements=enemy_units,
+        max_duration=max_duration,
+        hex_coords=hex_coords,
+        spell_placements=team1.spell_placements + enemy_spells,
+    )
+
+
+def _play_both_sides(
+    army_a: Individual,
+    army_b: Individual,
+    hex_coords: Tuple[int, int],
+    max_duration: float,
+) -> Tuple[BattleOutcome, BattleOutcome]:
+    """Play A as team 1 against B, then B as team 1 against A."""
+    return (
+        _simulate_game(army_a, army_b, hex_coords, max_duration),
+        _simulate_game(army_b, army_a, hex_coords, max_duration),
+    )
+
+
+class SwissTournament:
+    """Pairs armies by rating and plays their matches on the process pool."""
+
+    def __init__(self, hex_coords: Tuple[int, int], max_duration: float = 120.0):
+        self.hex_coords = hex_coords
+        self.max_duration = max_duration
+        # The constants hash and outcomes of both games, keyed by the pair of canonical genomes in sorted order
+        self._results: Dict[Tuple[bytes, bytes], Tuple[str, Tuple[BattleOutcome, BattleOutcome]]] = {}
+        self._constants: Optional[ConstantsSnapshot] = None
+        self.num_simulated = 0
+        self.num_cached = 0
+
+    def _pair_key(self, player_a: Player, player_b: Player) -> Tuple[bytes, bytes]:
+        return tuple(sorted((player_a.canonical_genome, player_b.canonical_genome)))
+
+    def _constants_hash(self, player_a: Player, player_b: Player) -> str:
+        return self._constants.hash_for(
+            placement_dependencies(player_a.unit_placements, player_a.spell_placements)
+            | placement_dependencies(player_b.unit_placements, player_b.spell_placements)
+        )
+
+    def _get_result(self, player_a: Player, player_b: Player) -> Optional[Tuple[BattleOutcome, BattleOutcome]]:
+        """Get the cached outcomes of A as team 1 and B as team 1."""
+        cached = self._results.get(self._pair_key(player_a, player_b))
+        if cached is None:
+            return None
+        constants_hash, result = cached
+        if constants_hash != self._constants_hash(player_a, player_b):
+            return None
+        if player_a.canonical_genome <= player_b.canonical_genome:
+            return result
+        return result[1], result[0]
+
+    def _store_result(self, player_a: Player, player_b: Player, result: Tuple[BattleOutcome, BattleOutcome]) -> None:
+        if player_a.canonical_genome > player_b.canonical_genome:
+            result = (result[1], result[0])
+        self._results[self._pair_key(player_a, player_b)] = (self._constants_hash(player_a, player_b), result)
+
+    def pair(self, players: List[Player], max_matches: int) -> List[Tuple[Player, Player]]:
+        """Create one Swiss round of at most max_matches matches.
+
+        Players with the fewest matches are paired first, each with the
+        closest rated unpaired player it hasn't played. A rematch is only
+        allowed when a player has played everyone that is left.
+        """
+        unpaired = list(players)
+        pairs = []
+        for player in sorted(players, key=lambda p: p.matches_played):
+            if len(pairs) >= max_matches:
+                break
+            if not any(p is player for p in unpaired):
+                continue
+            candidates = [p for p in unpaired if p is not player]
+            if not candidates:
+                break
+            new_opponents = [p for p in candidates if self._get_result(player, p) is None]
+            opponent = min(new_opponents or candidates, key=lambda p: abs(p.elo - player.elo))
+            pairs.append((player, opponent))
+            unpaired = [p for p in unpaired if p is not player and p is not opponent]
+        return pairs
+
+    def _report(self, player_a: Player, player_b: Player, result: Tuple[BattleOutcome, BattleOutcome], on_game: GameCallback) -> None:
+        on_game(player_a, player_b, result[0])
+        on_game(player_b, player_a, result[1])
+
+    def play_round(self, pairs: List[Tuple[Player, Player]], on_game: GameCallback) -> None:
+        """Play the matches of a round, reporting each game as its match finishes."""
+        pool_jobs = PoolJobs()
+        for i, (player_a, player_b) in enumerate(pairs):
+            result = self._get_result(player_a, player_b)
+            if result is not None:
+                self.num_cached += 1
+                self._report(player_a, player_b, result, on_game)
+                continue
+            pool_jobs.submit(i, _play_both_sides, (player_a, player_b, self.hex_coords, self.max_duration))
+        while len(pool_jobs):
+            i, result = pool_jobs.get()
+            player_a, player_b = pairs[i]
+            self.num_simulated += 1
+            self._store_result(player_a, player_b, result)
+            self._report(player_a, player_b, result, on_game)
+
+    def play(self, players: List[Player], num_matches: int, on_game: GameCallback) -> None:
+        """Play Swiss rounds until num_matches matches have been played."""
+        self._constants = get_constants()
+        remaining = num_matches
+        while remaining > 0:
+            pairs = self.pair(players, remaining)
+            if not pairs:
+                break
+            self.play_round(pairs, on_game)
+            remaining -= len(pairs)
+
+    def __str__(self) -> str:
+        return f"Matches simulated: {self.num_simulated}, reused from cache: {self.num_cached}, cached pairs: {len(self._results)}"
@@ -79,7 +79,7 @@ class ProgressDetailsWindow:
         all_unit_types = set(UnitType)
         
         # Get all battles (excluding test battles)
-        all_battles = [b for b in battles.get_battles() if not b.is_test]
+        all_battles = [b for b in battles.get_battles_view() if not b.is_test]
         
         # Track encountered and unlocked units
         encountered_units = set()
@@ -91,7 +91,7 @@ class ProgressPanel(UIPanel):
         unused_points = unit_points + item_points + spell_points
 
         # Campaign completion stats
-        denominator = 2 * len([b for b in battles.get_battles() if not b.is_test])
+        denominator = 2 * len([b for b in battles.get_battles_view() if not b.is_test])
         numerator = 0
         for solution in progress_manager.solutions.values():
             if solution.solved_corrupted:
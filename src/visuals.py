@@ -8,6 +8,7 @@ from typing import Optional, Tuple
 import pygame
 from enum import Enum, auto
 
+from asset_loader import LazyAssetDict, load_image
 from components.animation import AnimationType
 from components.sprite_sheet import SpriteSheet
 from game_constants import gc
@@ -36,39 +37,35 @@ class Visual(Enum):
     SkeletonMageProjectile = auto()
     SkeletonMageExplosion = auto()
 
-visual_sheets: dict[Visual, pygame.Surface] = {}
+visual_sheets: LazyAssetDict[Visual, pygame.Surface] = LazyAssetDict(load_image, {
+    Visual.Arrow: os.path.join("assets", "effects", "HumansProjectiles.png"),
+    Visual.CoreVeteranAttack: os.path.join("assets", "effects", "CoreVeteranAttack.png"),
+    Visual.LongbowArrow: os.path.join("assets", "effects", "LongbowArrow.png"),
+    Visual.CrusaderBlackKnightFear: os.path.join("assets", "effects", "Black_Knight_Fear.png"),
+    Visual.InfantryCatapultBall: os.path.join("assets", "effects", "InfantryCatapultBall.png"),
+    Visual.InfantryCatapultBallExplosion: os.path.join("assets", "effects", "InfantryCatapultBall.png"),
+    Visual.InfantryCatapultBallRemains: os.path.join("assets", "effects", "InfantryCatapultBall.png"),
+    Visual.CrusaderGoldKnightAttack: os.path.join("assets", "effects", "CrusaderGoldKnightAttackEffect.png"),
+    Visual.MiscRedKnightFireSlash: os.path.join("assets", "effects", "Knight-Attack03_Effect.png"),
+    Visual.Explosion: os.path.join("assets", "effects", "explosiontip1_32x32.png"),
+    Visual.Fear: os.path.join("assets", "effects", "Fear.png"),
+    Visual.Fireball: os.path.join("assets", "effects", "Wizard.png"),
+    Visual.Healing: os.path.join("assets", "units", "CrusaderCleric.png"),
+    Visual.Ignited: os.path.join("assets", "effects", "Ignited.png"),
+    Visual.OrcThrowingAxe: os.path.join("assets", "effects", "OrcThrowingAxe.png"),
+    Visual.PirateCannonBall: os.path.join("assets", "effects", "PirateCannonBall.png"),
+    Visual.PirateHarpoon: os.path.join("assets", "effects", "PirateHarpoon.png"),
+    Visual.Rope: os.path.join("assets", "effects", "rope.png"),
+    Visual.Tongue: os.path.join("assets", "effects", "Tongue.png"),
+    Visual.TongueTip: os.path.join("assets", "effects", "TongueTip.png"),
+    Visual.ZombieSpit: os.path.join("assets", "effects", "ZombieSpit.png"),
+    Visual.SkeletonMageProjectile: os.path.join("assets", "effects", "SkeletonSpells.png"),
+    Visual.SkeletonMageExplosion: os.path.join("assets", "effects", "SkeletonSpells.png"),
+})
 
 def load_visual_sheets():
     """Load all visual sprite sheets."""
-    visual_paths = {
-        Visual.Arrow: os.path.join("assets", "effects", "HumansProjectiles.png"),
-        Visual.CoreVeteranAttack: os.path.join("assets", "effects", "CoreVeteranAttack.png"),
-        Visual.LongbowArrow: os.path.join("assets", "effects", "LongbowArrow.png"),
-        Visual.CrusaderBlackKnightFear: os.path.join("assets", "effects", "Black_Knight_Fear.png"),
-        Visual.InfantryCatapultBall: os.path.join("assets", "effects", "InfantryCatapultBall.png"),
-        Visual.InfantryCatapultBallExplosion: os.path.join("assets", "effects", "InfantryCatapultBall.png"),
-        Visual.InfantryCatapultBallRemains: os.path.join("assets", "effects", "InfantryCatapultBall.png"),
-        Visual.CrusaderGoldKnightAttack: os.path.join("assets", "effects", "CrusaderGoldKnightAttackEffect.png"),
-        Visual.MiscRedKnightFireSlash: os.path.join("assets", "effects", "Knight-Attack03_Effect.png"),
-        Visual.Explosion: os.path.join("assets", "effects", "explosiontip1_32x32.png"),
-        Visual.Fear: os.path.join("assets", "effects", "Fear.png"),
-        Visual.Fireball: os.path.join("assets", "effects", "Wizard.png"),
-        Visual.Healing: os.path.join("assets", "units", "CrusaderCleric.png"),
-        Visual.Ignited: os.path.join("assets", "effects", "Ignited.png"),
-        Visual.OrcThrowingAxe: os.path.join("assets", "effects", "OrcThrowingAxe.png"),
-        Visual.PirateCannonBall: os.path.join("assets", "effects", "PirateCannonBall.png"),
-        Visual.PirateHarpoon: os.path.join("assets", "effects", "PirateHarpoon.png"),
-        Visual.Rope: os.path.join("assets", "effects", "rope.png"),
-        Visual.Tongue: os.path.join("assets", "effects", "Tongue.png"),
-        Visual.TongueTip: os.path.join("assets", "effects", "TongueTip.png"),
-        Visual.ZombieSpit: os.path.join("assets", "effects", "ZombieSpit.png"),
-        Visual.SkeletonMageProjectile: os.path.join("assets", "effects", "SkeletonSpells.png"),
-        Visual.SkeletonMageExplosion: os.path.join("assets", "effects", "SkeletonSpells.png"),
-    }
-    for visual, path in visual_paths.items():
-        if visual in visual_sheets:
-            continue
-        visual_sheets[visual] = pygame.image.load(path).convert_alpha()
+    visual_sheets.load_all()
 
 def create_visual_spritesheet(
         visual: Visual,
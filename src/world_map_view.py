@@ -1,6 +1,6 @@
 from enum import Enum, auto
 import enum
-from typing import Dict, List, Optional, Tuple
+from typing import Dict, List, Optional, Sequence, Tuple
 import esper
 import pygame
 import pygame_gui
@@ -96,7 +96,7 @@ class WorldMapView:
         self,
         screen: pygame.Surface,
         manager: pygame_gui.UIManager,
-        battles: List[Battle],
+        battles: Sequence[Battle],
         camera: Camera,
     ) -> None:
         """
@@ -631,12 +631,12 @@ class WorldMapView:
     def __del__(self) -> None:
         self._cleanup()
 
-    def rebuild(self, battles: List[Battle], cleanup: bool = True) -> None:
+    def rebuild(self, battles: Sequence[Battle], cleanup: bool = True) -> None:
         """
         Rebuild the world map view with new battles while preserving camera state.
         
         Args:
-            battles: A list of Battle objects with defined hex_coords.
+            battles: Battle objects with defined hex_coords. They are copied.
             cleanup: Whether to clean up existing battle worlds.
         """
         if cleanup: